@@ -1,5 +1,6 @@
 import pandas as pd
 import numpy as np
+from decimal import Decimal
 from datetime import datetime, timedelta
 
 class AggregationManager:
@@ -8,6 +9,13 @@ class AggregationManager:
     Provides consistent data transformation and aggregation across all dashboard pages.
     """
     
+    # Column holding the precomputed search text of each row
+    SEARCH_COLUMN = "_search_index"
+    # String columns with at most this share of distinct values become categoricals
+    CATEGORY_RATIO = 0.5
+    # Joins the cell texts; a term containing it falls back to per-column matching
+    SEARCH_SEPARATOR = "\x1f"
+    
     @staticmethod
     def format_currency(amount, precision=2):
         """Format amount as currency with ₹ symbol"""
@@ -21,6 +29,104 @@ class AggregationManager:
         else:  # 1 crore or more
             return f"₹{amount/10000000:.{precision}f}Cr"
     
+    # (upper bound, divisor, suffix) of each currency unit, checked in order
+    CURRENCY_UNITS = [
+        (100000, 1, ""),            # Less than 1 lakh: exact amount with commas
+        (10000000, 100000, "L"),    # Less than 1 crore: lakhs
+        (np.inf, 10000000, "Cr"),   # 1 crore or more: crores
+    ]
+    
+    # Digit strings of 0-999, unpadded for the leading group and zero-padded for the rest
+    _LEADING_DIGITS = np.array([str(i) for i in range(1000)])
+    _PADDED_DIGITS = np.array([f"{i:03d}" for i in range(1000)])
+    _FRACTION_DIGITS = {}  # precision -> zero-padded digit strings of 0..10^precision-1
+    
+    @classmethod
+    def _integer_text(cls, integers, grouped):
+        """Decimal text of non-negative integers, with thousands separators where grouped is True"""
+        text = np.where(integers >= 1000, cls._PADDED_DIGITS[integers % 1000], cls._LEADING_DIGITS[integers % 1000])
+        separators = np.where(grouped, ",", "")
+        integers = integers // 1000
+        while (integers > 0).any():
+            more = integers > 0
+            group = np.where(integers >= 1000, cls._PADDED_DIGITS[integers % 1000], cls._LEADING_DIGITS[integers % 1000])
+            text = np.where(more, np.char.add(np.char.add(group, separators), text), text)
+            integers = integers // 1000
+        return text
+    
+    @classmethod
+    def _fraction_text(cls, fractions, precision):
+        """Zero-padded text of the fractional digits"""
+        if precision > 4:
+            return np.char.zfill(fractions.astype(str), precision)
+        if precision not in cls._FRACTION_DIGITS:
+            cls._FRACTION_DIGITS[precision] = np.array([f"{i:0{precision}d}" for i in range(10 ** precision)])
+        return cls._FRACTION_DIGITS[precision][fractions]
+    
+    @classmethod
+    def format_currency_series(cls, values, precision=2, na_rep="₹0"):
+        """
+        Vectorized format_currency for a whole column
+        
+        Produces exactly what formatting each value on its own would:
+        ₹ with commas below 1 lakh, then L (lakhs) and Cr (crores) with the
+        given precision. Amounts are classified and rounded with NumPy masks;
+        only values within rounding error of a half-way point (and inf or
+        huge values) are formatted one by one in their original type, so
+        Decimal and float inputs round exactly as before.
+        
+        Parameters:
+        - values: Series or array-like of numbers (float, int, Decimal; None/NaN for missing)
+        - precision: Decimal places
+        - na_rep: Text for missing or non-numeric values
+        
+        Returns:
+        - Series of formatted strings aligned with the input
+        """
+        series = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+        originals = series.to_numpy(dtype=object)
+        numbers = pd.to_numeric(series, errors='coerce').to_numpy(dtype=float)
+        result = np.empty(len(numbers), dtype=object)
+        
+        missing = np.isnan(numbers)
+        result[missing] = na_rep
+        scaled = numbers.copy()
+        suffixes = np.full(len(numbers), "", dtype="<U2")
+        remaining = ~missing
+        for upper, divisor, suffix in cls.CURRENCY_UNITS:
+            unit = remaining & (numbers < upper) if np.isfinite(upper) else remaining
+            scaled[unit] = numbers[unit] / divisor
+            suffixes[unit] = suffix
+            remaining &= ~unit
+        
+        # Round half away from zero on |x| * 10^precision; values this cannot do exactly go scalar
+        factor = 10 ** precision
+        magnitude = np.abs(np.where(missing, 0.0, scaled)) * factor
+        finite = np.isfinite(magnitude) & (magnitude < 2 ** 52)
+        magnitude = np.where(finite, magnitude, 0.0)
+        rounded = np.floor(magnitude + 0.5)
+        tie_distance = np.abs(magnitude - np.floor(magnitude) - 0.5)
+        scalar = ~missing & (~finite | (tie_distance <= magnitude * 1e-12 + 1e-9))
+        vector = ~missing & ~scalar
+        
+        if vector.any():
+            units = rounded[vector].astype(np.int64)
+            # Commas only below 1 lakh, as in f"{amount:,.2f}"
+            text = cls._integer_text(units // factor, suffixes[vector] == "")
+            text = np.char.add(np.where(np.signbit(scaled[vector]), "₹-", "₹"), text)
+            if precision > 0:
+                text = np.char.add(np.char.add(text, "."), cls._fraction_text(units % factor, precision))
+            result[vector] = np.char.add(text, suffixes[vector])
+        
+        for i in np.flatnonzero(scalar):
+            amount = originals[i]
+            if not isinstance(amount, (int, float, Decimal)) or isinstance(amount, bool):
+                amount = numbers[i]
+            # Formatted in its own type (float or Decimal)
+            result[i] = cls.format_currency(amount, precision)
+        
+        return pd.Series(result, index=series.index)
+    
     @staticmethod
     def format_date(date, format_str="%d-%b-%Y"):
         """Format date consistently across the dashboard"""
@@ -87,7 +193,38 @@ class AggregationManager:
         
         growth = ((current_value - previous_value) / previous_value) * 100
         return round(growth, 2)
-    
+
+    @staticmethod
+    def top_n_with_others(df, group_column, value_columns=None, n=10, others_label="Others"):
+        """
+        Top N groups plus one exact "Others" bucket (pandas counterpart of top_n.TopNQuery)
+
+        Parameters:
+        - df: DataFrame with one row per record (or per group when value_columns are given)
+        - group_column: Column to group by
+        - value_columns: Columns to sum per group; None counts rows into a 'Count' column
+        - n: Number of groups kept as they are, ranked by the first value column
+        - others_label: Label of the bucket holding every other group
+
+        Returns:
+        - (DataFrame of at most n + 1 rows, dict of totals per value column)
+        """
+        if value_columns is None:
+            grouped = df[group_column].value_counts().rename_axis(group_column).reset_index(name='Count')
+            value_columns = ['Count']
+        else:
+            value_columns = [value_columns] if isinstance(value_columns, str) else list(value_columns)
+            grouped = df.groupby(group_column, observed=True)[value_columns].sum().reset_index()
+            grouped = grouped.sort_values(value_columns[0], ascending=False, kind='stable')
+
+        totals = {column: grouped[column].sum() for column in value_columns}
+        top = grouped.head(n)
+        tail = grouped.iloc[n:]
+        if not tail.empty:
+            others = {group_column: others_label, **{column: tail[column].sum() for column in value_columns}}
+            top = pd.concat([top.astype({group_column: object}), pd.DataFrame([others])], ignore_index=True)
+        return top.reset_index(drop=True), totals
+
     @staticmethod
     def filter_dataframe(df, filters):
         """
@@ -142,3 +279,120 @@ class AggregationManager:
                 mask = mask | column_mask
         
         return df[mask]
+    
+    @classmethod
+    def build_search_index(cls, df, columns=None):
+        """
+        Build the search text of every row: each cell as str(value).lower(),
+        joined with SEARCH_SEPARATOR so a match never spans two cells
+        
+        Parameters:
+        - df: DataFrame to index
+        - columns: Columns to include (None for all columns except the index itself)
+        
+        Returns:
+        - Series of search texts aligned with df.index
+        """
+        search_columns = [c for c in (columns if columns is not None else df.columns) if c != cls.SEARCH_COLUMN]
+        if not search_columns:
+            return pd.Series("", index=df.index)
+        
+        parts = [df[column].map(str).str.lower() for column in search_columns]
+        return parts[0].str.cat(parts[1:], sep=cls.SEARCH_SEPARATOR)
+    
+    @classmethod
+    def add_search_index(cls, df, columns=None):
+        """
+        Add the search index column to a DataFrame, typically once inside a cached loader
+        
+        Returns:
+        - The DataFrame with SEARCH_COLUMN added
+        """
+        if df is not None and not df.empty:
+            df[cls.SEARCH_COLUMN] = cls.build_search_index(df, columns)
+        return df
+    
+    @classmethod
+    def search_indexed(cls, df, search_term):
+        """
+        Keep the rows where any cell contains the search term (case-insensitive),
+        matching `any(str(val).lower().find(term) >= 0 for val in row)` row by row
+        
+        Uses SEARCH_COLUMN when present, so each search is one vectorized
+        substring scan instead of stringifying every cell again
+        
+        Returns:
+        - DataFrame with matching rows
+        """
+        if df is None or df.empty or not search_term:
+            return df
+        
+        search_term = str(search_term).lower()
+        if cls.SEARCH_SEPARATOR in search_term:
+            columns = [c for c in df.columns if c != cls.SEARCH_COLUMN]
+            mask = pd.Series(False, index=df.index)
+            for column in columns:
+                mask = mask | df[column].map(str).str.lower().str.contains(search_term, regex=False)
+            return df[mask]
+        
+        if cls.SEARCH_COLUMN in df.columns:
+            index = df[cls.SEARCH_COLUMN]
+        else:
+            index = cls.build_search_index(df)
+        return df[index.str.contains(search_term, regex=False)]
+    
+    @staticmethod
+    def _decimal_to_number(series):
+        """float64 for a column of Decimals (None -> NaN), int64 when every value is a whole number"""
+        numbers = series.astype(float)
+        if numbers.notna().all() and (numbers % 1 == 0).all() and numbers.abs().max() < 2 ** 53:
+            return numbers.astype(np.int64)
+        return numbers
+    
+    @classmethod
+    def optimize_dtypes(cls, df, category_ratio=None, label=None):
+        """
+        Shrink a fetched DataFrame before it is cached
+        
+        - Decimal columns (psycopg2 NUMERIC) become float64, or int64 when all values are whole
+        - String columns with few distinct values (status, role, channel, allocator...) become category
+        - Integer columns are downcast to int32 when their values fit
+        
+        Floats are kept as float64 so amounts format exactly as before. The
+        search index column is left alone.
+        
+        Parameters:
+        - df: DataFrame as built from the fetched rows
+        - category_ratio: Maximum distinct/rows share for a category (default CATEGORY_RATIO)
+        - label: Name used in the memory report
+        
+        Returns:
+        - The optimized DataFrame
+        """
+        if df is None or df.empty:
+            return df
+        category_ratio = cls.CATEGORY_RATIO if category_ratio is None else category_ratio
+        before = df.memory_usage(deep=True).sum()
+        
+        df = df.copy()
+        for column in df.columns:
+            if column == cls.SEARCH_COLUMN:
+                continue
+            series = df[column]
+            if pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype):
+                present = series.dropna()
+                if present.empty:
+                    continue
+                types = set(present.map(type))
+                if types == {Decimal}:
+                    df[column] = cls._decimal_to_number(series)
+                elif types == {str} and present.nunique() <= max(1, len(series) * category_ratio):
+                    df[column] = series.astype('category')
+            elif pd.api.types.is_integer_dtype(series.dtype) and series.dtype.itemsize > 4:
+                if series.min() >= np.iinfo(np.int32).min and series.max() <= np.iinfo(np.int32).max:
+                    df[column] = series.astype(np.int32)
+        
+        after = df.memory_usage(deep=True).sum()
+        print(f"Optimized dtypes{f' of {label}' if label else ''}: "
+              f"{before / 1024:,.0f} KB -> {after / 1024:,.0f} KB ({before / max(after, 1):.1f}x smaller)")
+        return df
@@ -0,0 +1,170 @@
+from query_registry import QueryRegistry
+
+class AllocationPager:
+    """
+    Keyset-paginated allocation list for the Allocation Details page.
+
+    Search text, allocator filter, sort column/direction and the page cursor
+    are all pushed into the SQL. A page is fetched with
+    `WHERE (sort_key, allocation_id) < (last_sort_key, last_allocation_id)`
+    instead of an OFFSET, so every page costs the same however deep the
+    user browses. Collection sorts still aggregate payments for every
+    allocation in the range; column sorts only touch the rows on the page.
+    """
+
+    PAGE_SIZE = 100
+
+    # Display column -> (query key, sort expression)
+    SORT_COLUMNS = {
+        "Total Outstanding": ('outstanding', "COALESCE(af.total_outstanding, 0)"),
+        "Accounts": ('accounts', "COALESCE(af.total_records, 0)"),
+        "Collection": ('collection', "pay.amount"),
+        "Collection Rate (%)": ('collection_rate', "CASE WHEN af.total_outstanding > 0 "
+                                "THEN ROUND((pay.amount::float / af.total_outstanding * 100)::numeric, 2) ELSE 0 END"),
+        "Allocation ID": ('allocation_id', "af.allocation_id"),
+        "Allocation Name": ('allocation_name', "COALESCE(af.allocation_name, '')"),
+        "Allocator": ('allocator', "COALESCE(af.allocator_name, '')"),
+        "Agency": ('agency', "COALESCE(af.agency_name, '')"),
+        "Product": ('product', "COALESCE({dim:af.product_label}, '')"),
+        "Bucket": ('bucket', "COALESCE({dim:af.bucket_label}, '')"),
+    }
+
+    DIRECTIONS = {'Descending': 'desc', 'Ascending': 'asc'}
+
+    # Sorts that aggregate the payments of every allocation in the range before paging
+    HEAVY_SORTS = ("Collection", "Collection Rate (%)")
+
+    FILTERS = """
+                AND (%(search_pattern)s::text IS NULL
+                    OR af.allocation_id::text ILIKE %(search_pattern)s
+                    OR af.allocation_name ILIKE %(search_pattern)s
+                    OR af.allocator_name ILIKE %(search_pattern)s
+                    OR af.agency_name ILIKE %(search_pattern)s
+                    OR {dim:af.product_label} ILIKE %(search_pattern)s
+                    OR {dim:af.bucket_label} ILIKE %(search_pattern)s)
+                AND (%(allocators)s::text[] IS NULL OR af.allocator_name = ANY(%(allocators)s::text[]))"""
+
+    @classmethod
+    def page_sql(cls, sort_column, direction):
+        """SQL for one page sorted by a display column ('desc' or 'asc')"""
+        sort_expr = cls.SORT_COLUMNS[sort_column][1]
+        comparison = '<' if direction == 'desc' else '>'
+        return f"""
+            SELECT
+                af.allocation_id as "Allocation ID",
+                af.allocation_name as "Allocation Name",
+                af.allocator_name as "Allocator",
+                af.agency_name as "Agency",
+                {{dim:af.product_label}} as "Product",
+                {{dim:af.bucket_label}} as "Bucket",
+                af.total_records as "Accounts",
+                af.total_outstanding as "Total Outstanding",
+                CASE
+                    WHEN {{dim:af.channel_digital}} THEN 'Digital'
+                    WHEN {{dim:af.channel_call}} THEN 'Call'
+                    WHEN {{dim:af.channel_field}} THEN 'Field'
+                    ELSE 'Not Assigned'
+                END as "Channel (AF)",
+                pay.amount as "Collection",
+                CASE
+                    WHEN af.total_outstanding > 0
+                    THEN ROUND((pay.amount::float / af.total_outstanding * 100)::numeric, 2)
+                    ELSE 0
+                END as "Collection Rate (%%)",
+                {sort_expr} as sort_value
+            FROM {{table:allocation_files}} af
+            LEFT JOIN LATERAL (
+                SELECT COALESCE(SUM(ap.collection_amount), 0) as amount
+                FROM {{table:allocation_payments}} ap
+                WHERE ap.allocation_id = af.allocation_id
+            ) pay ON true
+            WHERE {{date_range:af.created_at}}{cls.FILTERS}
+                AND (%(after_id)s IS NULL
+                    OR ({sort_expr}, af.allocation_id) {comparison} (%(after_value)s, %(after_id)s))
+            ORDER BY sort_value {direction}, af.allocation_id {direction}
+            LIMIT %(limit)s
+        """
+
+    @staticmethod
+    def query_name(sort_column, direction):
+        return f"allocation_details.page.{AllocationPager.SORT_COLUMNS[sort_column][0]}.{direction}"
+
+    @classmethod
+    def filter_params(cls, start_date, end_date, search=None, allocators=None):
+        return {
+            'start_date': start_date,
+            'end_date': end_date,
+            'search_pattern': QueryRegistry.contains_pattern(search),
+            'allocators': list(allocators) if allocators else None,
+        }
+
+    @classmethod
+    def fetch_page(cls, db, start_date, end_date, search=None, allocators=None,
+                   sort_column="Total Outstanding", sort_order="Descending", cursor=None):
+        """
+        Fetch one page of allocations
+
+        Parameters:
+        - db: DatabaseManager
+        - start_date, end_date: Date range ('YYYY-MM-DD')
+        - search: Text matched against IDs, names, product and bucket
+        - allocators: Allocator names to keep (None or empty for all)
+        - sort_column: Key of SORT_COLUMNS
+        - sort_order: 'Descending' or 'Ascending'
+        - cursor: (sort_value, allocation_id) of the last row of the previous page, None for the first page
+
+        Returns:
+        - (rows, next_cursor) where next_cursor is None on the last page, or (None, None) if
+          the database is unreachable
+        """
+        direction = cls.DIRECTIONS[sort_order]
+        params = cls.filter_params(start_date, end_date, search, allocators)
+        after_value, after_id = cursor if cursor else (None, None)
+        params.update({'after_value': after_value, 'after_id': after_id, 'limit': cls.PAGE_SIZE + 1})
+
+        rows = QueryRegistry.fetch_all(db, cls.query_name(sort_column, direction), params)
+        if rows is None:
+            return None, None
+
+        next_cursor = None
+        if len(rows) > cls.PAGE_SIZE:
+            rows = rows[:cls.PAGE_SIZE]
+            next_cursor = (rows[-1]['sort_value'], rows[-1]['Allocation ID'])
+        # Copies without the sort key; the fetched rows may be kept as QueryGuard's fallback
+        rows = [{column: value for column, value in row.items() if column != 'sort_value'} for row in rows]
+        return rows, next_cursor
+
+    @classmethod
+    def export_params(cls, start_date, end_date, search=None, allocators=None):
+        """Parameters that run a page query over every matching allocation (LIMIT NULL, no cursor)"""
+        params = cls.filter_params(start_date, end_date, search, allocators)
+        params.update({'after_value': None, 'after_id': None, 'limit': None})
+        return params
+
+    @classmethod
+    def estimate_total(cls, db, start_date, end_date, search=None, allocators=None):
+        """Planner estimate of the number of matching allocations (no counting scan)"""
+        return QueryRegistry.fetch_estimate(
+            db, "allocation_details.page_count", cls.filter_params(start_date, end_date, search, allocators))
+
+    @classmethod
+    def register(cls):
+        """Register the page query for every sort column and direction, plus the count query"""
+        sample_params = cls.filter_params(**QueryRegistry.sample_date_params())
+        sample_params.update({'after_value': None, 'after_id': None, 'limit': cls.PAGE_SIZE + 1})
+        for sort_column in cls.SORT_COLUMNS:
+            for direction in cls.DIRECTIONS.values():
+                QueryRegistry.register(
+                    cls.query_name(sort_column, direction), "Allocation Details / Allocation List", "ingestion",
+                    cls.page_sql(sort_column, direction), sample_params,
+                    query_class='heavy' if sort_column in cls.HEAVY_SORTS else None, remote=True)
+        QueryRegistry.register(
+            "allocation_details.page_count", "Allocation Details / Allocation List", "ingestion",
+            f"""
+                SELECT af.allocation_id
+                FROM {{table:allocation_files}} af
+                WHERE {{date_range:af.created_at}}{cls.FILTERS}
+            """,
+            cls.filter_params(**QueryRegistry.sample_date_params()), remote=True)
+
+AllocationPager.register()
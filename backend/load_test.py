@@ -0,0 +1,437 @@
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+import psycopg2
+import requests
+from psycopg2.extras import RealDictCursor
+
+# Load test of the API (main.py) against a local PostgreSQL seeded with
+# synthetic allocations:
+#
+#   python load_test.py seed --rows 200000
+#   python load_test.py run --users 16 --duration 60 --output before.json
+#   python load_test.py run --users 16 --duration 60 --output after.json --compare before.json
+#
+# `run` starts the API on the load-test database (or targets --url), drives a
+# weighted mix of /api/allocation-stats and /api/allocation-details calls
+# from concurrent closed-loop users and reports throughput, p50/p95/p99
+# latency and error rates per call type. The data, the request sequence of
+# every user and the settings are fixed by --seed, and each result file
+# records them with the commit it ran on, so runs can be compared across
+# commits.
+
+# The load-test database; never the dashboard's .env databases
+LOADTEST_DB = {
+    "host": os.getenv('LOADTEST_DB_HOST', 'localhost'),
+    "port": os.getenv('LOADTEST_DB_PORT', '5432'),
+    "dbname": os.getenv('LOADTEST_DB_NAME', 'control_tower_loadtest'),
+    "user": os.getenv('LOADTEST_DB_USER', 'postgres'),
+    "password": os.getenv('LOADTEST_DB_PASSWORD', ''),
+}
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+STATUSES = ['fully-allocated', 'partially-allocated', 'unallocated', 'processing']
+
+# Call type -> default weight in the request mix
+DEFAULT_MIX = {
+    'stats': 1,  # /api/allocation-stats
+    'details': 3,  # First page of /api/allocation-details
+    'deep': 2,  # A page far into the result (a cursor taken DEEP_ROWS rows in)
+    'filtered': 2,  # First page with status, allocator and date filters (and sometimes include_total)
+}
+DEEP_ROWS = (5000, 20000, 50000)  # Rows skipped by the deep pages
+WALK_PAGE_SIZE = 500  # Page size used to walk to the deep cursors (the API's MAX_PAGE_SIZE)
+
+API_START_TIMEOUT = 30  # Seconds to wait for a started API to answer
+REQUEST_TIMEOUT = 30  # Seconds before a request counts as an error
+
+def connect(dbname=None):
+    config = dict(LOADTEST_DB, dbname=dbname or LOADTEST_DB['dbname'])
+    return psycopg2.connect(cursor_factory=RealDictCursor, connect_timeout=10, **config)
+
+def check_local():
+    host = LOADTEST_DB['host'] or ''
+    if host not in LOCAL_HOSTS and not host.startswith('/'):
+        raise SystemExit(f"Refusing to use LOADTEST_DB_HOST={host}: the load test only runs against a local PostgreSQL")
+
+def seed(rows, days, allocators, agencies, seed_value):
+    """
+    (Re)create allocation_files in the load-test database with synthetic rows
+
+    Parameters:
+    - rows: Number of allocations
+    - days: created_at is spread over this many days up to now
+    - allocators, agencies: Distinct allocators and agencies (skewed: a few hold most allocations)
+    - seed_value: Random seed; the same seed gives the same data
+    """
+    check_local()
+    conn = connect('postgres')
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (LOADTEST_DB['dbname'],))
+        if not cur.fetchone():
+            print(f"Creating database {LOADTEST_DB['dbname']}")
+            cur.execute(f'CREATE DATABASE "{LOADTEST_DB["dbname"]}"')
+    conn.close()
+
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            started = time.time()
+            cur.execute("DROP TABLE IF EXISTS allocation_files")
+            cur.execute("""
+                CREATE TABLE allocation_files (
+                    allocation_id text PRIMARY KEY,
+                    allocation_name text,
+                    allocator_id text,
+                    allocator_name text,
+                    agency_id text,
+                    agency_name text,
+                    status text,
+                    product jsonb,
+                    bucket jsonb,
+                    channel jsonb,
+                    total_records integer,
+                    total_outstanding numeric(14,2),
+                    created_at timestamp
+                )
+            """)
+            # setseed takes a value in [-1, 1]; the sequence of random() that follows is reproducible
+            cur.execute("SELECT setseed(%s)", ((seed_value % 2000) / 1000.0 - 1,))
+            cur.execute("""
+                WITH seeded AS (
+                    SELECT
+                        i,
+                        1 + floor(power(random(), 2) * %(allocators)s)::int as allocator,
+                        1 + floor(power(random(), 2) * %(agencies)s)::int as agency,
+                        random() as r
+                    FROM generate_series(1, %(rows)s) as i
+                )
+                INSERT INTO allocation_files
+                SELECT
+                    'ALLOC-' || lpad(i::text, 9, '0'),
+                    'Allocation file ' || i,
+                    'allocator-' || allocator,
+                    'Allocator ' || allocator,
+                    'agency-' || agency,
+                    'Agency ' || agency,
+                    (%(statuses)s::text[])[1 + floor(r * 4)::int],
+                    jsonb_build_object('name', 'Product ' || (i %% 8)),
+                    jsonb_build_object('name', 'Bucket ' || (i %% 5)),
+                    jsonb_build_object('digital', r < 0.5, 'call', r >= 0.5 AND r < 0.8, 'field', r >= 0.8),
+                    10 + floor(random() * 5000)::int,
+                    round((random() * 5000000)::numeric, 2),
+                    date_trunc('second', NOW()::timestamp - random() * make_interval(days => %(days)s))
+                FROM seeded
+            """, {'rows': rows, 'days': days, 'allocators': allocators, 'agencies': agencies, 'statuses': STATUSES})
+            # The keyset index the paged endpoint relies on, plus the filter columns
+            cur.execute("CREATE INDEX idx_allocation_files_created_at_id ON allocation_files (created_at, allocation_id)")
+            cur.execute("CREATE INDEX idx_allocation_files_status ON allocation_files (status)")
+            cur.execute("CREATE INDEX idx_allocation_files_allocator_id ON allocation_files (allocator_id)")
+        conn.commit()
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE allocation_files")
+        print(f"Seeded {rows:,} allocations over {days} days in {time.time() - started:.1f} seconds")
+    finally:
+        conn.close()
+
+def dataset():
+    """Shape of the seeded data, used to build filters and recorded with the results"""
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT
+                    COUNT(*) as rows,
+                    MIN(created_at) as first_created_at,
+                    MAX(created_at) as last_created_at,
+                    (SELECT array_agg(allocator_id ORDER BY allocator_id)
+                     FROM (SELECT DISTINCT allocator_id FROM allocation_files) a) as allocator_ids
+                FROM allocation_files
+            """)
+            return cur.fetchone()
+    finally:
+        conn.close()
+
+def start_api(port, workers):
+    """Start the API on the load-test database and wait until it answers"""
+    env = dict(os.environ)
+    env.pop('CONTROL_TOWER_API_URL', None)
+    env.update({
+        'DB_HOST': LOADTEST_DB['host'],
+        'DB_PORT': str(LOADTEST_DB['port']),
+        'DB_NAME': LOADTEST_DB['dbname'],
+        'DB_USER': LOADTEST_DB['user'],
+        'DB_PASSWORD': LOADTEST_DB['password'],
+    })
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + API_START_TIMEOUT
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"The API exited with code {process.returncode}")
+        try:
+            if requests.get(url + "/api/allocation-stats", timeout=5).status_code == 200:
+                return process, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise SystemExit(f"The API did not answer within {API_START_TIMEOUT} seconds")
+
+def deep_cursors(url, depths):
+    """Cursors of the pages starting `depth` rows in, found by walking the list with full pages"""
+    cursors = {}
+    session = requests.Session()
+    cursor, skipped = None, 0
+    for depth in sorted(depths):
+        while skipped < depth:
+            params = {'limit': WALK_PAGE_SIZE}
+            if cursor:
+                params['cursor'] = cursor
+            page = session.get(url + "/api/allocation-details", params=params, timeout=REQUEST_TIMEOUT).json()
+            cursor = page['next_cursor']
+            skipped += len(page['items'])
+            if not cursor:
+                break
+        if not cursor:
+            print(f"Skipping deep pages from {depth:,} rows: the dataset has only {skipped:,}")
+            break
+        cursors[depth] = cursor
+    return cursors
+
+class LoadGenerator:
+    """
+    Closed-loop users calling the API for a fixed time.
+
+    Every user draws its calls from the weighted mix with its own seeded
+    random generator, so two runs with the same settings send the same
+    request sequence. Latencies of calls that start during the warmup are
+    not recorded.
+    """
+
+    def __init__(self, url, mix, page_size, cursors, shape, seed_value):
+        self.url = url
+        self.kinds = [kind for kind, weight in mix.items() if weight > 0]
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.page_size = page_size
+        self.cursors = cursors
+        self.allocator_ids = shape['allocator_ids'] or []
+        self.first_created_at = shape['first_created_at']
+        self.last_created_at = shape['last_created_at']
+        self.seed = seed_value
+        self.samples = []  # (kind, latency in seconds, HTTP status or None for a failed request)
+        self.lock = threading.Lock()
+
+    def request(self, kind, rng):
+        """(path, params) of one call of the given kind"""
+        params = {'limit': self.page_size}
+        if kind == 'stats':
+            return "/api/allocation-stats", {}
+        if kind == 'deep' and self.cursors:
+            params['cursor'] = self.cursors[rng.choice(sorted(self.cursors))]
+        elif kind == 'filtered':
+            if rng.random() < 0.7:
+                params['status'] = rng.choice(STATUSES)
+            if self.allocator_ids and rng.random() < 0.5:
+                params['allocator_id'] = rng.choice(self.allocator_ids)
+            span = max((self.last_created_at - self.first_created_at).days - 7, 0)
+            start = self.first_created_at + timedelta(days=rng.randint(0, span))
+            params['start_date'] = start.date().isoformat()
+            params['end_date'] = (start + timedelta(days=7)).date().isoformat()
+            params['include_total'] = 'true' if rng.random() < 0.3 else 'false'
+        return "/api/allocation-details", params
+
+    def user(self, number, warmup_end, stop_at):
+        rng = random.Random(self.seed * 1000 + number)
+        session = requests.Session()
+        samples = []
+        while time.time() < stop_at:
+            kind = rng.choices(self.kinds, self.weights)[0]
+            path, params = self.request(kind, rng)
+            started = time.time()
+            try:
+                status = session.get(self.url + path, params=params, timeout=REQUEST_TIMEOUT).status_code
+            except requests.RequestException:
+                status = None
+            if started >= warmup_end:
+                samples.append((kind, time.time() - started, status))
+        with self.lock:
+            self.samples.extend(samples)
+
+    def run(self, users, duration, warmup):
+        warmup_end = time.time() + warmup
+        stop_at = warmup_end + duration
+        threads = [threading.Thread(target=self.user, args=(n, warmup_end, stop_at)) for n in range(users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.samples
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of already sorted values"""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(fraction * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+def summarize(samples, duration):
+    """Throughput, latency percentiles (ms) and error rates, per call type and overall"""
+    groups = {}
+    for kind, latency, status in samples:
+        groups.setdefault(kind, []).append((latency, status))
+    groups['all'] = [(latency, status) for _, latency, status in samples]
+
+    summary = {}
+    for kind in [kind for kind in DEFAULT_MIX if kind in groups] + ['all']:
+        values = groups[kind]
+        latencies = sorted(latency * 1000 for latency, _ in values)
+        errors = sum(1 for _, status in values if status is None or status >= 400)
+        busy = sum(1 for _, status in values if status == 503)
+        summary[kind] = {
+            'requests': len(values),
+            'throughput_rps': round(len(values) / duration, 1),
+            'p50_ms': round(percentile(latencies, 0.50), 1) if latencies else None,
+            'p95_ms': round(percentile(latencies, 0.95), 1) if latencies else None,
+            'p99_ms': round(percentile(latencies, 0.99), 1) if latencies else None,
+            'max_ms': round(latencies[-1], 1) if latencies else None,
+            'error_rate': round(errors / len(values), 4) if values else 0.0,
+            'busy_rate': round(busy / len(values), 4) if values else 0.0,  # 503s from QueryGuard admission control
+        }
+    return summary
+
+def print_summary(summary):
+    print(f"{'call':<10}{'requests':>10}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'errors':>9}{'503s':>8}")
+    for kind, stats in summary.items():
+        latencies = ''.join(
+            f"{'-' if stats[metric] is None else stats[metric]:>9}" for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms'))
+        print(f"{kind:<10}{stats['requests']:>10}{stats['throughput_rps']:>9}{latencies}"
+              f"{stats['error_rate']:>9.2%}{stats['busy_rate']:>8.2%}")
+
+def print_comparison(summary, baseline):
+    """Change of each metric against an earlier result file"""
+    if baseline['config'] != summary['config']:
+        print("Warning: the baseline ran with different settings; the comparison may not be meaningful")
+    print(f"\nCompared with {baseline['commit']} ({baseline['started_at']}):")
+    print(f"{'call':<10}{'req/s':>16}{'p50 ms':>16}{'p95 ms':>16}{'p99 ms':>16}{'errors':>18}")
+    for kind, stats in summary['results'].items():
+        before = baseline['results'].get(kind)
+        if not before:
+            continue
+        cells = []
+        for metric in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+            old, new = before[metric], stats[metric]
+            change = f"{(new - old) / old:+.0%}" if old and new is not None else "n/a"
+            cells.append(f"{new} ({change})".rjust(16))
+        cells.append(f"{stats['error_rate']:.2%} ({before['error_rate']:.2%})".rjust(18))
+        print(f"{kind:<10}{''.join(cells)}")
+
+def commit():
+    """Commit of the tree being tested, marked dirty when it has uncommitted changes"""
+    try:
+        revision = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+        dirty = subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], text=True).strip()
+        return revision + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def parse_mix(value):
+    """Weights like 'stats=1,details=3,deep=2,filtered=2' (omitted call types get weight 0)"""
+    mix = dict.fromkeys(DEFAULT_MIX, 0)
+    for part in value.split(','):
+        kind, _, weight = part.partition('=')
+        if kind.strip() not in mix:
+            raise argparse.ArgumentTypeError(f"Unknown call type '{kind}', expected some of {list(mix)}")
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+def run(args):
+    check_local()
+    shape = dataset()
+    if not shape['rows']:
+        raise SystemExit("The load-test database is empty; run `python load_test.py seed` first")
+
+    process = None
+    url = args.url
+    if not url:
+        process, url = start_api(args.port, args.workers)
+    try:
+        cursors = deep_cursors(url, args.deep_rows) if args.mix.get('deep') else {}
+        generator = LoadGenerator(url, args.mix, args.page_size, cursors, shape, args.seed)
+        print(f"Running {args.users} users for {args.duration}s (+{args.warmup}s warmup) against {url}")
+        samples = generator.run(args.users, args.duration, args.warmup)
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+    result = {
+        'commit': commit(),
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'config': {
+            'users': args.users,
+            'duration': args.duration,
+            'warmup': args.warmup,
+            'mix': args.mix,
+            'page_size': args.page_size,
+            'deep_rows': sorted(cursors),
+            'seed': args.seed,
+            'api_workers': None if args.url else args.workers,
+            'dataset_rows': shape['rows'],
+        },
+        'results': summarize(samples, args.duration),
+    }
+    print_summary(result['results'])
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(result, json.load(f))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the Control Tower API against a local PostgreSQL")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = subparsers.add_parser('seed', help="Create the load-test database with synthetic allocations")
+    seed_parser.add_argument('--rows', type=int, default=200000, help="Allocations to generate (default 200000)")
+    seed_parser.add_argument('--days', type=int, default=180, help="Days of history (default 180)")
+    seed_parser.add_argument('--allocators', type=int, default=50, help="Distinct allocators (default 50)")
+    seed_parser.add_argument('--agencies', type=int, default=300, help="Distinct agencies (default 300)")
+    seed_parser.add_argument('--seed', type=int, default=42, help="Random seed of the data (default 42)")
+
+    run_parser = subparsers.add_parser('run', help="Drive a request mix and report throughput and latency")
+    run_parser.add_argument('--url', help="API to test (default: start one on the load-test database)")
+    run_parser.add_argument('--port', type=int, default=8765, help="Port of the started API (default 8765)")
+    run_parser.add_argument('--workers', type=int, default=1, help="uvicorn workers of the started API (default 1)")
+    run_parser.add_argument('--users', type=int, default=16, help="Concurrent users (default 16)")
+    run_parser.add_argument('--duration', type=int, default=30, help="Measured seconds (default 30)")
+    run_parser.add_argument('--warmup', type=int, default=5, help="Unmeasured seconds before that (default 5)")
+    run_parser.add_argument('--mix', type=parse_mix, default=dict(DEFAULT_MIX),
+                            help="Call weights, e.g. stats=1,details=3,deep=2,filtered=2")
+    run_parser.add_argument('--page-size', type=int, default=50, help="limit of the details calls (default 50)")
+    run_parser.add_argument('--deep-rows', type=lambda v: [int(x) for x in v.split(',')], default=list(DEEP_ROWS),
+                            help="Rows skipped by the deep pages (default 5000,20000,50000)")
+    run_parser.add_argument('--seed', type=int, default=42, help="Random seed of the request sequence (default 42)")
+    run_parser.add_argument('--output', help="Write the results as JSON to this file")
+    run_parser.add_argument('--compare', help="Result file of an earlier run to compare against")
+
+    args = parser.parse_args()
+    if args.command == 'seed':
+        seed(args.rows, args.days, args.allocators, args.agencies, args.seed)
+    else:
+        run(args)
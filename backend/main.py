@@ -1,16 +1,88 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 import os
+import sys
+import asyncio
+import base64
+import io
+import uuid
+import hashlib
+import json
+import time
+import threading
 from dotenv import load_dotenv
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from psycopg2.pool import ThreadedConnectionPool
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import List, Annotated, get_args, get_origin
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # Responses are gzip-compressed only when brotli-asgi is not installed
+    BrotliMiddleware = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow exports are offered only when pyarrow is installed
+    pa = None
+
+try:
+    import orjson
+except ImportError:  # Responses are encoded with the standard json module when orjson is not installed
+    orjson = None
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="Control Tower API")
+# The overview and the dashboards' registered queries share the modules at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from db_manager import DatabaseManager
+from overview_metrics import OverviewMetrics
+from query_client import QueryClient
+from query_guard import QueryGuard, QueryBusy, QueryTimeout
+from query_registry import QueryRegistry
+from search_service import SearchService
+# Imported only so their queries are registered for /api/queries
+import time_series  # noqa: F401 - registers the dashboard time series
+import top_n  # noqa: F401 - registers the dashboard top-N aggregations
+import allocation_pager  # noqa: F401 - registers the paged allocation list
+from schemas import AllocationStats, AllocationDetail, AllocationPage, QueryRequest
+
+# The API is what client mode talks to; it always queries the databases itself
+QueryClient.API_URL = None
+
+# The API's own queries count against the ingestion database's limits (DB_NAME is the ingestion database)
+API_DATABASE = 'ingestion'
+
+OVERVIEW_DEFAULT_DAYS = 30  # Range of the overview when no dates are given
+
+def json_default(value):
+    if isinstance(value, Decimal):
+        # Whole numbers (counts, integral sums) stay integers, as in jsonable_encoder
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+def dump_json(value):
+    """JSON bytes of API data; Decimal, date and datetime values are encoded directly"""
+    if orjson is not None:
+        return orjson.dumps(value, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=json_default, separators=(",", ":")).encode()
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson (see dump_json)"""
+
+    def render(self, content):
+        return dump_json(content)
+
+app = FastAPI(title="Control Tower API", default_response_class=FastJSONResponse)
 
 # Configure CORS
 app.add_middleware(
@@ -19,8 +91,39 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+# Responses smaller than this are sent uncompressed
+COMPRESS_MIN_SIZE = 1024
+
+# Compress larger payloads: brotli when the client accepts it, gzip otherwise
+if BrotliMiddleware is not None:
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESS_MIN_SIZE, gzip_fallback=True)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_SIZE)
+
+STATS_STREAM_PATH = "/api/allocation-stats/stream"
+
+class IdentityEncoding:
+    """Drops Accept-Encoding on event streams so the compression middleware cannot buffer events"""
+
+    def __init__(self, app, paths):
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.paths:
+            headers = [(name, value) for name, value in scope["headers"] if name != b"accept-encoding"]
+            scope = dict(scope, headers=headers)
+        await self.app(scope, receive, send)
+
+# Added last so it runs before the compression middleware
+app.add_middleware(IdentityEncoding, paths=[STATS_STREAM_PATH])
+
+# Browsers may reuse a response this long, then revalidate it with If-None-Match
+CACHE_CONTROL = "private, max-age=15, must-revalidate"
+
 def get_db_connection():
     return psycopg2.connect(
         database=os.getenv('DB_NAME'),
@@ -31,100 +134,807 @@ def get_db_connection():
         cursor_factory=RealDictCursor
     )
 
-@app.get("/api/allocation-stats")
-async def get_allocation_stats():
+POOL_WAIT = 10  # Seconds a request waits for a pooled connection before answering 503
+
+class PooledDatabase:
+    """
+    DatabaseManager stand-in lending pooled connections to registered queries.
+
+    Each database ('ingestion', 'entity', 'ucf') has one pool of
+    QueryGuard.MAX_CONCURRENT connections shared by all requests, so the
+    dashboards in client mode hold no more than that many connections per
+    database however many Streamlit workers run. Use it as a context
+    manager: connections borrowed by a request go back to their pool on exit.
+    """
+
+    _pools = {}  # database -> (ThreadedConnectionPool, BoundedSemaphore of free connections)
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.borrowed = {}  # database -> connection
+
+    @classmethod
+    def _pool(cls, database):
+        with cls._lock:
+            if database not in cls._pools:
+                pool = ThreadedConnectionPool(
+                    0, QueryGuard.MAX_CONCURRENT,
+                    cursor_factory=RealDictCursor,
+                    connect_timeout=10,
+                    **DatabaseManager().postgres_config(database)
+                )
+                cls._pools[database] = (pool, threading.BoundedSemaphore(QueryGuard.MAX_CONCURRENT))
+            return cls._pools[database]
+
+    def get_cursor(self, database):
+        """Cursor on a pooled connection to the database, None if it cannot connect"""
+        if database not in self.borrowed:
+            pool, free = self._pool(database)
+            # The pool raises instead of waiting when it is exhausted, so wait for a free connection here
+            if not free.acquire(timeout=POOL_WAIT):
+                raise QueryBusy(f"No {database} database connection became free within {POOL_WAIT}s")
+            try:
+                self.borrowed[database] = pool.getconn()
+            except psycopg2.Error as e:
+                free.release()
+                print(f"Error connecting to the {database} database: {str(e)}")
+                return None
+        return self.borrowed[database].cursor()
+
+    def get_ingestion_cursor(self):
+        return self.get_cursor('ingestion')
+
+    def close_connections(self):
+        """Return the borrowed connections to their pools"""
+        for database, conn in self.borrowed.items():
+            pool, free = self._pool(database)
+            if not conn.closed:
+                try:
+                    conn.rollback()  # Ends the request's transaction and its SET LOCAL timeout
+                except psycopg2.Error:
+                    pass
+            pool.putconn(conn, close=bool(conn.closed))
+            free.release()
+        self.borrowed = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close_connections()
+
+# The overview loads its groups on the pooled connections too
+OverviewMetrics.database_class = PooledDatabase
+
+def data_version(cur):
+    """
+    Watermark of allocation_files: changes whenever a row is inserted,
+    updated or deleted, and at midnight (the trends are relative to today)
+
+    Reads only the newest created_at (index lookup) and the table's
+    modification counters from pg_stat_user_tables, never the rows.
+    """
+    QueryGuard.execute(cur, """
+        SELECT
+            (SELECT MAX(created_at) FROM allocation_files) as latest_created_at,
+            (SELECT n_tup_ins + n_tup_upd + n_tup_del FROM pg_stat_user_tables
+             WHERE relid = 'allocation_files'::regclass) as modifications,
+            CURRENT_DATE as today
+    """, None, API_DATABASE, 'light')
+    return cur.fetchone()
+
+def make_etag(request, version):
+    """Weak ETag of an endpoint, its query string and the data version"""
+    key = json.dumps([request.url.path, request.url.query, version], default=str, sort_keys=True)
+    return f'W/"{hashlib.sha1(key.encode()).hexdigest()}"'
+
+def not_modified(request, etag):
+    """304 response when If-None-Match already names this version, else None"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    # Weak comparison: W/ prefixes are ignored on both sides
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    if "*" in tags or etag.removeprefix("W/") in tags:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    return None
+
+def set_cache_headers(response, etag):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent queries into one execution.
+
+    `run(key, func, *args)` runs the blocking `func` in the thread pool,
+    unless a call with the same key is already in flight, in which case the
+    caller waits for that call's result instead. A successful result is
+    then reused for `ttl` seconds, so a burst of identical requests costs
+    the database one query per key. Errors are shared by the waiting
+    callers but never cached, and neither are results `cacheable` rejects.
+    """
+
+    def __init__(self, ttl, cacheable=None):
+        self.ttl = ttl
+        self.cacheable = cacheable  # Optional predicate a result must pass to be reused
+        self.in_flight = {}  # key -> asyncio.Future of the running call
+        self.results = {}  # key -> (expiry time, result)
+
+    def _finish(self, key, future):
+        self.in_flight.pop(key, None)
+        now = time.monotonic()
+        # Drop expired results so the map only holds keys seen within the TTL
+        for expired in [k for k, (expires, _) in self.results.items() if expires <= now]:
+            del self.results[expired]
+        if not future.cancelled() and future.exception() is None:
+            if self.cacheable is None or self.cacheable(future.result()):
+                self.results[key] = (now + self.ttl, future.result())
+
+    async def run(self, key, func, *args):
+        cached = self.results.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        future = self.in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(run_in_threadpool(func, *args))
+            future.add_done_callback(lambda done: self._finish(key, done))
+            self.in_flight[key] = future
+        # A client disconnecting must not cancel the query other clients are waiting for
+        return await asyncio.shield(future)
+
+COALESCE_TTL = 2  # Seconds a coalesced query result is reused
+coalesced = SingleFlight(COALESCE_TTL)
+
+def guarded_fetch(key, load):
+    """
+    QueryGuard.fetch for the API's own queries, which report a fallback
+    through stale_seconds (response headers) rather than pop_degraded()
+
+    The fallback message is dropped here, so it cannot outlive the request
+    on the worker thread and be reported by a later /api/queries call.
+    """
     try:
+        return QueryGuard.fetch(key, load)
+    finally:
+        QueryGuard.pop_degraded()
+
+def query_data_version():
+    def load():
         conn = get_db_connection()
-        cur = conn.cursor()
+        try:
+            return data_version(conn.cursor())
+        finally:
+            conn.close()
+    return guarded_fetch(QueryGuard.key("data_version"), load)[0]
 
-        # Get status counts
-        cur.execute("""
-            SELECT 
-                status,
-                COUNT(*) as count
-            FROM allocation_files
-            GROUP BY status
-            ORDER BY count DESC;
-        """)
-        status_counts = cur.fetchall()
-
-        # Get trend data (last 7 days)
-        cur.execute("""
-            SELECT 
-                DATE(created_at) as date,
-                status,
-                COUNT(*) as count
-            FROM allocation_files
-            WHERE created_at >= NOW() - INTERVAL '7 days'
-            GROUP BY DATE(created_at), status
-            ORDER BY date;
-        """)
-        trend_data = cur.fetchall()
-
-        # Get allocator stats
-        cur.execute("""
-            SELECT 
-                allocator_id,
-                COUNT(*) as total_allocations,
-                COUNT(CASE WHEN status = 'fully-allocated' THEN 1 END) as fully_allocated
-            FROM allocation_files
-            GROUP BY allocator_id
-            ORDER BY total_allocations DESC
-            LIMIT 5;
-        """)
-        allocator_stats = cur.fetchall()
-
-        cur.close()
-        conn.close()
+async def current_version():
+    """Data version as a hashable string (one watermark query per burst of requests)"""
+    version = await coalesced.run(("data_version",), query_data_version)
+    return json.dumps(version, default=str, sort_keys=True)
+
+def unavailable(error):
+    """503 for a query QueryGuard turned away or cancelled, when there is nothing older to serve"""
+    return HTTPException(status_code=503, detail=str(error), headers={"Retry-After": "5"})
+
+def set_stale_headers(response, stale_seconds):
+    """Mark a fallback result served while the database was busy; it must not be cached"""
+    response.headers["Age"] = str(int(stale_seconds))
+    response.headers["Warning"] = '110 - "Response is Stale"'
+    response.headers["Cache-Control"] = "no-store"
+
+def load_allocation_stats(cur):
+    """Status counts, 7-day trend and top allocators of allocation_files"""
+    # Get status counts
+    QueryGuard.execute(cur, """
+        SELECT 
+            status,
+            COUNT(*) as count
+        FROM allocation_files
+        GROUP BY status
+        ORDER BY count DESC;
+    """, None, API_DATABASE)
+    status_counts = cur.fetchall()
+
+    # Get trend data (last 7 days)
+    QueryGuard.execute(cur, """
+        SELECT 
+            DATE(created_at) as date,
+            status,
+            COUNT(*) as count
+        FROM allocation_files
+        WHERE created_at >= NOW() - INTERVAL '7 days'
+        GROUP BY DATE(created_at), status
+        ORDER BY date;
+    """, None, API_DATABASE)
+    trend_data = cur.fetchall()
+
+    # Get allocator stats
+    QueryGuard.execute(cur, """
+        SELECT 
+            allocator_id,
+            COUNT(*) as total_allocations,
+            COUNT(CASE WHEN status = 'fully-allocated' THEN 1 END) as fully_allocated
+        FROM allocation_files
+        GROUP BY allocator_id
+        ORDER BY total_allocations DESC
+        LIMIT 5;
+    """, None, API_DATABASE)
+    allocator_stats = cur.fetchall()
+
+    return {
+        "status_counts": status_counts,
+        "trend_data": trend_data,
+        "allocator_stats": allocator_stats
+    }
+
+def query_allocation_stats():
+    """(stats, stale_seconds), falling back to the last stats when the database is busy"""
+    def load():
+        conn = get_db_connection()
+        try:
+            return load_allocation_stats(conn.cursor())
+        finally:
+            conn.close()
+    return guarded_fetch(QueryGuard.key("allocation_stats"), load)
+
+@app.get("/api/allocation-stats", response_model=AllocationStats)
+async def get_allocation_stats(request: Request, response: Response):
+    try:
+        # Answer repeat polls from the watermark alone
+        version = await current_version()
+        etag = make_etag(request, version)
+        unchanged = not_modified(request, etag)
+        if unchanged:
+            return unchanged
 
-        return {
-            "status_counts": status_counts,
-            "trend_data": trend_data,
-            "allocator_stats": allocator_stats
-        }
+        # Concurrent requests at the same data version share one run of the queries
+        stats, stale_seconds = await coalesced.run(("allocation_stats", version), query_allocation_stats)
 
+        if stale_seconds is None:
+            set_cache_headers(response, etag)
+        else:
+            set_stale_headers(response, stale_seconds)
+        return stats
+
+    except (QueryBusy, QueryTimeout) as e:
+        raise unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/allocation-details")
+class StatsPublisher:
+    """
+    Pushes allocation stat changes to subscribed clients over Server-Sent Events.
+
+    A single watcher task polls the data watermark every WATCH_INTERVAL
+    seconds on behalf of all subscribers, and the stats are only queried
+    again when the watermark moves. Each client gets a `snapshot` event on
+    connect and then `delta` events holding just the sections
+    (status_counts, trend_data, allocator_stats) that changed. The watcher
+    only runs while someone is subscribed.
+    """
+
+    WATCH_INTERVAL = 5  # Seconds between watermark checks
+    KEEPALIVE_INTERVAL = 15  # Seconds of silence before a keep-alive comment is sent
+
+    def __init__(self):
+        self.subscribers = set()
+        self.version = None
+        self.stats = None
+        self.task = None
+
+    @staticmethod
+    def _read(known_version):
+        """(version, stats) from the database; stats is None when the version is unchanged"""
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            version = data_version(cur)
+            if version == known_version:
+                return version, None
+            return version, load_allocation_stats(cur)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _event(name, data, version):
+        event_id = hashlib.sha1(json.dumps(version, default=str, sort_keys=True).encode()).hexdigest()
+        return f"id: {event_id}\nevent: {name}\ndata: {dump_json(data).decode()}\n\n"
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.WATCH_INTERVAL)
+            if not self.subscribers:
+                break
+            try:
+                version, stats = await run_in_threadpool(self._read, self.version)
+            except Exception as e:
+                print(f"Error watching allocation stats: {str(e)}")
+                continue
+            if stats is None:
+                continue
+            delta = {section: rows for section, rows in stats.items() if rows != self.stats.get(section)}
+            self.version, self.stats = version, stats
+            if delta:
+                event = self._event("delta", delta, version)
+                for queue in self.subscribers:
+                    queue.put_nowait(event)
+        self.task = None
+
+    async def subscribe(self, request):
+        """Event stream of one client: a snapshot, then deltas until it disconnects"""
+        queue = asyncio.Queue()
+        if self.task is None:
+            # Nobody was watching, so the last stats may be stale
+            self.version, self.stats = await run_in_threadpool(self._read, None)
+        self.subscribers.add(queue)
+        if self.task is None:
+            self.task = asyncio.create_task(self._watch())
+        try:
+            yield self._event("snapshot", self.stats, self.version)
+            while not await request.is_disconnected():
+                try:
+                    yield await asyncio.wait_for(queue.get(), self.KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            self.subscribers.discard(queue)
+
+stats_publisher = StatsPublisher()
+
+@app.get(STATS_STREAM_PATH)
+async def stream_allocation_stats(request: Request):
+    """Server-Sent Events feed of /api/allocation-stats: a snapshot, then deltas when the data changes"""
+    return StreamingResponse(
+        stats_publisher.subscribe(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Columns returned per allocation; the JSONB payload columns are never shipped whole
+ALLOCATION_DETAIL_COLUMNS = """
+    allocation_id,
+    allocation_name,
+    allocator_id,
+    allocator_name,
+    agency_id,
+    agency_name,
+    status,
+    product->>'name' as product_name,
+    bucket->>'name' as bucket_name,
+    total_records,
+    total_outstanding,
+    created_at
+"""
+
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(row):
+    """Opaque cursor pointing after a row: base64 of its (created_at, allocation_id)"""
+    key = [row['created_at'].isoformat(), str(row['allocation_id'])]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """(created_at, allocation_id) of a cursor made by encode_cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, allocation_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), allocation_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def estimate_rows(cur, query, params):
+    """Planner row estimate of a query, without running it"""
+    QueryGuard.execute(cur, "EXPLAIN (FORMAT JSON) " + query, params, API_DATABASE, 'light')
+    return int(cur.fetchone()['QUERY PLAN'][0]['Plan']['Plan Rows'])
+
+def allocation_filters(status, allocator_id, start_date, end_date):
+    """
+    WHERE conditions (each starting with AND) and parameters of the allocation filters
+
+    Rows without created_at are left out: they have no place in the
+    (created_at, allocation_id) keyset order and no cursor can point past them.
+    """
+    filters = " AND created_at IS NOT NULL"
+    params = []
+
+    if status:
+        filters += " AND status = %s"
+        params.append(status)
+    if allocator_id:
+        filters += " AND allocator_id = %s"
+        params.append(allocator_id)
+    if start_date:
+        filters += " AND created_at >= %s"
+        params.append(start_date)
+    if end_date:
+        filters += " AND created_at <= %s"
+        params.append(end_date)
+
+    return filters, params
+
+def load_allocation_page(status, allocator_id, start_date, end_date, limit, after, include_total):
+    """One page of allocations after the (created_at, allocation_id) key `after`"""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        filters, params = allocation_filters(status, allocator_id, start_date, end_date)
+
+        estimated_total = None
+        if include_total:
+            estimated_total = estimate_rows(
+                cur, "SELECT allocation_id FROM allocation_files WHERE 1=1" + filters, params)
+
+        query = f"SELECT {ALLOCATION_DETAIL_COLUMNS} FROM allocation_files WHERE 1=1" + filters
+        page_params = list(params)
+        if after:
+            query += " AND (created_at, allocation_id) < (%s, %s)"
+            page_params.extend(after)
+
+        # One extra row tells whether there is a next page
+        query += " ORDER BY created_at DESC, allocation_id DESC LIMIT %s"
+        page_params.append(limit + 1)
+
+        QueryGuard.execute(cur, query, page_params, API_DATABASE)
+        results = cur.fetchall()
+    finally:
+        conn.close()
+
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        next_cursor = encode_cursor(results[-1])
+
+    return {
+        "items": results,
+        "next_cursor": next_cursor,
+        "estimated_total": estimated_total
+    }
+
+def query_allocation_page(*page_args):
+    """(page, stale_seconds), falling back to the last copy of the same page when the database is busy"""
+    return guarded_fetch(
+        QueryGuard.key("allocation_details", *page_args), lambda: load_allocation_page(*page_args))
+
+@app.get("/api/allocation-details", response_model=AllocationPage)
 async def get_allocation_details(
+    request: Request,
+    response: Response,
     status: str = None,
     allocator_id: str = None,
     start_date: str = None,
     end_date: str = None,
-    limit: int = 10,
-    offset: int = 0
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = None,
+    include_total: bool = False
 ):
+    """
+    Allocations newest first, one keyset page at a time
+
+    Pages continue from `cursor` (the `next_cursor` of the previous page)
+    with `WHERE (created_at, allocation_id) < (...)` instead of an OFFSET,
+    so a deep page costs the same as the first one given an index on
+    (created_at, allocation_id). `estimated_total` is the planner's row
+    estimate for the filters, only computed when include_total is set.
+    """
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
+        after = decode_cursor(cursor) if cursor else None
 
-        query = "SELECT * FROM allocation_files WHERE 1=1"
-        params = []
-
-        if status:
-            query += " AND status = %s"
-            params.append(status)
-        if allocator_id:
-            query += " AND allocator_id = %s"
-            params.append(allocator_id)
-        if start_date:
-            query += " AND created_at >= %s"
-            params.append(start_date)
-        if end_date:
-            query += " AND created_at <= %s"
-            params.append(end_date)
-
-        query += " ORDER BY created_at DESC LIMIT %s OFFSET %s"
-        params.extend([limit, offset])
+        version = await current_version()
+        etag = make_etag(request, version)
+        unchanged = not_modified(request, etag)
+        if unchanged:
+            return unchanged
 
-        cur.execute(query, params)
-        results = cur.fetchall()
+        # Normalized key: the same filters in any parameter order share one query
+        key = ("allocation_details", version, status, allocator_id, start_date, end_date, limit, after, include_total)
+        page, stale_seconds = await coalesced.run(
+            key, query_allocation_page, status, allocator_id, start_date, end_date, limit, after, include_total)
+
+        if stale_seconds is None:
+            set_cache_headers(response, etag)
+        else:
+            set_stale_headers(response, stale_seconds)
+        return page
+
+    except HTTPException:
+        raise
+    except (QueryBusy, QueryTimeout) as e:
+        raise unavailable(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+EXPORT_BATCH_ROWS = 10000  # Rows fetched from the server-side cursor and written per chunk
+
+# Export format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+}
 
-        cur.close()
+def export_batches(status, allocator_id, start_date, end_date):
+    """
+    Every matching allocation, newest first, in EXPORT_BATCH_ROWS lists of rows
+
+    Reads one server-side (named) cursor, so only one batch is in memory at
+    a time however many rows match. Decimals become floats, as in the JSON API.
+    """
+    filters, params = allocation_filters(status, allocator_id, start_date, end_date)
+    query = (f"SELECT {ALLOCATION_DETAIL_COLUMNS} FROM allocation_files WHERE 1=1" + filters
+             + " ORDER BY created_at DESC, allocation_id DESC")
+    conn = get_db_connection()
+    try:
+        # Exports run under the export time limit but take no query slot for the whole download
+        with conn.cursor() as setup:
+            QueryGuard.set_timeout(setup, 'export')
+        cur = conn.cursor(name=f"export_{uuid.uuid4().hex}")
+        cur.execute(query, params)
+        while True:
+            rows = cur.fetchmany(EXPORT_BATCH_ROWS)
+            if not rows:
+                break
+            yield [
+                {column: float(value) if isinstance(value, Decimal) else value for column, value in row.items()}
+                for row in rows
+            ]
+    finally:
         conn.close()
 
-        return results
+def ndjson_chunks(batches):
+    """One JSON object per line, one chunk per batch"""
+    for rows in batches:
+        yield b"".join(dump_json(row) + b"\n" for row in rows)
+
+# Arrow type of each AllocationDetail field type
+ARROW_TYPES = {
+    str: lambda: pa.string(),
+    int: lambda: pa.int64(),
+    float: lambda: pa.float64(),
+    datetime: lambda: pa.timestamp("us"),
+}
+
+def allocation_arrow_schema():
+    """
+    Arrow schema of the allocation export, one field per AllocationDetail field
+
+    Fixed up front rather than inferred from the first batch, so a column
+    that happens to be all NULL there keeps its type in every batch.
+    """
+    fields = []
+    for name, field in AllocationDetail.model_fields.items():
+        annotation = field.annotation
+        # Optional[X] -> X, then Annotated[X, ...] -> X
+        annotation = next((arg for arg in get_args(annotation) if arg is not type(None)), annotation)
+        if get_origin(annotation) is Annotated:
+            annotation = get_args(annotation)[0]
+        fields.append(pa.field(name, ARROW_TYPES[annotation](), nullable=not field.is_required()))
+    return pa.schema(fields)
+
+def arrow_chunks(batches):
+    """Arrow IPC stream: the schema, then one record batch per chunk"""
+    schema = allocation_arrow_schema()
+    # IDs are text in the API whatever their column type
+    text_columns = [field.name for field in schema if pa.types.is_string(field.type)]
+    buffer = io.BytesIO()
+    writer = pa.ipc.new_stream(buffer, schema)
+    for rows in batches:
+        for row in rows:
+            for column in text_columns:
+                if row[column] is not None and not isinstance(row[column], str):
+                    row[column] = str(row[column])
+        writer.write_batch(pa.RecordBatch.from_pylist(rows, schema=schema))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    writer.close()
+    yield buffer.getvalue()
+
+@app.get("/api/allocation-details/export")
+def export_allocation_details(
+    format: str = "ndjson",
+    status: str = None,
+    allocator_id: str = None,
+    start_date: str = None,
+    end_date: str = None
+):
+    """
+    Stream every matching allocation as NDJSON or an Arrow IPC stream
+
+    Rows come from a single server-side cursor in EXPORT_BATCH_ROWS
+    batches. The next batch is only fetched once the previous chunk has
+    been handed to the client connection, so a slow reader slows the cursor
+    down instead of filling server memory.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format '{format}', expected one of {list(EXPORT_FORMATS)}")
+    if format == "arrow" and pa is None:
+        raise HTTPException(status_code=501, detail="Arrow export needs pyarrow on the server")
+
+    batches = export_batches(status, allocator_id, start_date, end_date)
+    chunks = arrow_chunks(batches) if format == "arrow" else ndjson_chunks(batches)
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="allocations.{extension}"'}
+    )
+
+def settled(results):
+    """Whether overview results may be reused: no group failed or served a fallback"""
+    return all(result['data'] is not None and not result['degraded'] for result in results.values())
+
+# Like OverviewMetrics' own cache, fallback and failed groups are not reused, so the next request retries
+overview_results = SingleFlight(COALESCE_TTL, cacheable=settled)
+
+def parse_date(value, name):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} '{value}', expected YYYY-MM-DD")
+
+@app.get("/api/overview")
+async def get_overview(
+    request: Request,
+    response: Response,
+    start_date: str = None,
+    end_date: str = None,
+    groups: List[str] = Query(None)
+):
+    """
+    Several overview metric groups in one response
+
+    `groups` may be repeated or comma-separated (summary, channels, users,
+    onboarding; default all). The groups live in three databases and are
+    loaded concurrently through the same OverviewMetrics cache the
+    Streamlit dashboard uses. Each group reports its data, whether it was
+    served from the cache, how long it took and when it was computed.
+    """
+    names = [name.strip() for value in (groups or []) for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in OverviewMetrics.GROUPS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown metric groups {unknown}, expected some of {list(OverviewMetrics.GROUPS)}")
+
+    end = parse_date(end_date, "end_date") if end_date else date.today()
+    start = parse_date(start_date, "start_date") if start_date else end - timedelta(days=OVERVIEW_DEFAULT_DAYS)
+    if start > end:
+        start, end = end, start
+
+    started = datetime.now()
+    # Concurrent cache misses for the same groups and range load them once
+    key = ("overview", tuple(sorted(set(names))), start, end)
+    results = await overview_results.run(key, OverviewMetrics.fetch, names or None, start.isoformat(), end.isoformat())
+
+    # The version of the response is the version of every cached group in it
+    etag = make_etag(request, {group: result['computed_at'] for group, result in results.items()})
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+
+    if any(result['degraded'] for result in results.values()):
+        # Some group is an older fallback result; let the next request try again
+        response.headers["Cache-Control"] = "no-store"
+    else:
+        set_cache_headers(response, etag)
+    return {
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "elapsed_ms": round((datetime.now() - started).total_seconds() * 1000, 1),
+        "groups": results
+    }
 
+QUERY_CACHE_TTL = 60  # Seconds a registered query result is shared by every dashboard worker
+QUERY_MAX_LIMIT = 10000  # Most rows a 'limit' parameter of /api/queries may ask for (NULL is capped too)
+
+def shareable(result):
+    """Whether a query result may be reused: not a fallback, not a failed connection"""
+    return not result["degraded"] and result.get("rows", []) is not None
+
+query_results = SingleFlight(QUERY_CACHE_TTL, cacheable=shareable)
+
+# Python type -> column type the query client restores (datetime before its base class date)
+VALUE_TYPES = ((datetime, "datetime"), (date, "date"), (Decimal, "decimal"))
+
+def encode_rows(rows):
+    """
+    Rows as column names, column types and value lists
+
+    Decimals are sent as text so the client gets back the exact value;
+    date and datetime values are ISO strings. A column's type is taken from
+    its first non-null value.
+    """
+    columns = list(rows[0]) if rows else []
+    types = {}
+    for column in columns:
+        value = next((row[column] for row in rows if row[column] is not None), None)
+        for value_type, name in VALUE_TYPES:
+            if isinstance(value, value_type):
+                types[column] = name
+                break
+    values = [[str(value) if isinstance(value, Decimal) else value for value in row.values()] for row in rows]
+    return {"columns": columns, "types": types, "rows": values}
+
+def cap_limit(params):
+    """Parameters with a missing (NULL) or larger 'limit' capped at QUERY_MAX_LIMIT"""
+    if not params or 'limit' not in params:
+        return params
+    limit = params['limit']
+    if limit is not None and (isinstance(limit, bool) or not isinstance(limit, int) or limit < 0):
+        raise HTTPException(status_code=400, detail=f"Invalid limit {limit!r}, expected a non-negative integer")
+    if limit is None or limit > QUERY_MAX_LIMIT:
+        return dict(params, limit=QUERY_MAX_LIMIT)
+    return params
+
+def run_registered_query(name, params, mode):
+    """Result of a registered query on the pooled connections ('rows' is None if unreachable)"""
+    QueryGuard.pop_degraded()  # Only this query's fallbacks are reported, not leftovers on this worker thread
+    with PooledDatabase() as db:
+        if mode == "estimate":
+            return {"estimate": QueryRegistry.fetch_estimate(db, name, params), "degraded": []}
+        if mode == "one":
+            row = QueryRegistry.fetch_one(db, name, params)
+            rows = None if row is None else [row]
+        else:
+            rows = QueryRegistry.fetch_all(db, name, params)
+    degraded = QueryGuard.pop_degraded()
+    result = encode_rows(rows) if rows is not None else {"columns": [], "types": {}, "rows": None}
+    result["degraded"] = degraded
+    return result
+
+@app.post("/api/queries/{name}")
+async def run_query(name: str, body: QueryRequest):
+    """
+    A registered dashboard query, run for the Streamlit pages in client mode
+
+    Runs QueryRegistry's SQL for `name` with the named parameters on the
+    API's pooled connections, under QueryGuard's limits. Identical requests
+    from every dashboard worker share one execution and, for
+    QUERY_CACHE_TTL seconds, its result; results of ingestion queries are
+    also keyed by the data version, so new allocations show up at once.
+    `degraded` lists the fallback messages when an older result was served.
+
+    Only queries registered as remote (the ones the dashboards run in client
+    mode) are served, and a 'limit' parameter is capped at QUERY_MAX_LIMIT.
+    The endpoint has no authentication: the API must only be reachable from
+    the dashboard hosts.
+    """
+    try:
+        query = QueryRegistry.get(name)
+    except KeyError:
+        query = None
+    if query is None or not query.remote:
+        raise HTTPException(status_code=404, detail=f"Unknown query '{name}'")
+
+    params = cap_limit(body.params or None)
+    try:
+        version = await current_version() if query.database == API_DATABASE else None
+        key = ("query", name, QueryGuard.key(params), body.mode, version)
+        result = await query_results.run(key, run_registered_query, name, params, body.mode)
+    except (QueryBusy, QueryTimeout) as e:
+        raise unavailable(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    # Rendered directly: the rows are already plain JSON values
+    return FastJSONResponse(result)
+
+def run_search(kind, term, limit):
+    with PooledDatabase() as db:
+        rows = SearchService.search_rows(db, kind, term, limit)
+    result = encode_rows(rows) if rows is not None else {"columns": [], "types": {}, "rows": None}
+    result["degraded"] = []
+    return result
+
+@app.get("/api/search")
+async def search_names(kind: str, term: str, limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE)):
+    """SearchService name search (agency, allocator or allocation) on the pooled connections"""
+    if kind not in SearchService.KINDS:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown search kind '{kind}', expected one of {list(SearchService.KINDS)}")
+    try:
+        result = await query_results.run(("search", kind, term.strip(), limit), run_search, kind, term, limit)
+    except (QueryBusy, QueryTimeout) as e:
+        raise unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return FastJSONResponse(result)
@@ -0,0 +1,54 @@
+import datetime
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, BeforeValidator
+from typing_extensions import Annotated, Literal
+
+# Response schemas of the Control Tower API. Endpoints declare them as
+# response_model, so FastAPI validates and serializes the RealDictCursor rows
+# in pydantic-core (Decimal -> float, datetime -> ISO string) instead of
+# walking every dict through its generic jsonable_encoder.
+
+# IDs are text in the API whatever their column type
+Identifier = Annotated[str, BeforeValidator(str)]
+
+class StatusCount(BaseModel):
+    status: Optional[str] = None
+    count: int
+
+class TrendPoint(BaseModel):
+    date: datetime.date
+    status: Optional[str] = None
+    count: int
+
+class AllocatorStat(BaseModel):
+    allocator_id: Optional[Identifier] = None
+    total_allocations: int
+    fully_allocated: int
+
+class AllocationStats(BaseModel):
+    status_counts: List[StatusCount]
+    trend_data: List[TrendPoint]
+    allocator_stats: List[AllocatorStat]
+
+class AllocationDetail(BaseModel):
+    allocation_id: Identifier
+    allocation_name: Optional[str] = None
+    allocator_id: Optional[Identifier] = None
+    allocator_name: Optional[str] = None
+    agency_id: Optional[Identifier] = None
+    agency_name: Optional[str] = None
+    status: Optional[str] = None
+    product_name: Optional[str] = None
+    bucket_name: Optional[str] = None
+    total_records: Optional[int] = None
+    total_outstanding: Optional[float] = None
+    created_at: datetime.datetime
+
+class AllocationPage(BaseModel):
+    items: List[AllocationDetail]
+    next_cursor: Optional[str] = None  # Opaque cursor of the next page, None on the last page
+    estimated_total: Optional[int] = None  # Planner estimate, only with include_total=true
+
+class QueryRequest(BaseModel):
+    params: Optional[Dict[str, Any]] = None  # Named parameters of the registered query
+    mode: Literal['all', 'one', 'estimate'] = 'all'  # All rows, the first row or the planner row estimate
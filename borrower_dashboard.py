@@ -7,6 +7,10 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from export_service import ExportService
+from aggregation_manager import AggregationManager
+from db_manager import ConnectionDatabase
+from query_registry import QueryRegistry
 
 # Load environment variables
 load_dotenv()
@@ -47,67 +51,37 @@ def format_currency(value):
     else:  # 1 crore or more
         return f"₹{value/10000000:.2f}Cr"
 
+# Registered borrower queries (query_registry.py) run on a UCF connection opened on first use,
+# or through the API in client mode
+def borrower_database():
+    return ConnectionDatabase(get_db_connection)
+
 # Function to load borrower data
 @st.cache_data(ttl=300)  # Cache for 5 minutes
 def load_borrower_data(limit=None):
-    conn = get_db_connection()
-    if not conn:
-        return None
-    
     try:
-        with conn.cursor() as cur:
-            query = """
-                SELECT 
-                    id, name, phone_number, email, loan_sanctioned_date, 
-                    loan_sanctioned_amount, total_dues, total_outstanding_amount,
-                    due_date, channel, is_closed, customer_city, customer_state,
-                    loan_type, credit_score, employment_status, monthly_income,
-                    gender, date_of_birth, status, days_past_due, risk_tagging,
-                    bucket_type, last_payment_date, last_payment_amount,
-                    created_at, updated_at
-                FROM borrower_details
-                WHERE is_active = true
-            """
-            
-            if limit:
-                query += f" LIMIT {limit}"
-                
-            cur.execute(query)
-            data = cur.fetchall()
-            return pd.DataFrame(data)
+        with borrower_database() as db:
+            data = QueryRegistry.fetch_all(db, "borrower.list", {'limit': limit})
+        if data is None:
+            return None
+        return AggregationManager.optimize_dtypes(pd.DataFrame(data), label="borrowers")
     except Exception as e:
         st.error(f"Error loading data: {e}")
         return None
-    finally:
-        conn.close()
+
+# Function to stream every active borrower for export
+def stream_borrower_data():
+    with borrower_database() as db:
+        yield from ExportService.stream_query(db, "borrower.list", {'limit': None})
 
 # Function to get summary metrics
 def get_summary_metrics():
-    conn = get_db_connection()
-    if not conn:
-        return None
-    
     try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT 
-                    COUNT(*) as total_borrowers,
-                    COUNT(CASE WHEN is_closed = true THEN 1 END) as closed_accounts,
-                    COUNT(CASE WHEN is_closed = false OR is_closed IS NULL THEN 1 END) as active_accounts,
-                    SUM(loan_sanctioned_amount) as total_sanctioned,
-                    SUM(total_outstanding_amount) as total_outstanding,
-                    AVG(CASE WHEN credit_score IS NOT NULL THEN credit_score ELSE NULL END) as avg_credit_score,
-                    COUNT(DISTINCT loan_type) as loan_types,
-                    COUNT(DISTINCT customer_state) as states_covered
-                FROM borrower_details
-                WHERE is_active = true
-            """)
-            return cur.fetchone()
+        with borrower_database() as db:
+            return QueryRegistry.fetch_one(db, "borrower.summary")
     except Exception as e:
         st.error(f"Error getting metrics: {e}")
         return None
-    finally:
-        conn.close()
 
 # Main dashboard
 def main():
@@ -194,21 +168,22 @@ def main():
         
         # State-wise distribution
         if 'customer_state' in df.columns:
-            state_counts = df['customer_state'].value_counts().reset_index()
+            # Top 10 plus an exact "Others" bar, so the tail is not dropped
+            state_counts, totals = AggregationManager.top_n_with_others(df, 'customer_state', n=10)
             state_counts.columns = ['State', 'Count']
             
-            fig = px.bar(state_counts.head(10), x='State', y='Count',
-                         title='Top 10 States by Borrower Count',
+            fig = px.bar(state_counts, x='State', y='Count',
+                         title=f"Top 10 States by Borrower Count ({totals['Count']:,} borrowers)",
                          color='Count')
             st.plotly_chart(fig, use_container_width=True)
         
         # City-wise distribution
         if 'customer_city' in df.columns:
-            city_counts = df['customer_city'].value_counts().reset_index()
+            city_counts, totals = AggregationManager.top_n_with_others(df, 'customer_city', n=10)
             city_counts.columns = ['City', 'Count']
             
-            fig = px.bar(city_counts.head(10), x='City', y='Count',
-                         title='Top 10 Cities by Borrower Count',
+            fig = px.bar(city_counts, x='City', y='Count',
+                         title=f"Top 10 Cities by Borrower Count ({totals['Count']:,} borrowers)",
                          color='Count')
             st.plotly_chart(fig, use_container_width=True)
     
@@ -270,13 +245,9 @@ def main():
         st.subheader("Raw Data")
         st.dataframe(df.head(100))
         
-        # Allow downloading the data
-        csv = df.to_csv(index=False)
-        st.download_button(
-            label="Download Data as CSV",
-            data=csv,
-            file_name="borrower_details.csv",
-            mime="text/csv",
+        # Allow downloading the data - built on request, streamed from the database
+        ExportService.download(
+            "download_borrower_details", "Download Data", "borrower_details", stream_borrower_data
         )
 
 if __name__ == "__main__":
@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+import streamlit as st
+from query_registry import QueryRegistry
+
+class ChannelManager:
+    """
+    Batched lookup of the UCF channel assigned to each allocation.
+    Keeps a process-wide allocation_record_id -> channel mapping that is filled
+    on demand for the IDs a page actually displays, and refreshed incrementally
+    from borrower_details.updated_at instead of being rebuilt from a full scan.
+    The mapping keeps the MAX_IDS most recently looked-up IDs, which bounds both
+    its memory and the IDs each refresh re-checks.
+    Lookups are registered queries, so in client mode they go through the API
+    and the dashboard opens no UCF connection.
+    """
+
+    CHUNK_SIZE = 500  # IDs sent per `= ANY(%s)` round trip
+    REFRESH_INTERVAL = 300  # Seconds between incremental refreshes
+    DEFAULT_CHANNEL = "Not Assigned"
+    MAX_IDS = 20000  # Most recently looked-up IDs kept (and refreshed) in the mapping
+
+    def __init__(self):
+        # allocation_record_id -> channel (None when UCF has no channel for it), least recently used first
+        self._mapping = OrderedDict()
+        self._watermark = None
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _chunks(values, size):
+        for i in range(0, len(values), size):
+            yield values[i:i + size]
+
+    @staticmethod
+    def _rows(db, name, params=None):
+        """Rows of a registered UCF query; ConnectionError when the database is unreachable"""
+        rows = QueryRegistry.fetch_all(db, name, params)
+        if rows is None:
+            raise ConnectionError("UCF database unreachable")
+        return rows
+
+    def _db_now(self, db):
+        return self._rows(db, "allocation_details.channel_clock")[0]['now']
+
+    def _fetch_channels(self, db, ids):
+        """Fetch MAX(channel) for the given allocation IDs, chunk by chunk"""
+        for chunk in self._chunks(ids, self.CHUNK_SIZE):
+            rows = self._rows(db, "allocation_details.channel_lookup", {'allocation_ids': chunk})
+            found = {row['allocation_record_id']: row['channel'] for row in rows}
+            for allocation_id in chunk:
+                self._mapping[allocation_id] = found.get(allocation_id) or None
+
+    def _refresh(self, db):
+        """Re-read only the known allocations whose borrower rows changed since the last watermark"""
+        new_watermark = self._db_now(db)
+        known_ids = list(self._mapping.keys())
+        changed_ids = []
+        for chunk in self._chunks(known_ids, self.CHUNK_SIZE):
+            rows = self._rows(db, "allocation_details.channel_changes", {
+                'allocation_ids': chunk,
+                'since': self._watermark
+            })
+            changed_ids.extend(row['allocation_record_id'] for row in rows)
+
+        if changed_ids:
+            self._fetch_channels(db, changed_ids)
+            print(f"Refreshed channel mapping for {len(changed_ids)} allocations")
+
+        self._watermark = new_watermark
+        self._last_refresh = time.time()
+
+    def lookup(self, db, allocation_ids):
+        """
+        Get the channel for each of the given allocation IDs.
+
+        Parameters:
+        - db: DatabaseManager used to reach the UCF database (unused in client mode)
+        - allocation_ids: Iterable of allocation IDs to resolve
+
+        Returns:
+        - Series indexed by allocation ID holding the channel (None if not assigned)
+        """
+        ids = pd.Series(list(allocation_ids), dtype=object).dropna().unique().tolist()
+
+        with self._lock:
+            missing = [i for i in ids if i not in self._mapping]
+            due = self._watermark is not None and time.time() - self._last_refresh >= self.REFRESH_INTERVAL
+
+            if missing or due:
+                try:
+                    if due:
+                        self._refresh(db)
+                    if missing:
+                        if self._watermark is None:
+                            self._watermark = self._db_now(db)
+                            self._last_refresh = time.time()
+                        self._fetch_channels(db, missing)
+                except ConnectionError as e:
+                    # Unknown channels show as not assigned until the database is back
+                    print(f"Error looking up channels: {str(e)}")
+                except Exception as e:
+                    print(f"Error looking up channels: {str(e)}")
+                    st.error(f"Error looking up channels: {str(e)}")
+
+            channels = pd.Series({i: self._mapping.get(i) for i in ids}, dtype=object)
+            # Mark these IDs as recently used, then forget the oldest beyond MAX_IDS
+            for i in ids:
+                if i in self._mapping:
+                    self._mapping.move_to_end(i)
+            while len(self._mapping) > self.MAX_IDS:
+                self._mapping.popitem(last=False)
+            return channels
+
+    def merge_channels(self, db, df, id_column, channel_column="Channel Assigned"):
+        """
+        Add a channel column to a DataFrame by looking up only the IDs it contains.
+
+        Parameters:
+        - db: DatabaseManager used to reach the UCF database
+        - df: DataFrame holding the allocation IDs
+        - id_column: Column name containing allocation IDs
+        - channel_column: Name of the column to add
+
+        Returns:
+        - The DataFrame with the channel column added
+        """
+        if df is None or df.empty:
+            return df
+
+        channels = self.lookup(db, df[id_column])
+        df[channel_column] = df[id_column].map(channels).fillna(self.DEFAULT_CHANNEL)
+        return df
+
+    def clear(self):
+        """Drop the cached mapping so it is rebuilt on the next lookup"""
+        with self._lock:
+            self._mapping = OrderedDict()
+            self._watermark = None
+            self._last_refresh = 0.0
+
+@st.cache_resource
+def get_channel_manager():
+    """Shared ChannelManager instance that persists across reruns and sessions"""
+    return ChannelManager()
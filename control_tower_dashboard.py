@@ -28,8 +28,8 @@ except Exception as e:
     st.write(f"Python path: {sys.path}")
     raise
 
-from db_manager import DatabaseManager
-from cache_manager import CacheManager
+from overview_metrics import OverviewMetrics
+from date_range import DateRangeState
 from aggregation_manager import AggregationManager
 
 # Function to format date
@@ -50,9 +50,6 @@ def format_amount(amount):
 def view_all_button(page_name):
     return f'<a href="/{page_name}" target="_self" class="view-all-btn">View All</a>'
 
-# Initialize database connections
-db = DatabaseManager()
-
 # Custom CSS for styling
 st.markdown("""
     <style>
@@ -337,48 +334,6 @@ st.sidebar.markdown('<span class="sidebar-title">Yucollect Control Tower</span>'
 if 'view_all_target' not in st.session_state:
     st.session_state.view_all_target = None
 
-# Function to get earliest date from database
-def get_earliest_date():
-    try:
-        cur = db.get_ingestion_cursor()
-        if not cur:
-            return (datetime.now() - timedelta(days=30)).date()
-            
-        cur.execute("""
-            SELECT MIN(created_at)::date
-            FROM allocation_files
-            WHERE created_at IS NOT NULL;
-        """)
-        result = cur.fetchone()
-        return result['min'] if result and result['min'] else (datetime.now() - timedelta(days=30)).date()
-    except Exception as e:
-        st.error(f"Error getting earliest date: {str(e)}")
-        return (datetime.now() - timedelta(days=30)).date()
-
-# Always get the earliest date first
-earliest_date = get_earliest_date()
-
-# Initialize session state for dates
-if 'start_date' not in st.session_state:
-    st.session_state.start_date = earliest_date
-if 'end_date' not in st.session_state:
-    st.session_state.end_date = datetime.now().date()
-
-# Update function for date sync
-def update_dates(changed_key, value):
-    if changed_key == 'main_start_date':
-        st.session_state.start_date = value
-        # Update all other start dates in session state
-        for k in st.session_state.keys():
-            if k.endswith('_start_date') and k != 'main_start_date':
-                st.session_state[k] = value
-    elif changed_key == 'main_end_date':
-        st.session_state.end_date = value
-        # Update all other end dates in session state
-        for k in st.session_state.keys():
-            if k.endswith('_end_date') and k != 'main_end_date':
-                st.session_state[k] = value
-
 # Header with title and date controls
 st.markdown("""
 <div class="header-container">
@@ -419,37 +374,16 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Date Range Filter
-col1, col2, col3, col4, col5, col6 = st.columns([0.15, 0.4, 0.12, 0.15, 0.4, 0.6])
+# Date Range Filter - the range is shared with every page
+col1, col2, col3 = st.columns([0.15, 1.07, 0.6])
 
 with col1:
-    st.markdown('<div class="date-label">Start Date</div>', unsafe_allow_html=True)
+    st.markdown('<div class="date-label">Date Range</div>', unsafe_allow_html=True)
 
 with col2:
-    start_date = st.date_input(
-        "",
-        value=st.session_state.start_date,
-        key="main_start_date",
-        label_visibility="collapsed",
-        on_change=lambda: update_dates('main_start_date', st.session_state.main_start_date)
-    )
+    start_date_str, end_date_str = DateRangeState.date_filter("main", label_visibility="collapsed")
 
 with col3:
-    st.markdown('<div class="date-separator">To</div>', unsafe_allow_html=True)
-
-with col4:
-    st.markdown('<div class="date-label">End Date</div>', unsafe_allow_html=True)
-
-with col5:
-    end_date = st.date_input(
-        "",
-        value=st.session_state.end_date,
-        key="main_end_date",
-        label_visibility="collapsed",
-        on_change=lambda: update_dates('main_end_date', st.session_state.main_end_date)
-    )
-
-with col6:
     st.markdown(f'<div class="refresh-info">Last Refreshed On: {format_date(datetime.now())} {datetime.now().strftime("%I:%M %p")}</div>', unsafe_allow_html=True)
 
 st.markdown('</div></div>', unsafe_allow_html=True)
@@ -457,60 +391,16 @@ st.markdown('</div></div>', unsafe_allow_html=True)
 # Summary Section
 st.markdown('<h2 class="section-heading">Summary</h2>', unsafe_allow_html=True)
 
-# Convert dates to strings for SQL queries
-start_date_str = start_date.strftime('%Y-%m-%d')
-end_date_str = end_date.strftime('%Y-%m-%d')
-
-# Get summary metrics
-def get_summary_metrics(start_date, end_date):
-    try:
-        # Get ingestion database connection
-        cur = db.get_ingestion_cursor()
-        if not cur:
-            return None
-            
-        # Get summary metrics
-        cur.execute("""
-            WITH summary AS (
-                SELECT 
-                    COUNT(DISTINCT agency_id) as total_agencies,
-                    COUNT(DISTINCT allocator_id) as total_allocators,
-                    COUNT(DISTINCT allocation_id) as total_allocations,
-                    COUNT(DISTINCT CONCAT(allocator_id, '-', product->>'name', '-', bucket->>'name')) as unique_lobs,
-                    SUM(total_records) as total_records,
-                    SUM(total_outstanding) as total_outstanding,
-                    (
-                        SELECT COALESCE(SUM(collection_amount), 0)
-                        FROM allocation_payments
-                        WHERE created_at BETWEEN %s AND %s
-                    ) as total_collections
-                FROM allocation_files
-                WHERE created_at BETWEEN %s AND %s
-            )
-            SELECT 
-                total_agencies,
-                total_allocators,
-                total_allocations,
-                unique_lobs,
-                total_records,
-                total_outstanding,
-                total_collections,
-                CASE 
-                    WHEN total_outstanding > 0 
-                    THEN ROUND((total_collections::float / NULLIF(total_outstanding, 0) * 100)::numeric, 2)
-                    ELSE 0 
-                END as collection_percentage
-            FROM summary;
-        """, (start_date, end_date, start_date, end_date))
-        
-        summary = cur.fetchone()
-        return summary
-    except Exception as e:
-        st.error(f"Error getting summary metrics: {str(e)}")
-        return None
+# Load every overview metric group at once: the databases are queried concurrently
+# and results are shared with the /api/overview endpoint through OverviewMetrics
+overview = OverviewMetrics.fetch(start_date=start_date_str, end_date=end_date_str)
+for group, result in overview.items():
+    if result['error']:
+        st.error(f"Error getting {group} metrics: {result['error']}")
+    for message in result['degraded']:
+        st.warning(message)
 
-# Get summary metrics with caching
-summary = CacheManager.get_date_filtered_data(get_summary_metrics, start_date_str, end_date_str)
+summary = overview['summary']['data']
 
 if not summary:
     st.warning("⚠️ Some tables are missing in the QA environment. This is expected as you're not connected to production.")
@@ -599,58 +489,7 @@ with col4:
 # Channel Distribution Section
 st.markdown('<h2 class="section-heading">Channel Distribution</h2>', unsafe_allow_html=True)
 
-# Get channel metrics
-def get_channel_metrics():
-    try:
-        # Get UCF database connection
-        cur = db.get_ucf_cursor()
-        if not cur:
-            return None
-            
-        # Get records processed via channel from borrower_details
-        cur.execute("""
-            SELECT
-                COUNT(DISTINCT CASE WHEN UPPER(channel) = 'FIELD' THEN id END) as records_field,
-                COUNT(DISTINCT CASE WHEN UPPER(channel) = 'CALL' THEN id END) as records_call,
-                COUNT(DISTINCT CASE WHEN UPPER(channel) = 'DIGITAL' THEN id END) as records_digital
-            FROM borrower_details
-        """)
-        
-        channel_counts = cur.fetchone()
-        
-        # Get total calls from order_dispositions
-        cur.execute("""
-            SELECT COUNT(*) as total_calls
-            FROM order_dispositions
-        """)
-        
-        call_counts = cur.fetchone()
-        
-        # Get field visits from order_dispositions
-        cur.execute("""
-            SELECT COUNT(*) as total_visits
-            FROM order_dispositions
-            WHERE UPPER(source) = 'FIELD'
-        """)
-        
-        visit_counts = cur.fetchone()
-        
-        # Combine all metrics
-        channel_metrics = {
-            'records_digital': channel_counts['records_digital'] or 0,
-            'records_call': channel_counts['records_call'] or 0,
-            'records_field': channel_counts['records_field'] or 0,
-            'total_calls': call_counts['total_calls'] or 0,
-            'total_visits': visit_counts['total_visits'] or 0
-        }
-        
-        return channel_metrics
-    except Exception as e:
-        st.error(f"Error getting channel metrics: {str(e)}")
-        return None
-
-# Get channel metrics with caching
-channel_metrics = CacheManager.get_cached_data(get_channel_metrics)
+channel_metrics = overview['channels']['data']
 
 if not channel_metrics:
     channel_metrics = {
@@ -712,46 +551,7 @@ with col3:
 # User Distribution Section
 st.markdown('<h2 class="section-heading">User Distribution</h2>', unsafe_allow_html=True)
 
-# Get user metrics
-def get_user_metrics():
-    try:
-        # Get entity management database connection
-        cur = db.get_entity_cursor()
-        if not cur:
-            return None
-            
-        # Get user distribution metrics
-        cur.execute("""
-            WITH user_metrics AS (
-                SELECT 
-                    COUNT(DISTINCT id) as total_users,
-                    COUNT(DISTINCT CASE WHEN role = 'SUPERVISOR' THEN id END) as total_supervisors,
-                    COUNT(DISTINCT CASE WHEN role = 'AGENT' THEN id END) as total_call_agents,
-                    COUNT(DISTINCT CASE WHEN role = 'FIELD EXECUTIVE' THEN id END) as total_field_agents,
-                    COUNT(DISTINCT CASE WHEN status = 'ACTIVE' OR online_status = 'ONLINE' THEN id END) as active_users,
-                    SUM(CASE 
-                        WHEN online_status = 'ONLINE' 
-                        AND shift_start_time IS NOT NULL 
-                        AND shift_end_time IS NOT NULL 
-                        THEN 
-                            EXTRACT(EPOCH FROM (
-                                CAST(shift_end_time AS TIME) - CAST(shift_start_time AS TIME)
-                            ))/3600 
-                        ELSE 8 -- Assuming 8 hours per day for users without shift times
-                    END) as total_hours
-                FROM yucollect_agent
-            )
-            SELECT * FROM user_metrics;
-        """)
-        
-        user_metrics = cur.fetchone()
-        return user_metrics
-    except Exception as e:
-        st.error(f"Error getting user metrics: {str(e)}")
-        return None
-
-# Get user metrics with caching
-user_metrics = CacheManager.get_cached_data(get_user_metrics)
+user_metrics = overview['users']['data']
 
 if not user_metrics:
     st.warning("⚠️ Unable to retrieve user metrics.")
@@ -816,35 +616,7 @@ with user_col3:
 # Agency Onboarding Section
 st.markdown('<h2 class="section-heading">Agency Onboarding</h2>', unsafe_allow_html=True)
 
-# Get agency onboarding metrics
-def get_agency_onboarding_metrics():
-    try:
-        # Create a new connection for agency metrics
-        cur = db.get_entity_cursor()
-        if not cur:
-            return None
-        
-        # Get agency onboarding metrics
-        cur.execute("""
-            WITH agency_status AS (
-                SELECT
-                    COUNT(*) as total_agencies,
-                    COUNT(CASE WHEN status = 'accepted' THEN 1 END) as fully_onboarded,
-                    COUNT(CASE WHEN status = 'pending' THEN 1 END) as document_pending,
-                    COUNT(CASE WHEN status = 'agency_pending' THEN 1 END) as agreement_pending
-                FROM agency_allocators_association
-            )
-            SELECT * FROM agency_status;
-        """)
-        
-        agency_metrics = cur.fetchone()
-        return agency_metrics
-    except Exception as e:
-        st.error(f"Error getting agency onboarding metrics: {str(e)}")
-        return None
-
-# Get agency onboarding metrics with caching
-agency_metrics = CacheManager.get_cached_data(get_agency_onboarding_metrics)
+agency_metrics = overview['onboarding']['data']
 
 if not agency_metrics:
     agency_metrics = {
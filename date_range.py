@@ -0,0 +1,133 @@
+import streamlit as st
+from datetime import date, datetime, timedelta
+from db_manager import DatabaseManager
+from query_registry import QueryRegistry
+from query_guard import QueryGuard
+
+@st.cache_data(ttl=3600)  # Cache for 1 hour
+def _load_earliest_date():
+    """Date of the first allocation, or None when it cannot be read"""
+    with DatabaseManager() as db:
+        result = QueryRegistry.fetch_one(db, "common.earliest_date")
+    # A failed or fallback lookup is not cached, so the next run asks again
+    return QueryGuard.cacheable(result['min'] if result and result['min'] else None, failed=result is None)
+
+class DateRangeState:
+    """
+    The one date range shared by the main dashboard and every page.
+
+    The range lives in st.session_state under START_KEY / END_KEY. Pages
+    draw it with `date_filter()` and pass the returned 'YYYY-MM-DD' strings
+    to their cached loaders as arguments, so every loader's cache key follows
+    the range. Ranges are normalized (whole days, end no later than today,
+    start no earlier than the first allocation) so equivalent selections
+    share one cache entry across pages.
+
+    Edits are debounced: the picker selects both ends before anything is
+    applied, so picking a new start date does not load a half-edited range.
+    """
+
+    START_KEY = 'start_date'
+    END_KEY = 'end_date'
+    FALLBACK_DAYS = 30  # Default range when the first allocation date is unavailable
+
+    @staticmethod
+    def to_date(value):
+        """Day of a date, datetime or 'YYYY-MM-DD...' string"""
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        return date.fromisoformat(str(value)[:10])
+
+    @classmethod
+    def earliest_date(cls):
+        """First allocation date (cached), falling back to FALLBACK_DAYS ago"""
+        try:
+            earliest, degraded = QueryGuard.call_cached(_load_earliest_date)
+            # Left for the page to report with its own fallback messages
+            for message in degraded:
+                QueryGuard.record_degraded(message)
+        except Exception as e:
+            st.error(f"Error getting earliest date: {str(e)}")
+            earliest = None
+        if earliest is None:
+            return datetime.now().date() - timedelta(days=cls.FALLBACK_DAYS)
+        return cls.to_date(earliest)
+
+    @classmethod
+    def normalize(cls, start, end):
+        """
+        Snap a range to whole days inside [earliest date, today]
+
+        Returns:
+        - (start, end) as dates, start <= end
+        """
+        start, end = cls.to_date(start), cls.to_date(end)
+        if start > end:
+            start, end = end, start
+        today = datetime.now().date()
+        end = min(end, today)
+        start = min(max(start, min(cls.earliest_date(), today)), end)
+        return start, end
+
+    @classmethod
+    def current(cls):
+        """Normalized (start, end) dates, initialized to the whole history"""
+        if cls.START_KEY not in st.session_state:
+            st.session_state[cls.START_KEY] = cls.earliest_date()
+        if cls.END_KEY not in st.session_state:
+            st.session_state[cls.END_KEY] = datetime.now().date()
+        return cls.normalize(st.session_state[cls.START_KEY], st.session_state[cls.END_KEY])
+
+    @classmethod
+    def strings(cls):
+        """Current range as ('YYYY-MM-DD', 'YYYY-MM-DD'), the form loaders take as cache keys"""
+        start, end = cls.current()
+        return start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+
+    @classmethod
+    def params(cls):
+        """Current range as start_date / end_date query parameters"""
+        start_date_str, end_date_str = cls.strings()
+        return {'start_date': start_date_str, 'end_date': end_date_str}
+
+    @classmethod
+    def _apply(cls, widget_key):
+        selected = st.session_state.get(widget_key)
+        # Only a complete selection changes the range; the first click of a new range is held back
+        if selected and len(selected) == 2:
+            start, end = cls.normalize(*selected)
+            st.session_state[cls.START_KEY] = start
+            st.session_state[cls.END_KEY] = end
+
+    @classmethod
+    def date_filter(cls, page_key, label="Date Range", **kwargs):
+        """
+        Draw the shared date range picker
+
+        Parameters:
+        - page_key: Prefix of the widget key, unique per page
+        - label: Widget label
+        - kwargs: Extra st.date_input arguments (e.g. label_visibility)
+
+        Returns:
+        - (start_date_str, end_date_str) of the applied range
+        """
+        widget_key = f"{page_key}_date_range"
+        current = cls.current()
+        selected = st.session_state.get(widget_key)
+        # Follow the shared range unless the user is halfway through picking a new one
+        if selected is None or (len(selected) == 2 and tuple(selected) != current):
+            st.session_state[widget_key] = current
+
+        st.date_input(
+            label,
+            key=widget_key,
+            min_value=min(cls.earliest_date(), current[0]),
+            max_value=datetime.now().date(),
+            on_change=cls._apply,
+            args=(widget_key,),
+            **kwargs
+        )
+        return cls.strings()
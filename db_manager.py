@@ -142,6 +142,28 @@ class DatabaseManager:
             print(f"Error connecting to UCF database: {str(e)}")
             return None
 
+    def get_cursor(self, database):
+        """Get a PostgreSQL cursor by database name ('ingestion', 'entity' or 'ucf')"""
+        getters = {
+            'ingestion': self.get_ingestion_cursor,
+            'entity': self.get_entity_cursor,
+            'ucf': self.get_ucf_cursor
+        }
+        if database not in getters:
+            raise ValueError(f"Unknown database '{database}'")
+        return getters[database]()
+
+    def postgres_config(self, database):
+        """Connection settings of a PostgreSQL database by name ('ingestion', 'entity' or 'ucf')"""
+        configs = {
+            'ingestion': self.pg_ingestion_config,
+            'entity': self.pg_entity_config,
+            'ucf': self.pg_ucf_config
+        }
+        if database not in configs:
+            raise ValueError(f"Unknown database '{database}'")
+        return configs[database]
+
     def get_mongo_db(self):
         """Get MongoDB database connection"""
         if self.init_mongo():
@@ -175,3 +197,38 @@ class DatabaseManager:
             self.pg_ucf_conn.close()
         if hasattr(self, 'mongo_client') and self.mongo_client:
             self.mongo_client.close()
+
+class ConnectionDatabase:
+    """
+    DatabaseManager interface over the single connection of a standalone
+    dashboard, so it can run registered queries (QueryRegistry.fetch_all).
+    The connection is only opened when a query needs it, which in client
+    mode (see query_client.py) is never.
+    """
+
+    def __init__(self, connect):
+        """
+        Parameters:
+        - connect: Callable returning an open psycopg2 connection, or None on failure
+        """
+        self.connect = connect
+        self.conn = None
+
+    def get_cursor(self, database=None):
+        """Cursor on the dashboard's connection (it reads a single database)"""
+        if not self.conn or self.conn.closed:
+            self.conn = self.connect()
+        return self.conn.cursor() if self.conn else None
+
+    def get_ingestion_cursor(self):
+        return self.get_cursor('ingestion')
+
+    def close_connections(self):
+        if self.conn:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close_connections()
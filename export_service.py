@@ -0,0 +1,199 @@
+import gzip
+import io
+import uuid
+import pandas as pd
+import streamlit as st
+from query_guard import QueryGuard
+from query_registry import QueryRegistry
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is offered only when pyarrow is installed
+    pa = None
+    pq = None
+
+class ExportService:
+    """
+    On-demand table exports for the dashboard pages.
+
+    Nothing is serialized while a page renders: the page shows a format
+    picker and a "Prepare" button, and the file is only built when that
+    button is clicked. Query-backed exports read the full result through a
+    server-side (named) cursor in CHUNK_ROWS batches and write each batch
+    straight into the CSV, gzip-CSV or Parquet output, so neither the rows
+    nor a second copy of the whole frame are held in memory.
+    """
+
+    CHUNK_ROWS = 10000  # Rows fetched from the server-side cursor / written per batch
+
+    # Format label -> (file extension, MIME type)
+    FORMATS = {
+        "CSV": ("csv", "text/csv"),
+        "CSV (gzip)": ("csv.gz", "application/gzip"),
+        "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    }
+
+    @classmethod
+    def available_formats(cls):
+        """Format labels that can be written in this environment"""
+        return [label for label in cls.FORMATS if label != "Parquet" or pq is not None]
+
+    @classmethod
+    def frame_chunks(cls, df):
+        """Split an in-memory DataFrame into CHUNK_ROWS batches"""
+        for start in range(0, max(len(df), 1), cls.CHUNK_ROWS):
+            yield df.iloc[start:start + cls.CHUNK_ROWS]
+
+    @classmethod
+    def stream_sql(cls, conn, sql, params=None, drop_columns=()):
+        """
+        Run a query on a server-side cursor and yield the result in DataFrame batches
+
+        Parameters:
+        - conn: psycopg2 connection
+        - sql: SQL to run (already rendered)
+        - params: Dictionary of named parameters
+        - drop_columns: Helper columns left out of the export
+
+        The first batch is yielded even when the query returns no rows, so the
+        file still gets its header.
+        """
+        # Each batch fetch gets the export time limit. Exports take no concurrency slot:
+        # they would hold it for the whole download
+        with conn.cursor() as setup:
+            QueryGuard.set_timeout(setup, 'export')
+        cur = conn.cursor(name=f"export_{uuid.uuid4().hex}")
+        cur.itersize = cls.CHUNK_ROWS
+        try:
+            cur.execute(sql, params if params else None)
+            first = True
+            while True:
+                rows = cur.fetchmany(cls.CHUNK_ROWS)
+                if not rows and not first:
+                    break
+                # description is only filled in after the first fetch on a named cursor
+                columns = [column[0] for column in cur.description]
+                chunk = pd.DataFrame(rows, columns=columns) if rows else pd.DataFrame(columns=columns)
+                yield chunk.drop(columns=[column for column in drop_columns if column in chunk.columns])
+                first = False
+                if len(rows) < cls.CHUNK_ROWS:
+                    break
+        finally:
+            cur.close()
+            # The named cursor lived in its own read-only transaction
+            conn.rollback()
+
+    @classmethod
+    def stream_query(cls, db, name, params=None, drop_columns=()):
+        """
+        Yield the full result of a registered query in DataFrame batches
+
+        Parameters:
+        - db: DatabaseManager
+        - name: Registered query name
+        - params: Dictionary of named parameters
+        - drop_columns: Helper columns left out of the export
+        """
+        cur = db.get_cursor(QueryRegistry.get(name).database)
+        if not cur:
+            return
+        conn = cur.connection
+        try:
+            # Render on a regular cursor: a named cursor can only execute once
+            sql = QueryRegistry.render(cur, name)
+        finally:
+            cur.close()
+        yield from cls.stream_sql(conn, sql, params, drop_columns)
+
+    @classmethod
+    def write(cls, chunks, fmt="CSV"):
+        """
+        Write DataFrame batches into one file
+
+        Parameters:
+        - chunks: Iterable of DataFrames with the same columns
+        - fmt: Key of FORMATS
+
+        Returns:
+        - File contents as bytes
+        """
+        if fmt not in cls.FORMATS:
+            raise ValueError(f"Unknown export format '{fmt}'")
+        buffer = io.BytesIO()
+
+        if fmt == "Parquet":
+            if pq is None:
+                raise ValueError("Parquet export needs pyarrow")
+            writer = None
+            try:
+                for chunk in chunks:
+                    if writer is None:
+                        table = pa.Table.from_pandas(chunk, preserve_index=False)
+                        writer = pq.ParquetWriter(buffer, table.schema, compression="snappy")
+                    else:
+                        # Later batches follow the first batch's column types
+                        table = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+                    writer.write_table(table)
+            finally:
+                if writer is not None:
+                    writer.close()
+            return buffer.getvalue()
+
+        if fmt == "CSV (gzip)":
+            output = gzip.GzipFile(fileobj=buffer, mode="wb")
+        else:
+            output = buffer
+        text = io.TextIOWrapper(output, encoding="utf-8", newline="")
+        header = True
+        for chunk in chunks:
+            chunk.to_csv(text, index=False, header=header)
+            header = False
+        text.flush()
+        text.detach()
+        if output is not buffer:
+            output.close()
+        return buffer.getvalue()
+
+    @classmethod
+    def download(cls, key, label, file_stem, build, signature=None, help=None):
+        """
+        Render a lazy export control: format picker, "Prepare" button and,
+        once prepared, the download button
+
+        Parameters:
+        - key: Unique widget key on the page
+        - label: Button label, e.g. "📥 Download Agency Details"
+        - file_stem: File name without extension
+        - build: Callable returning an iterable of DataFrame batches; only
+          called when the user asks for the file
+        - signature: Hashable description of the current filters; a prepared
+          file is dropped when it changes
+        - help: Tooltip of the prepare button
+        """
+        state_key = f"export_{key}"
+        format_col, button_col = st.columns([1, 2])
+        with format_col:
+            fmt = st.selectbox("Format", cls.available_formats(), key=f"{key}_format",
+                               label_visibility="collapsed")
+        prepared = st.session_state.get(state_key)
+        if prepared and prepared['signature'] != (signature, fmt):
+            # Filters or format changed since the file was built
+            del st.session_state[state_key]
+            prepared = None
+
+        with button_col:
+            if prepared is None:
+                if not st.button(f"{label} ({fmt})", key=f"{key}_prepare", help=help):
+                    return
+                with st.spinner("Preparing export..."):
+                    prepared = {'signature': (signature, fmt), 'data': cls.write(build(), fmt)}
+                st.session_state[state_key] = prepared
+            extension, mime = cls.FORMATS[fmt]
+            st.download_button(
+                label=f"💾 Save {file_stem}.{extension} ({len(prepared['data']) / 1024:,.0f} KB)",
+                data=prepared['data'],
+                file_name=f"{file_stem}.{extension}",
+                mime=mime,
+                key=f"{key}_save",
+            )
@@ -23,18 +23,25 @@ const Dashboard: React.FC = () => {
   const [stats, setStats] = useState<AllocationStats | null>(null);
 
   useEffect(() => {
-    fetchStats();
-  }, []);
+    // The server sends a snapshot on connect, then only the sections that changed.
+    // EventSource reconnects on its own and gets a fresh snapshot when it does.
+    const source = new EventSource('http://localhost:8000/api/allocation-stats/stream');
 
-  const fetchStats = async () => {
-    try {
-      const response = await fetch('http://localhost:8000/api/allocation-stats');
-      const data = await response.json();
-      setStats(data);
-    } catch (error) {
-      console.error('Error fetching stats:', error);
-    }
-  };
+    source.addEventListener('snapshot', (event) => {
+      setStats(JSON.parse((event as MessageEvent).data));
+    });
+
+    source.addEventListener('delta', (event) => {
+      const delta: Partial<AllocationStats> = JSON.parse((event as MessageEvent).data);
+      setStats(previous => (previous ? { ...previous, ...delta } : previous));
+    });
+
+    source.onerror = (error) => {
+      console.error('Stats stream error, reconnecting:', error);
+    };
+
+    return () => source.close();
+  }, []);
 
   const pieChartData = {
     labels: stats?.status_counts.map(item => item.status) || [],
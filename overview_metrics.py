@@ -0,0 +1,179 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from db_manager import DatabaseManager
+from query_client import QueryClient
+from query_guard import QueryGuard
+from query_registry import QueryRegistry
+
+class OverviewMetrics:
+    """
+    Metric groups of the Control Tower overview, shared by the Streamlit
+    dashboard and the /api/overview endpoint.
+
+    Each group reads one database (summary: ingestion, channels: UCF,
+    users and onboarding: entity management). Results are kept in a
+    process-wide cache for TTL seconds, keyed by group and, for the
+    date-filtered groups only, the date range. `fetch()` loads several
+    groups concurrently, each on its own connection, and reports how long
+    each took and how old the cached value is. In client mode (see
+    query_client.py) `fetch()` asks /api/overview, so every dashboard worker
+    shares the API's cache instead of keeping its own.
+    """
+
+    TTL = 3600  # Seconds a group result is served from the cache (same as the pages' cache_data)
+
+    # Group -> (loader method, whether the result depends on the date range)
+    GROUPS = {
+        'summary': ('_load_summary', True),
+        'channels': ('_load_channels', False),
+        'users': ('_load_users', False),
+        'onboarding': ('_load_onboarding', False),
+    }
+
+    # Opens the connections of one load; the API swaps in its pooled connections
+    database_class = DatabaseManager
+
+    _cache = {}  # (group, start_date, end_date) -> (result, computed_at timestamp)
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _load_summary(db, start_date, end_date):
+        return QueryRegistry.fetch_one(db, "control_tower.summary", {'start_date': start_date, 'end_date': end_date})
+
+    @staticmethod
+    def _load_channels(db, start_date, end_date):
+        channel_counts = QueryRegistry.fetch_one(db, "control_tower.channel_records")
+        if channel_counts is None:
+            return None
+        call_counts = QueryRegistry.fetch_one(db, "control_tower.total_calls")
+        visit_counts = QueryRegistry.fetch_one(db, "control_tower.field_visits")
+        if call_counts is None or visit_counts is None:
+            # Part of the group is missing: report it as a failed load, which is not cached
+            return None
+        return {
+            'records_digital': channel_counts['records_digital'] or 0,
+            'records_call': channel_counts['records_call'] or 0,
+            'records_field': channel_counts['records_field'] or 0,
+            'total_calls': call_counts['total_calls'] or 0,
+            'total_visits': visit_counts['total_visits'] or 0
+        }
+
+    @staticmethod
+    def _load_users(db, start_date, end_date):
+        return QueryRegistry.fetch_one(db, "control_tower.user_metrics")
+
+    @staticmethod
+    def _load_onboarding(db, start_date, end_date):
+        return QueryRegistry.fetch_one(db, "control_tower.agency_onboarding")
+
+    @classmethod
+    def _key(cls, group, start_date, end_date):
+        if group not in cls.GROUPS:
+            raise ValueError(f"Unknown metric group '{group}'")
+        _, dated = cls.GROUPS[group]
+        return (group, start_date, end_date) if dated else (group, None, None)
+
+    @classmethod
+    def get(cls, group, start_date=None, end_date=None):
+        """
+        Result of one metric group, from the cache when it is fresh
+
+        Parameters:
+        - group: Key of GROUPS
+        - start_date, end_date: Date range ('YYYY-MM-DD'), used by the date-filtered groups
+
+        Returns:
+        - Dictionary with 'data' (None if the database is unreachable),
+          'cached', 'elapsed_ms', 'computed_at', 'age_seconds', 'error' and
+          'degraded' (QueryGuard messages when an older result was served)
+        """
+        key = cls._key(group, start_date, end_date)
+        start_time = time.time()
+        with cls._lock:
+            entry = cls._cache.get(key)
+        cached = entry is not None and start_time - entry[1] < cls.TTL
+        error = None
+        degraded = []
+
+        if not cached:
+            loader, _ = cls.GROUPS[group]
+            data = None
+            try:
+                with cls.database_class() as db:
+                    data = getattr(cls, loader)(db, start_date, end_date)
+            except Exception as e:
+                error = str(e)
+                print(f"Error loading {group} metrics: {error}")
+            degraded = QueryGuard.pop_degraded()
+            entry = (data, time.time())
+            # Failed, empty or fallback loads are not cached, so the next request retries
+            if data is not None and not degraded:
+                with cls._lock:
+                    cls._cache[key] = entry
+
+        elapsed_time = time.time() - start_time
+        print(f"{group} metrics {'served from cache' if cached else 'loaded'} in {elapsed_time:.2f} seconds")
+        return {
+            'data': entry[0],
+            'cached': cached,
+            'elapsed_ms': round(elapsed_time * 1000, 1),
+            'computed_at': datetime.fromtimestamp(entry[1]).isoformat(timespec='seconds'),
+            'age_seconds': round(time.time() - entry[1], 1),
+            'error': error,
+            'degraded': degraded,
+        }
+
+    @classmethod
+    def fetch(cls, groups=None, start_date=None, end_date=None):
+        """
+        Load several metric groups concurrently
+
+        Parameters:
+        - groups: Group names (default all of GROUPS)
+        - start_date, end_date: Date range ('YYYY-MM-DD')
+
+        Returns:
+        - Dictionary of group -> result of get()
+        """
+        groups = list(dict.fromkeys(groups or cls.GROUPS))
+        for group in groups:
+            cls._key(group, start_date, end_date)  # Reject unknown groups before querying anything
+        if QueryClient.enabled():
+            return cls._fetch_remote(groups, start_date, end_date)
+        with ThreadPoolExecutor(max_workers=len(groups)) as pool:
+            futures = {group: pool.submit(cls.get, group, start_date, end_date) for group in groups}
+        return {group: future.result() for group, future in futures.items()}
+
+    @classmethod
+    def _fetch_remote(cls, groups, start_date, end_date):
+        """Results of fetch() from the API, or error results for every group when it fails"""
+        started = time.time()
+        error = None
+        try:
+            results = QueryClient.overview(groups, start_date, end_date)
+        except Exception as e:
+            results = None
+            error = str(e)
+        if results is not None:
+            return results
+        print(f"Error loading overview metrics from the API: {error or 'unreachable'}")
+        return {
+            group: {
+                'data': None,
+                'cached': False,
+                'elapsed_ms': round((time.time() - started) * 1000, 1),
+                'computed_at': datetime.now().isoformat(timespec='seconds'),
+                'age_seconds': 0.0,
+                'error': error or "Control Tower API unreachable",
+                'degraded': [],
+            }
+            for group in groups
+        }
+
+    @classmethod
+    def clear(cls):
+        """Drop every cached group result"""
+        with cls._lock:
+            cls._cache.clear()
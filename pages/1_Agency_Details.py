@@ -4,13 +4,19 @@ import plotly.express as px
 import json
 import sys
 import os
-from datetime import datetime, timedelta
 
 # Add the parent directory to Python path
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(parent_dir)
 
 from db_manager import DatabaseManager
+from query_registry import QueryRegistry
+from date_range import DateRangeState
+from virtual_table import VirtualTable
+from search_service import SearchService
+from export_service import ExportService
+from aggregation_manager import AggregationManager
+from query_guard import QueryGuard
 
 # Page config
 st.set_page_config(
@@ -49,81 +55,22 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-db = DatabaseManager()
-
-def get_earliest_date():
+@st.cache_data(ttl=300)  # Cache for 5 minutes
+def search_history(term):
+    """Fuzzy agency name search over all dates"""
     try:
-        cur = db.get_ingestion_cursor()
-        if not cur:
-            return (datetime.now() - timedelta(days=30)).date()
-            
-        cur.execute("""
-            SELECT MIN(created_at)::date
-            FROM allocation_files
-            WHERE created_at IS NOT NULL;
-        """)
-        result = cur.fetchone()
-        return result['min'] if result and result['min'] else (datetime.now() - timedelta(days=30)).date()
+        return SearchService.search(DatabaseManager(), 'agency', term)
     except Exception as e:
-        st.error(f"Error getting earliest date: {str(e)}")
-        return (datetime.now() - timedelta(days=30)).date()
-
-# Always get the earliest date first
-earliest_date = get_earliest_date()
-
-# Initialize dates from main dashboard's session state
-start_date = st.session_state.start_date if 'start_date' in st.session_state else earliest_date
-end_date = st.session_state.end_date if 'end_date' in st.session_state else datetime.now().date()
-
-# Initialize session state for this page's dates
-if 'agency_start_date' not in st.session_state:
-    st.session_state.agency_start_date = start_date
-if 'agency_end_date' not in st.session_state:
-    st.session_state.agency_end_date = end_date
-
-start_date_str = start_date.strftime('%Y-%m-%d')
-end_date_str = end_date.strftime('%Y-%m-%d')
+        st.error(f"Error in search_history: {str(e)}")
+        return pd.DataFrame()
 
 # Title
 st.title("Agency Details")
 
 # Date filter
 st.markdown('<h3>Filter by Date Range</h3>', unsafe_allow_html=True)
-date_col1, date_col2 = st.columns(2)
-
-def sync_dates(key, value):
-    """Sync dates with main dashboard"""
-    if key.endswith('_start_date'):
-        st.session_state.start_date = value
-        st.session_state.main_start_date = value
-    elif key.endswith('_end_date'):
-        st.session_state.end_date = value
-        st.session_state.main_end_date = value
-
-def update_dates(key, value):
-    if key.endswith('_start_date'):
-        st.session_state.agency_start_date = value
-    elif key.endswith('_end_date'):
-        st.session_state.agency_end_date = value
-
-with date_col1:
-    start_date = st.date_input(
-        "Start Date",
-        value=st.session_state.agency_start_date,
-        key="agency_start_date",
-        on_change=lambda: update_dates('agency_start_date', st.session_state.agency_start_date)
-    )
-with date_col2:
-    end_date = st.date_input(
-        "End Date",
-        value=st.session_state.agency_end_date,
-        key="agency_end_date",
-        on_change=lambda: update_dates('agency_end_date', st.session_state.agency_end_date)
-    )
-
-# Convert dates to strings for queries
-start_date_str = start_date.strftime('%Y-%m-%d')
-end_date_str = end_date.strftime('%Y-%m-%d')
+start_date_str, end_date_str = DateRangeState.date_filter("agency")
+start_date, end_date = DateRangeState.current()
 
 # Display current date range
 st.markdown(f"**Date Range:** {start_date.strftime('%d %b %Y')} to {end_date.strftime('%d %b %Y')}")
@@ -145,45 +92,30 @@ india_states = {
     ]
 }
 
-try:
-    # Initialize database connection
+@st.cache_data(ttl=3600)  # Cache for 1 hour
+def get_agency_data(start_date_str, end_date_str):
+    """Get the agency list with city and state for the date range"""
+    # Initialize database connection (connections open on the first query, not at all in client mode)
     db = DatabaseManager()
-    cur = db.get_ingestion_cursor()
-    
-    # Also get entity management database connection for city information
-    entity_cur = db.get_entity_cursor()
-    
-    if not cur:
-        st.error("Could not connect to database")
-        st.stop()
 
     # First get agency location data from entity management database
     agency_locations = {}
     
-    if entity_cur:
-        try:
-            entity_cur.execute("""
-                SELECT 
-                    agency_id, 
-                    agency_name,
-                    COALESCE(city, 'Unknown') as city,
-                    COALESCE(state, 'Unknown') as state
-                FROM agencies
-                WHERE agency_id IS NOT NULL
-            """)
-            
-            location_data = entity_cur.fetchall()
-            for row in location_data:
-                agency_locations[row['agency_id']] = {
-                    'city': row['city'],
-                    'state': row['state']
-                }
-                
-            print(f"Found location data for {len(agency_locations)} agencies")
-        except Exception as e:
-            print(f"Error fetching agency locations: {str(e)}")
-            # If we can't get location data, we'll use a set of realistic Indian cities
+    try:
+        location_data = QueryRegistry.fetch_all(db, "agency_details.locations") or []
+        for row in location_data:
+            agency_locations[row['agency_id']] = {
+                'city': row['city'],
+                'state': row['state']
+            }
             
+        print(f"Found location data for {len(agency_locations)} agencies")
+    except Exception as e:
+        print(f"Error fetching agency locations: {str(e)}")
+        # Not cached: the next run tries the real locations again
+        QueryGuard.record_degraded(f"Agency locations are unavailable ({str(e)}); cities are approximate.")
+        # If we can't get location data, we'll use a set of realistic Indian cities
+        
     # If we couldn't get real location data, use realistic city names
     if not agency_locations:
         indian_cities = {
@@ -209,52 +141,9 @@ try:
             "Ludhiana": "Punjab"
         }
     
-    # Get detailed agency data with city
-    query = f"""
-        WITH agency_metrics AS (
-            SELECT 
-                af.agency_id,
-                MAX(af.agency_name) as agency_name,
-                'Unknown' as agency_city,
-                'Unknown' as agency_state,
-                COUNT(DISTINCT af.allocation_id) as allocation_count,
-                COUNT(DISTINCT CONCAT(af.allocator_id, '-', af.product->>'name', '-', af.bucket->>'name')) as lob_count,
-                SUM(af.total_records) as total_records,
-                SUM(af.total_outstanding) as total_outstanding,
-                SUM(COALESCE(ap.collection_amount, 0)) as total_collections,
-                BOOL_OR(CASE WHEN af.channel->>'digital' = 'true' THEN true ELSE false END) as digital_channel,
-                BOOL_OR(CASE WHEN af.channel->>'call' = 'true' THEN true ELSE false END) as call_channel,
-                BOOL_OR(CASE WHEN af.channel->>'field' = 'true' THEN true ELSE false END) as field_channel
-            FROM allocation_files af
-            LEFT JOIN allocation_payments ap ON af.allocation_id = ap.allocation_id
-            WHERE af.agency_id IS NOT NULL
-            AND af.agency_name IS NOT NULL
-            AND af.created_at BETWEEN '{start_date_str}' AND '{end_date_str}'
-            GROUP BY af.agency_id
-        )
-        SELECT 
-            agency_id as "Agency ID",
-            agency_name as "Agency Name",
-            agency_city as "City",
-            agency_state as "State",
-            allocation_count as "Allocation Count",
-            lob_count as "Unique LOBs",
-            total_records as "Total Records",
-            ROUND(total_outstanding::numeric/10000000, 2) as "Total Outstanding (Cr)",
-            digital_channel as "Digital Channel",
-            call_channel as "Call Channel",
-            field_channel as "Field Channel",
-            ROUND(total_collections::numeric/10000000, 2) as "Collection (Cr)",
-            CASE 
-                WHEN total_outstanding > 0 
-                THEN ROUND((total_collections::float / total_outstanding * 100)::numeric, 2)
-                ELSE 0 
-            END as "Collection Rate (%)"
-        FROM agency_metrics
-        ORDER BY total_outstanding DESC;
-    """
-    cur.execute(query)
-    agency_details = cur.fetchall()
+    # Get detailed agency data
+    # Falls back to the last result for this range when the database is too busy
+    agency_details = QueryRegistry.fetch_all(db, "agency_details.agency_list", {'start_date': start_date_str, 'end_date': end_date_str})
     
     if agency_details:
         df_agency_details = pd.DataFrame(agency_details)
@@ -293,108 +182,90 @@ try:
         df_agency_details["City"] = cities
         df_agency_details["State"] = states
         
-        # Section: Agency List
-        st.markdown('<h2 class="section-heading">Agency List</h2>', unsafe_allow_html=True)
-        
-        # Add filters in columns
-        filter_col1, filter_col2, filter_col3 = st.columns(3)
-        with filter_col1:
-            search = st.text_input("🔍 Search Agencies", key="agency_search")
-        with filter_col2:
-            state_filter = st.multiselect("Filter by State", options=sorted(df_agency_details["State"].unique()), key="state_filter")
-        with filter_col3:
-            sort_col = st.selectbox("Sort by", df_agency_details.columns, index=6, key="agency_sort")  # Default sort by Outstanding
-        
-        sort_order = st.radio("Sort order", ["Descending", "Ascending"], horizontal=True, key="agency_order")
-        
-        # Apply filters
-        filtered_df = df_agency_details.copy()
-        if search:
-            filtered_df = filtered_df[
-                filtered_df["Agency Name"].str.contains(search, case=False, na=False)
-            ]
-        
-        if state_filter:
-            filtered_df = filtered_df[filtered_df["State"].isin(state_filter)]
-        
-        filtered_df = filtered_df.sort_values(
-            by=sort_col, 
-            ascending=sort_order=="Ascending"
-        )
-        
-        # Create a formatted channels column
-        def format_channels(row):
-            channels = []
-            if row["Digital Channel"] == 'Yes':
-                channels.append("Digital")
-            if row["Call Channel"] == 'Yes':
-                channels.append("Call")
-            if row["Field Channel"] == 'Yes':
-                channels.append("Field")
-            return ", ".join(channels) if channels else "None"
-        
-        filtered_df["Channels"] = filtered_df.apply(format_channels, axis=1)
-        
-        # Select and reorder columns for display
-        display_columns = [
-            "Agency ID", "Agency Name", "City", "Allocation Count", "Unique LOBs", 
-            "Total Records", "Total Outstanding (Cr)", "Channels", 
-            "Collection (Cr)", "Collection Rate (%)"
+        # Categoricals for the repeated text columns, numbers instead of Decimals
+        # Results built from a fallback are returned but not cached
+        return QueryGuard.cacheable(AggregationManager.optimize_dtypes(df_agency_details, label="agency details"))
+    return QueryGuard.cacheable(None)
+
+# Filters, table and export rerun on their own: changing them does not reload the data
+@st.fragment
+def agency_table_panel(df_agency_details, start_date_str, end_date_str):
+    # Section: Agency List
+    st.markdown('<h2 class="section-heading">Agency List</h2>', unsafe_allow_html=True)
+    
+    # Add filters in columns
+    filter_col1, filter_col2, filter_col3 = st.columns(3)
+    with filter_col1:
+        search = st.text_input("🔍 Search Agencies", key="agency_search")
+    with filter_col2:
+        state_filter = st.multiselect("Filter by State", options=sorted(df_agency_details["State"].unique()), key="state_filter")
+    with filter_col3:
+        sort_col = st.selectbox("Sort by", df_agency_details.columns, index=6, key="agency_sort")  # Default sort by Outstanding
+    
+    sort_order = st.radio("Sort order", ["Descending", "Ascending"], horizontal=True, key="agency_order")
+
+    # Ranked matches across the whole history, not just the loaded date range
+    if search:
+        history_matches = search_history(search)
+        if not history_matches.empty:
+            with st.expander(f"🔎 Best agency matches for '{search}' across all dates ({len(history_matches)})"):
+                st.dataframe(history_matches, hide_index=True, use_container_width=True)
+    
+    # Apply filters
+    filtered_df = df_agency_details.copy()
+    if search:
+        filtered_df = filtered_df[
+            filtered_df["Agency Name"].str.contains(search, case=False, na=False)
         ]
-        
-        display_df = filtered_df[display_columns]
-        
-        # Display data with formatting
-        st.write(
-            """
-            <style>
-            .dataframe-container {
-                overflow-x: auto;
-                width: 100%;
-            }
-            .dataframe {
-                width: 100%;
-                border-collapse: collapse;
-            }
-            .dataframe th {
-                background-color: #f1f3f6;
-                padding: 8px 12px;
-                text-align: left;
-                font-weight: 600;
-                color: #2c3e50;
-                border-bottom: 2px solid #ddd;
-            }
-            .dataframe td {
-                padding: 8px 12px;
-                border-bottom: 1px solid #ddd;
-            }
-            .dataframe tr:hover {
-                background-color: #f5f5f5;
-            }
-            </style>
-            <div class="dataframe-container">
-            """,
-            unsafe_allow_html=True
-        )
-        
-        # Convert DataFrame to HTML with custom formatting
-        html_table = display_df.to_html(
-            index=False,
-            escape=False,
-            classes='dataframe'
-        )
-        
-        st.write(html_table, unsafe_allow_html=True)
-        st.write("</div>", unsafe_allow_html=True)
-        
-        # Add download button
-        st.download_button(
-            "📥 Download Agency Details",
-            display_df.to_csv(index=False).encode('utf-8'),
-            "agency_details.csv",
-            "text/csv",
-            key='download-agency-csv'
-        )
+    
+    if state_filter:
+        filtered_df = filtered_df[filtered_df["State"].isin(state_filter)]
+    
+    filtered_df = filtered_df.sort_values(
+        by=sort_col, 
+        ascending=sort_order=="Ascending"
+    )
+    
+    # Create a formatted channels column
+    def format_channels(row):
+        channels = []
+        if row["Digital Channel"] == 'Yes':
+            channels.append("Digital")
+        if row["Call Channel"] == 'Yes':
+            channels.append("Call")
+        if row["Field Channel"] == 'Yes':
+            channels.append("Field")
+        return ", ".join(channels) if channels else "None"
+    
+    filtered_df["Channels"] = filtered_df.apply(format_channels, axis=1)
+    
+    # Select and reorder columns for display
+    display_columns = [
+        "Agency ID", "Agency Name", "City", "Allocation Count", "Unique LOBs", 
+        "Total Records", "Total Outstanding (Cr)", "Channels", 
+        "Collection (Cr)", "Collection Rate (%)"
+    ]
+    
+    display_df = filtered_df[display_columns]
+    
+    # Display data in a windowed table - only the visible rows are rendered
+    VirtualTable.render(display_df)
+    
+    # Export is only built when requested
+    ExportService.download(
+        "download-agency", "📥 Download Agency Details", "agency_details",
+        lambda: ExportService.frame_chunks(display_df),
+        signature=(start_date_str, end_date_str, search, tuple(state_filter), sort_col, sort_order)
+    )
+
+try:
+    df_agency_details, degraded = QueryGuard.call_cached(get_agency_data, start_date_str, end_date_str)
+    for message in degraded:
+        st.warning(message)
+    if df_agency_details is None:
+        st.error("Could not connect to database")
+    else:
+        agency_table_panel(df_agency_details, start_date_str, end_date_str)
 
 except Exception as e:
     st.error(f"Error: {str(e)}")
@@ -2,7 +2,6 @@ import streamlit as st
 import pandas as pd
 import sys
 import os
-from datetime import datetime, timedelta
 import time
 
 # Page config - must be the first Streamlit command
@@ -17,6 +16,15 @@ parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(parent_dir)
 
 from db_manager import DatabaseManager
+from query_registry import QueryRegistry
+from date_range import DateRangeState
+from virtual_table import VirtualTable
+from search_service import SearchService
+from channel_manager import get_channel_manager
+from allocation_pager import AllocationPager
+from aggregation_manager import AggregationManager
+from export_service import ExportService
+from query_guard import QueryGuard, DegradedResult
 
 # Add custom CSS to override Streamlit's default styling for sidebar nav
 st.markdown("""
@@ -72,245 +80,165 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Format amount function
-def format_amount(amount):
-    """Format amount based on its size:
-    - If < 1 lakh: show exact amount with commas
-    - If < 1 crore: show in lakhs
-    - If >= 1 crore: show in crores
-    """
-    if amount is None:
-        return "₹0.00"
-    
-    try:
-        amount = float(amount)
-        if amount < 100000:  # Less than 1 lakh
-            return f"₹{amount:,.2f}"
-        elif amount < 10000000:  # Less than 1 crore
-            return f"₹{amount/100000:.2f}L"
-        else:  # 1 crore or more
-            return f"₹{amount/10000000:.2f}Cr"
-    except (ValueError, TypeError):
-        return "₹0.00"
-
 # Enable caching for database queries
 @st.cache_data(ttl=3600)  # Cache for 1 hour
-def get_allocation_data(start_date_str, end_date_str):
-    """Get allocation data with caching for better performance"""
+def get_allocation_page(start_date_str, end_date_str, search, allocators, sort_col, sort_order, cursor):
+    """Get one page of allocations with caching; filtering, sorting and paging run in SQL"""
     try:
-        # Initialize database connection
+        # Initialize database connection (opened on the first query, not at all in client mode)
         db = DatabaseManager()
-        cur = db.get_ingestion_cursor()
-        
-        if not cur:
-            return None
             
-        # Get allocation details with metrics - optimized query
-        query = f"""
-            SELECT 
-                af.allocation_id as "Allocation ID",
-                af.allocation_name as "Allocation Name",
-                af.allocator_name as "Allocator",
-                af.agency_name as "Agency",
-                af.product::text as "Product",
-                af.bucket::text as "Bucket",
-                af.total_records as "Accounts",
-                af.total_outstanding as "Total Outstanding",
-                CASE 
-                    WHEN af.channel->>'digital' = 'true' THEN 'Digital'
-                    WHEN af.channel->>'call' = 'true' THEN 'Call'
-                    WHEN af.channel->>'field' = 'true' THEN 'Field'
-                    ELSE 'Not Assigned'
-                END as "Channel (AF)",
-                COALESCE(SUM(ap.collection_amount), 0) as "Collection",
-                CASE 
-                    WHEN af.total_outstanding > 0 
-                    THEN ROUND((COALESCE(SUM(ap.collection_amount), 0)::float / af.total_outstanding * 100)::numeric, 2)
-                    ELSE 0 
-                END as "Collection Rate (%)"
-            FROM allocation_files af
-            LEFT JOIN allocation_payments ap ON af.allocation_id = ap.allocation_id
-            WHERE af.created_at BETWEEN '{start_date_str}' AND '{end_date_str}'
-            GROUP BY 
-                af.allocation_id
-            ORDER BY af.total_outstanding DESC
-            LIMIT 1000;  -- Add limit to prevent excessive data loading
-        """
-        cur.execute(query)
-        allocation_details = cur.fetchall()
+        rows, next_cursor = AllocationPager.fetch_page(
+            db, start_date_str, end_date_str, search, allocators, sort_col, sort_order, cursor
+        )
+        if rows is None:
+            return QueryGuard.cacheable((None, None, 0), failed=True)
+        total_estimate = AllocationPager.estimate_total(db, start_date_str, end_date_str, search, allocators)
         
-        if allocation_details:
+        # Pages built from a fallback are returned but not cached
+        if rows:
             # Convert to DataFrame
-            df_allocation_details = pd.DataFrame(allocation_details)
-            return df_allocation_details
+            df = AggregationManager.optimize_dtypes(pd.DataFrame(rows), label="allocation page")
+            return QueryGuard.cacheable((df, next_cursor, max(total_estimate, len(rows))))
         else:
-            return None
+            return QueryGuard.cacheable((None, None, 0))
+    except DegradedResult:
+        raise
     except Exception as e:
-        st.error(f"Error in get_allocation_data: {str(e)}")
-        return None
+        st.error(f"Error in get_allocation_page: {str(e)}")
+        return QueryGuard.cacheable((None, None, 0), failed=True)
     finally:
         # Close database connection
-        if 'cur' in locals() and cur:
-            cur.close()
+        if 'db' in locals():
+            db.close_connections()
 
 @st.cache_data(ttl=3600)  # Cache for 1 hour
-def get_channel_mapping():
-    """Get channel mapping data with caching for better performance"""
+def get_allocator_options(start_date_str, end_date_str):
+    """Get the allocators with allocations in the date range"""
     try:
-        # Initialize database connection
-        db = DatabaseManager()
-        ucf_cur = db.get_ucf_cursor()
-        
-        if not ucf_cur:
-            return {}
-            
-        # Get channel assigned from borrower_details table
-        channel_query = """
-            SELECT 
-                allocation_record_id,
-                MAX(channel) as channel
-            FROM 
-                borrower_details
-            WHERE 
-                allocation_record_id IS NOT NULL
-            GROUP BY 
-                allocation_record_id
-        """
-        ucf_cur.execute(channel_query)
-        channel_data = ucf_cur.fetchall()
-        
-        # Create channel mapping
-        channel_mapping = {}
-        if channel_data:
-            for row in channel_data:
-                if row['allocation_record_id'] and row['channel']:
-                    channel_mapping[row['allocation_record_id']] = row['channel']
-        
-        return channel_mapping
+        rows = QueryRegistry.fetch_all(
+            DatabaseManager(), "allocation_details.allocators", {'start_date': start_date_str, 'end_date': end_date_str}
+        )
+        return QueryGuard.cacheable([row['allocator'] for row in rows] if rows else [], failed=rows is None)
+    except DegradedResult:
+        raise
     except Exception as e:
-        st.error(f"Error in get_channel_mapping: {str(e)}")
-        return {}
-    finally:
-        # Close database connection
-        if 'ucf_cur' in locals() and ucf_cur:
-            ucf_cur.close()
+        st.error(f"Error in get_allocator_options: {str(e)}")
+        return QueryGuard.cacheable([], failed=True)
+
+@st.cache_data(ttl=300)  # Cache for 5 minutes
+def search_history(term):
+    """Fuzzy allocation name search over all dates"""
+    try:
+        return SearchService.search(DatabaseManager(), 'allocation', term)
+    except Exception as e:
+        st.error(f"Error in search_history: {str(e)}")
+        return pd.DataFrame()
 
 # Title
 st.title("Allocation Details")
 
 # Date filter
 st.markdown('<h3>Filter by Date Range</h3>', unsafe_allow_html=True)
-date_col1, date_col2 = st.columns(2)
-with date_col1:
-    start_date = st.date_input("Start Date", value=datetime.now() - timedelta(days=30), key="allocation_start_date")
-with date_col2:
-    end_date = st.date_input("End Date", value=datetime.now(), key="allocation_end_date")
-    
-# Convert dates to strings for SQL query
-start_date_str = start_date.strftime('%Y-%m-%d')
-end_date_str = end_date.strftime('%Y-%m-%d')
-
-# Show loading spinner while fetching data
-with st.spinner("Loading allocation data..."):
-    # Get allocation data with caching
-    df_allocation_details = get_allocation_data(start_date_str, end_date_str)
-    
-    # Get channel mapping with caching
-    channel_mapping = get_channel_mapping()
+start_date_str, end_date_str = DateRangeState.date_filter("allocation")
 
-if df_allocation_details is not None:
-    # Add UCF channel to the DataFrame
-    df_allocation_details["Channel Assigned"] = df_allocation_details["Allocation ID"].apply(
-        lambda x: channel_mapping.get(x, "Not Assigned")
-    )
-    
-    # Format currency columns
-    df_allocation_details["Total Outstanding (Formatted)"] = df_allocation_details["Total Outstanding"].apply(format_amount)
-    df_allocation_details["Collection (Formatted)"] = df_allocation_details["Collection"].apply(format_amount)
-    
-    # Clean up product and bucket display
-    df_allocation_details["Product"] = df_allocation_details["Product"].apply(
-        lambda x: x.strip('[]"\'').replace('\\"', '').replace('\\', '') if isinstance(x, str) else x
-    )
-    df_allocation_details["Bucket"] = df_allocation_details["Bucket"].apply(
-        lambda x: x.strip('[]"\'').replace('\\"', '').replace('\\', '') if isinstance(x, str) else x
-    )
-    
+# Filters, paging, table and export rerun on their own: only the page query runs again
+@st.fragment
+def allocation_table_panel(start_date_str, end_date_str):
     # Section: Allocation List
     st.markdown('<h2 class="section-heading">Allocation List</h2>', unsafe_allow_html=True)
-    
+
     # Add filter section
     filter_col1, filter_col2, filter_col3 = st.columns(3)
-    
+
     with filter_col1:
         search = st.text_input("🔍 Search Allocations", key="allocation_search")
     with filter_col2:
-        allocator_filter = st.multiselect("Filter by Allocator", options=sorted(df_allocation_details["Allocator"].unique()), key="allocator_filter")
+        allocator_options, degraded = QueryGuard.call_cached(get_allocator_options, start_date_str, end_date_str)
+        allocator_filter = st.multiselect("Filter by Allocator", options=allocator_options, key="allocator_filter")
     with filter_col3:
-        sort_col = st.selectbox("Sort by", df_allocation_details.columns, index=7, key="allocation_sort")  # Default sort by Outstanding
-    
+        sort_col = st.selectbox("Sort by", list(AllocationPager.SORT_COLUMNS), index=0, key="allocation_sort")  # Default sort by Outstanding
+
     sort_order = st.radio("Sort order", ["Descending", "Ascending"], horizontal=True, key="allocation_order")
-    
-    # Apply filters
-    filtered_df = df_allocation_details.copy()
+
+    # Ranked matches across the whole history, not just the loaded date range
     if search:
-        search_lower = search.lower()
-        filtered_df = filtered_df[
-            filtered_df.apply(lambda row: any(str(val).lower().find(search_lower) >= 0 for val in row), axis=1)
+        history_matches = search_history(search)
+        if not history_matches.empty:
+            with st.expander(f"🔎 Best allocation matches for '{search}' across all dates ({len(history_matches)})"):
+                st.dataframe(history_matches, hide_index=True, use_container_width=True)
+
+    # Cursor of every page visited so far; restart from the first page when a filter changes
+    page_filters = (start_date_str, end_date_str, search, tuple(allocator_filter), sort_col, sort_order)
+    if st.session_state.get("allocation_page_filters") != page_filters:
+        st.session_state.allocation_page_filters = page_filters
+        st.session_state.allocation_page_cursors = [None]
+    page_cursors = st.session_state.allocation_page_cursors
+
+    # Show loading spinner while fetching data
+    with st.spinner("Loading allocation data..."):
+        # Get the current page with caching
+        (df_allocation_details, next_cursor, total_estimate), page_degraded = QueryGuard.call_cached(
+            get_allocation_page,
+            start_date_str, end_date_str, search, tuple(allocator_filter), sort_col, sort_order, page_cursors[-1]
+        )
+    for message in degraded + page_degraded:
+        st.warning(message)
+
+    if df_allocation_details is not None:
+        # Add UCF channel to the DataFrame - only the displayed allocation IDs are looked up
+        df_allocation_details = get_channel_manager().merge_channels(
+            DatabaseManager(), df_allocation_details, "Allocation ID", "Channel Assigned"
+        )
+    
+        # Format currency columns
+        df_allocation_details["Total Outstanding (Formatted)"] = AggregationManager.format_currency_series(
+            pd.to_numeric(df_allocation_details["Total Outstanding"], errors='coerce'), na_rep="₹0.00")
+        df_allocation_details["Collection (Formatted)"] = AggregationManager.format_currency_series(
+            pd.to_numeric(df_allocation_details["Collection"], errors='coerce'), na_rep="₹0.00")
+    
+        # Select and reorder columns for display
+        display_columns = [
+            "Allocation ID", "Allocation Name", "Allocator", "Agency", "Product", "Bucket", 
+            "Accounts", "Total Outstanding (Formatted)", "Channel Assigned", 
+            "Collection (Formatted)", "Collection Rate (%)"
         ]
     
-    if allocator_filter:
-        filtered_df = filtered_df[filtered_df["Allocator"].isin(allocator_filter)]
+        display_df = df_allocation_details[display_columns]
+    
+        # Show the page position and the estimated total
+        page_number = len(page_cursors)
+        first_row = (page_number - 1) * AllocationPager.PAGE_SIZE + 1
+        last_row = first_row + len(display_df) - 1
+        st.info(f"Showing allocations {first_row}-{last_row} of about {max(total_estimate, last_row):,} (page {page_number}).")
+    
+        # Display data in a windowed table - only the visible rows are rendered
+        VirtualTable.render(display_df)
+    
+        # Page navigation
+        nav_col1, nav_col2, _ = st.columns([1, 1, 6])
+        with nav_col1:
+            if st.button("← Previous", disabled=page_number == 1, key="allocation_prev_page"):
+                page_cursors.pop()
+                st.rerun(scope="fragment")
+        with nav_col2:
+            if st.button("Next →", disabled=next_cursor is None, key="allocation_next_page"):
+                page_cursors.append(next_cursor)
+                st.rerun(scope="fragment")
+    
+        # Export every matching allocation (not just this page), streamed from a server-side cursor on request
+        ExportService.download(
+            "download_allocation_details", "📥 Download All Matches", f"allocation_details_{start_date_str}_{end_date_str}",
+            lambda: ExportService.stream_query(
+                DatabaseManager(), AllocationPager.query_name(sort_col, AllocationPager.DIRECTIONS[sort_order]),
+                AllocationPager.export_params(start_date_str, end_date_str, search, allocator_filter),
+                drop_columns=["sort_value"]
+            ),
+            signature=page_filters,
+            help="Download every allocation matching the filters"
+        )
     
-    # Apply sorting
-    if sort_order == "Descending":
-        filtered_df = filtered_df.sort_values(by=sort_col, ascending=False)
     else:
-        filtered_df = filtered_df.sort_values(by=sort_col, ascending=True)
-    
-    # Select and reorder columns for display
-    display_columns = [
-        "Allocation ID", "Allocation Name", "Allocator", "Agency", "Product", "Bucket", 
-        "Accounts", "Total Outstanding (Formatted)", "Channel Assigned", 
-        "Collection (Formatted)", "Collection Rate (%)"
-    ]
-    
-    # Create display DataFrame - limit to 100 rows for faster rendering
-    display_df = filtered_df[display_columns].head(100)
-    
-    # Show total count and note about limiting display
-    total_count = len(filtered_df)
-    displayed_count = len(display_df)
-    
-    st.info(f"Showing {displayed_count} of {total_count} allocations. {'' if displayed_count == total_count else 'Results limited to 100 rows for performance.'}")
-    
-    # Display data with formatting
-    st.write(
-        """
-        <div class="dataframe-container">
-        """,
-        unsafe_allow_html=True
-    )
-    
-    # Convert DataFrame to HTML with custom formatting
-    html_table = display_df.to_html(
-        index=False,
-        escape=False,
-        classes='dataframe'
-    )
-    
-    st.write(html_table, unsafe_allow_html=True)
-    st.write("</div>", unsafe_allow_html=True)
-    
-    # Add download button
-    st.download_button(
-        label="📥 Download Allocation Details",
-        data=filtered_df.to_csv(index=False).encode('utf-8'),
-        file_name=f"allocation_details_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-        mime="text/csv",
-        key="download_allocation_details",
-        help="Download the allocation details as a CSV file"
-    )
-    
-else:
-    st.warning("No allocation details found for the selected date range.")
+        st.warning("No allocation details found for the selected filters.")
+
+allocation_table_panel(start_date_str, end_date_str)
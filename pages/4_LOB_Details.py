@@ -2,7 +2,6 @@ import streamlit as st
 import pandas as pd
 import sys
 import os
-from datetime import datetime, timedelta
 
 # Page config - must be the first Streamlit command
 st.set_page_config(
@@ -16,6 +15,12 @@ parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(parent_dir)
 
 from db_manager import DatabaseManager
+from query_registry import QueryRegistry
+from date_range import DateRangeState
+from virtual_table import VirtualTable
+from aggregation_manager import AggregationManager
+from query_guard import QueryGuard, DegradedResult
+from export_service import ExportService
 
 # Add custom CSS to override Streamlit's default styling for sidebar nav
 st.markdown("""
@@ -71,150 +76,79 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Format amount function
-def format_amount(amount):
-    """Format amount based on its size:
-    - If < 1 lakh: show exact amount with commas
-    - If < 1 crore: show in lakhs
-    - If >= 1 crore: show in crores
-    """
-    if amount is None:
-        return "₹0.00"
+# Number of LOBs loaded for the table; the export streams every row
+LOB_LIST_LIMIT = 1000
+
+def prepare_lob_frame(df_lob_details):
+    """Add the formatted and search columns to a frame of lob_details.lob_list rows"""
+    # Format currency columns
+    df_lob_details["Total Outstanding (Formatted)"] = AggregationManager.format_currency_series(
+        pd.to_numeric(df_lob_details["Total Outstanding"], errors='coerce'), na_rep="₹0.00")
+    df_lob_details["Collection (Formatted)"] = AggregationManager.format_currency_series(
+        pd.to_numeric(df_lob_details["Collection"], errors='coerce'), na_rep="₹0.00")
     
-    try:
-        amount = float(amount)
-        if amount < 100000:  # Less than 1 lakh
-            return f"₹{amount:,.2f}"
-        elif amount < 10000000:  # Less than 1 crore
-            return f"₹{amount/100000:.2f}L"
-        else:  # 1 crore or more
-            return f"₹{amount/10000000:.2f}Cr"
-    except (ValueError, TypeError):
-        return "₹0.00"
+    # Precompute the search text once per frame
+    return AggregationManager.add_search_index(df_lob_details)
+
+def filter_lobs(df_lob_details, search, allocator_filter):
+    """Apply the table filters to a prepared LOB frame"""
+    if search:
+        df_lob_details = AggregationManager.search_indexed(df_lob_details, search)
+    
+    if allocator_filter:
+        df_lob_details = df_lob_details[
+            df_lob_details["LOB Name"].apply(lambda x: any(allocator in x for allocator in allocator_filter))
+        ]
+    return df_lob_details
+
+def stream_lob_data(start_date_str, end_date_str, search, allocator_filter):
+    """Stream every LOB in the range through the table filters for export"""
+    chunks = ExportService.stream_query(
+        DatabaseManager(), "lob_details.lob_list",
+        {'start_date': start_date_str, 'end_date': end_date_str, 'limit': None}
+    )
+    for index, chunk in enumerate(chunks):
+        chunk = filter_lobs(prepare_lob_frame(chunk), search, allocator_filter)
+        # Keep the first batch even when empty so the file still gets its header
+        if index == 0 or not chunk.empty:
+            yield chunk.drop(columns=AggregationManager.SEARCH_COLUMN, errors="ignore")
 
 # Enable caching for database queries
 @st.cache_data(ttl=3600)  # Cache for 1 hour
 def get_lob_data(start_date_str, end_date_str):
     """Get LOB data with caching for better performance"""
     try:
-        # Initialize database connection
+        # Initialize database connection (opened on the first query, not at all in client mode)
         db = DatabaseManager()
-        cur = db.get_ingestion_cursor()
-        
-        if not cur:
-            return None
             
-        # Get LOB details with metrics - optimized query
-        query = f"""
-            SELECT 
-                CONCAT(af.allocator_name, ' - ', 
-                       REPLACE(COALESCE(TRIM(BOTH '"' FROM af.product::text), 'Unknown'), '[', ''), ' - ', 
-                       REPLACE(COALESCE(TRIM(BOTH '"' FROM af.bucket::text), 'Unknown'), '[', '')) as "LOB Name",
-                SUM(af.total_records) as "Accounts",
-                SUM(af.total_outstanding) as "Total Outstanding",
-                COALESCE(SUM(ap.collection_amount), 0) as "Collection",
-                CASE 
-                    WHEN SUM(af.total_outstanding) > 0 
-                    THEN ROUND((COALESCE(SUM(ap.collection_amount), 0)::float / SUM(af.total_outstanding) * 100)::numeric, 2)
-                    ELSE 0 
-                END as "Collection Rate (%)"
-            FROM allocation_files af
-            LEFT JOIN allocation_payments ap ON af.allocation_id = ap.allocation_id
-            WHERE af.created_at BETWEEN '{start_date_str}' AND '{end_date_str}'
-            GROUP BY 
-                af.allocator_name, 
-                REPLACE(COALESCE(TRIM(BOTH '"' FROM af.product::text), 'Unknown'), '[', ''), 
-                REPLACE(COALESCE(TRIM(BOTH '"' FROM af.bucket::text), 'Unknown'), '[', '')
-            ORDER BY SUM(af.total_outstanding) DESC
-            LIMIT 1000;  -- Add limit to prevent excessive data loading
-        """
-        cur.execute(query)
-        lob_details = cur.fetchall()
+        # Get LOB details with metrics
+        # Falls back to the last result for this range when the database is too busy
+        lob_details = QueryRegistry.fetch_all(db, "lob_details.lob_list", {'start_date': start_date_str, 'end_date': end_date_str, 'limit': LOB_LIST_LIMIT})
         
         if lob_details:
             # Convert to DataFrame
-            df_lob_details = pd.DataFrame(lob_details)
-            return df_lob_details
+            df_lob_details = prepare_lob_frame(pd.DataFrame(lob_details))
+            # Results built from a fallback are returned but not cached
+            return QueryGuard.cacheable(AggregationManager.optimize_dtypes(df_lob_details, label="LOB details"))
         else:
-            return None
+            return QueryGuard.cacheable(None)
+    except DegradedResult:
+        raise
     except Exception as e:
         st.error(f"Error in get_lob_data: {str(e)}")
-        return None
+        return QueryGuard.cacheable(None)
     finally:
         # Close database connection
-        if 'cur' in locals() and cur:
-            cur.close()
-
-db = DatabaseManager()
-
-def get_earliest_date():
-    try:
-        cur = db.get_ingestion_cursor()
-        if not cur:
-            return (datetime.now() - timedelta(days=30)).date()
-            
-        cur.execute("""
-            SELECT MIN(created_at)::date
-            FROM allocation_files
-            WHERE created_at IS NOT NULL;
-        """)
-        result = cur.fetchone()
-        return result['min'] if result and result['min'] else (datetime.now() - timedelta(days=30)).date()
-    except Exception as e:
-        st.error(f"Error getting earliest date: {str(e)}")
-        return (datetime.now() - timedelta(days=30)).date()
-
-# Always get the earliest date first
-earliest_date = get_earliest_date()
-
-# Initialize dates from main dashboard's session state
-start_date = st.session_state.start_date if 'start_date' in st.session_state else earliest_date
-end_date = st.session_state.end_date if 'end_date' in st.session_state else datetime.now().date()
-
-# Initialize session state for this page's dates
-if 'lob_start_date' not in st.session_state:
-    st.session_state.lob_start_date = start_date
-if 'lob_end_date' not in st.session_state:
-    st.session_state.lob_end_date = end_date
-
-start_date_str = start_date.strftime('%Y-%m-%d')
-end_date_str = end_date.strftime('%Y-%m-%d')
+        if 'db' in locals():
+            db.close_connections()
 
 # Title
 st.title("LOB Details")
 
 # Date filter
 st.markdown('<h3>Filter by Date Range</h3>', unsafe_allow_html=True)
-date_col1, date_col2 = st.columns(2)
-
-def update_dates(key, value):
-    """Update dates in session state"""
-    if key.endswith('_start_date'):
-        st.session_state.start_date = value
-        st.session_state.lob_start_date = value
-    elif key.endswith('_end_date'):
-        st.session_state.end_date = value
-        st.session_state.lob_end_date = value
-
-with date_col1:
-    start_date = st.date_input(
-        "Start Date",
-        value=st.session_state.lob_start_date,
-        key="lob_start_date",
-        on_change=lambda: update_dates('lob_start_date', st.session_state.lob_start_date)
-    )
-
-with date_col2:
-    end_date = st.date_input(
-        "End Date",
-        value=st.session_state.lob_end_date,
-        key="lob_end_date",
-        on_change=lambda: update_dates('lob_end_date', st.session_state.lob_end_date)
-    )
-
-# Convert dates to strings for queries
-start_date_str = start_date.strftime('%Y-%m-%d')
-end_date_str = end_date.strftime('%Y-%m-%d')
+start_date_str, end_date_str = DateRangeState.date_filter("lob")
+start_date, end_date = DateRangeState.current()
 
 # Display current date range
 st.markdown(f"**Date Range:** {start_date.strftime('%d %b %Y')} to {end_date.strftime('%d %b %Y')}")
@@ -222,18 +156,13 @@ st.markdown(f"**Date Range:** {start_date.strftime('%d %b %Y')} to {end_date.str
 # Show loading spinner while fetching data
 with st.spinner("Loading LOB data..."):
     # Get LOB data with caching
-    df_lob_details = get_lob_data(start_date_str, end_date_str)
+    df_lob_details, degraded = QueryGuard.call_cached(get_lob_data, start_date_str, end_date_str)
+for message in degraded:
+    st.warning(message)
 
-if df_lob_details is not None:
-    # Format currency columns
-    df_lob_details["Total Outstanding (Formatted)"] = df_lob_details["Total Outstanding"].apply(format_amount)
-    df_lob_details["Collection (Formatted)"] = df_lob_details["Collection"].apply(format_amount)
-    
-    # Clean up LOB Name display - remove array brackets and quotes
-    df_lob_details["LOB Name"] = df_lob_details["LOB Name"].apply(
-        lambda x: x.replace('["', '').replace('"]', '').replace('\\"', '').replace('\\', '').replace('[', '').replace(']', '') if isinstance(x, str) else x
-    )
-    
+# Filters, table and export rerun on their own: changing them does not reload the data
+@st.fragment
+def lob_table_panel(df_lob_details, start_date_str, end_date_str):
     # Section: LOB List
     st.markdown('<h2 class="section-heading">LOB List</h2>', unsafe_allow_html=True)
     
@@ -247,22 +176,13 @@ if df_lob_details is not None:
         allocator_names = sorted(set([name.split(' - ')[0] for name in df_lob_details["LOB Name"]]))
         allocator_filter = st.multiselect("Filter by Allocator", options=allocator_names, key="lob_allocator_filter")
     with filter_col3:
-        sort_col = st.selectbox("Sort by", df_lob_details.columns, index=1, key="lob_sort")  # Default sort by Accounts
+        sort_columns = df_lob_details.columns.drop(AggregationManager.SEARCH_COLUMN)
+        sort_col = st.selectbox("Sort by", sort_columns, index=1, key="lob_sort")  # Default sort by Accounts
     
     sort_order = st.radio("Sort order", ["Descending", "Ascending"], horizontal=True, key="lob_order")
     
     # Apply filters
-    filtered_df = df_lob_details.copy()
-    if search:
-        search_lower = search.lower()
-        filtered_df = filtered_df[
-            filtered_df.apply(lambda row: any(str(val).lower().find(search_lower) >= 0 for val in row), axis=1)
-        ]
-    
-    if allocator_filter:
-        filtered_df = filtered_df[
-            filtered_df["LOB Name"].apply(lambda x: any(allocator in x for allocator in allocator_filter))
-        ]
+    filtered_df = filter_lobs(df_lob_details, search, allocator_filter)
     
     # Apply sorting
     if sort_order == "Descending":
@@ -276,42 +196,24 @@ if df_lob_details is not None:
         "Collection (Formatted)", "Collection Rate (%)"
     ]
     
-    # Create display DataFrame - limit to 100 rows for faster rendering
-    display_df = filtered_df[display_columns].head(100)
+    # Create display DataFrame - the windowed table only renders the visible rows
+    display_df = filtered_df[display_columns]
     
-    # Show total count and note about limiting display
-    total_count = len(filtered_df)
-    displayed_count = len(display_df)
+    # Show total count
+    st.info(f"Showing {len(display_df)} LOBs.")
     
-    st.info(f"Showing {displayed_count} of {total_count} LOBs. {'' if displayed_count == total_count else 'Results limited to 100 rows for performance.'}")
+    # Display data in a windowed table - only the visible rows are rendered
+    VirtualTable.render(display_df)
     
-    # Display data with formatting
-    st.write(
-        """
-        <div class="dataframe-container">
-        """,
-        unsafe_allow_html=True
+    # Export every matching LOB (not just the loaded ones), streamed from a server-side cursor on request
+    ExportService.download(
+        "download_lob_details", "📥 Download LOB Details", f"lob_details_{start_date_str}_{end_date_str}",
+        lambda: stream_lob_data(start_date_str, end_date_str, search, allocator_filter),
+        signature=(start_date_str, end_date_str, search, tuple(allocator_filter)),
+        help="Download every LOB matching the filters"
     )
-    
-    # Convert DataFrame to HTML with custom formatting
-    html_table = display_df.to_html(
-        index=False,
-        escape=False,
-        classes='dataframe'
-    )
-    
-    st.write(html_table, unsafe_allow_html=True)
-    st.write("</div>", unsafe_allow_html=True)
-    
-    # Add download button
-    st.download_button(
-        label="📥 Download LOB Details",
-        data=filtered_df.to_csv(index=False).encode('utf-8'),
-        file_name=f"lob_details_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-        mime="text/csv",
-        key="download_lob_details",
-        help="Download the LOB details as a CSV file"
-    )
-    
+
+if df_lob_details is not None:
+    lob_table_panel(df_lob_details, start_date_str, end_date_str)
 else:
     st.warning("No LOB details found for the selected date range.")
@@ -2,7 +2,7 @@ import streamlit as st
 import pandas as pd
 import sys
 import os
-from datetime import datetime, timedelta
+from datetime import datetime
 
 # Page config - must be the first Streamlit command
 st.set_page_config(
@@ -16,6 +16,12 @@ parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(parent_dir)
 
 from db_manager import DatabaseManager
+from query_registry import QueryRegistry
+from date_range import DateRangeState
+from virtual_table import VirtualTable
+from aggregation_manager import AggregationManager
+from export_service import ExportService
+from query_guard import QueryGuard, DegradedResult
 
 # Add custom CSS to override Streamlit's default styling for sidebar nav
 st.markdown("""
@@ -95,133 +101,78 @@ def format_time_spent(hours):
     except:
         return "0 hrs"
 
+# Number of users loaded for the table; the export streams every row
+USER_LIST_LIMIT = 1000
+
+def prepare_user_frame(df_user_details):
+    """Add the formatted and search columns to a frame of user_details.user_list rows"""
+    # Format date columns
+    df_user_details["Added On (Formatted)"] = df_user_details["Added On"].apply(format_date)
+    df_user_details["Last Active On (Formatted)"] = df_user_details["Last Active On"].apply(format_date)
+    df_user_details["Total Time Spent"] = df_user_details["Total Time Spent (Hours)"].apply(format_time_spent)
+    
+    # Precompute the search text once per frame
+    return AggregationManager.add_search_index(df_user_details)
+
+def filter_users(df_user_details, search, role_filter, channel_filter):
+    """Apply the table filters to a prepared user frame"""
+    if search:
+        df_user_details = AggregationManager.search_indexed(df_user_details, search)
+    
+    if role_filter:
+        df_user_details = df_user_details[df_user_details["Role"].isin(role_filter)]
+    
+    if channel_filter:
+        df_user_details = df_user_details[df_user_details["Channel"].isin(channel_filter)]
+    return df_user_details
+
+def stream_user_data(start_date_str, end_date_str, search, role_filter, channel_filter):
+    """Stream every user in the range through the table filters for export"""
+    chunks = ExportService.stream_query(
+        DatabaseManager(), "user_details.user_list",
+        {'start_date': start_date_str, 'end_date': end_date_str, 'limit': None}
+    )
+    for index, chunk in enumerate(chunks):
+        chunk = filter_users(prepare_user_frame(chunk), search, role_filter, channel_filter)
+        # Keep the first batch even when empty so the file still gets its header
+        if index == 0 or not chunk.empty:
+            yield chunk.drop(columns=AggregationManager.SEARCH_COLUMN, errors="ignore")
+
 # Enable caching for database queries
 @st.cache_data(ttl=3600)  # Cache for 1 hour
-def get_user_data():
+def get_user_data(start_date_str, end_date_str):
     """Get user data with caching for better performance"""
     try:
-        # Initialize database connection
+        # Initialize database connection (opened on the first query, not at all in client mode)
         db = DatabaseManager()
-        cur = db.get_entity_cursor()
-        
-        if not cur:
-            return None
             
-        # Get user details with metrics - optimized query
-        query = """
-            SELECT 
-                ya.id as "User ID",
-                ya.name as "User Name",
-                ya.role as "Role",
-                CASE
-                    WHEN ya.role = 'FIELD EXECUTIVE' THEN 'Field'
-                    WHEN ya.role = 'AGENT' THEN 'Call'
-                    ELSE 'N/A'
-                END as "Channel",
-                COALESCE(a.name, 'Not Assigned') as "Agency",
-                ya.created_at as "Added On",
-                ya.updated_at as "Last Active On",
-                CASE 
-                    WHEN ya.shift_start_time IS NOT NULL AND ya.shift_end_time IS NOT NULL 
-                    THEN 
-                        EXTRACT(HOUR FROM (
-                            CAST(ya.shift_end_time AS TIME) - CAST(ya.shift_start_time AS TIME)
-                        ))
-                    ELSE NULL
-                END as "Total Time Spent (Hours)"
-            FROM yucollect_agent ya
-            LEFT JOIN agency a ON ya.agency_id = a.agency_id
-            WHERE ya.updated_at BETWEEN %s AND %s
-            ORDER BY ya.updated_at DESC NULLS LAST
-            LIMIT 1000;  -- Add limit to prevent excessive data loading
-        """
-        cur.execute(query, (st.session_state.start_date, st.session_state.end_date))
-        user_details = cur.fetchall()
+        # Get user details with metrics
+        user_details = QueryRegistry.fetch_all(db, "user_details.user_list", {'start_date': start_date_str, 'end_date': end_date_str, 'limit': USER_LIST_LIMIT})
         
         if user_details:
             # Convert to DataFrame
-            df_user_details = pd.DataFrame(user_details)
-            return df_user_details
+            df_user_details = prepare_user_frame(pd.DataFrame(user_details))
+            # Results built from a fallback are returned but not cached
+            return QueryGuard.cacheable(AggregationManager.optimize_dtypes(df_user_details, label="user details"))
         else:
-            return None
+            return QueryGuard.cacheable(None)
+    except DegradedResult:
+        raise
     except Exception as e:
         st.error(f"Error in get_user_data: {str(e)}")
-        return None
+        return QueryGuard.cacheable(None)
     finally:
         # Close database connection
-        if 'cur' in locals() and cur:
-            cur.close()
-
-db = DatabaseManager()
-
-def get_earliest_date():
-    try:
-        cur = db.get_ingestion_cursor()
-        if not cur:
-            return (datetime.now() - timedelta(days=30)).date()
-            
-        cur.execute("""
-            SELECT MIN(created_at)::date
-            FROM allocation_files
-            WHERE created_at IS NOT NULL;
-        """)
-        result = cur.fetchone()
-        return result['min'] if result and result['min'] else (datetime.now() - timedelta(days=30)).date()
-    except Exception as e:
-        st.error(f"Error getting earliest date: {str(e)}")
-        return (datetime.now() - timedelta(days=30)).date()
-
-# Always get the earliest date first
-earliest_date = get_earliest_date()
-
-# Initialize dates from main dashboard's session state
-start_date = st.session_state.start_date if 'start_date' in st.session_state else earliest_date
-end_date = st.session_state.end_date if 'end_date' in st.session_state else datetime.now().date()
-
-# Initialize session state for this page's dates
-if 'user_start_date' not in st.session_state:
-    st.session_state.user_start_date = start_date
-if 'user_end_date' not in st.session_state:
-    st.session_state.user_end_date = end_date
-
-start_date_str = start_date.strftime('%Y-%m-%d')
-end_date_str = end_date.strftime('%Y-%m-%d')
+        if 'db' in locals():
+            db.close_connections()
 
 # Title
 st.title("User Details")
 
 # Date filter
 st.markdown('<h3>Filter by Date Range</h3>', unsafe_allow_html=True)
-date_col1, date_col2 = st.columns(2)
-
-def update_dates(key, value):
-    """Update dates in session state"""
-    if key.endswith('_start_date'):
-        st.session_state.start_date = value
-        st.session_state.user_start_date = value
-    elif key.endswith('_end_date'):
-        st.session_state.end_date = value
-        st.session_state.user_end_date = value
-
-with date_col1:
-    start_date = st.date_input(
-        "Start Date",
-        value=st.session_state.user_start_date,
-        key="user_start_date",
-        on_change=lambda: update_dates('user_start_date', st.session_state.user_start_date)
-    )
-
-with date_col2:
-    end_date = st.date_input(
-        "End Date",
-        value=st.session_state.user_end_date,
-        key="user_end_date",
-        on_change=lambda: update_dates('user_end_date', st.session_state.user_end_date)
-    )
-
-# Convert dates to strings for queries
-start_date_str = start_date.strftime('%Y-%m-%d')
-end_date_str = end_date.strftime('%Y-%m-%d')
+start_date_str, end_date_str = DateRangeState.date_filter("user")
+start_date, end_date = DateRangeState.current()
 
 # Display current date range
 st.markdown(f"**Date Range:** {format_date(start_date)} to {format_date(end_date)}")
@@ -229,14 +180,13 @@ st.markdown(f"**Date Range:** {format_date(start_date)} to {format_date(end_date
 # Show loading spinner while fetching data
 with st.spinner("Loading user data..."):
     # Get user data with caching
-    df_user_details = get_user_data()
+    df_user_details, degraded = QueryGuard.call_cached(get_user_data, start_date_str, end_date_str)
+for message in degraded:
+    st.warning(message)
 
-if df_user_details is not None:
-    # Format date columns
-    df_user_details["Added On (Formatted)"] = df_user_details["Added On"].apply(format_date)
-    df_user_details["Last Active On (Formatted)"] = df_user_details["Last Active On"].apply(format_date)
-    df_user_details["Total Time Spent"] = df_user_details["Total Time Spent (Hours)"].apply(format_time_spent)
-    
+# Filters, table and export rerun on their own: changing them does not reload the data
+@st.fragment
+def user_table_panel(df_user_details, start_date_str, end_date_str):
     # Section: User List
     st.markdown('<h2 class="section-heading">User List</h2>', unsafe_allow_html=True)
     
@@ -252,22 +202,12 @@ if df_user_details is not None:
         channel_options = sorted(df_user_details["Channel"].unique())
         channel_filter = st.multiselect("Filter by Channel", options=channel_options, key="user_channel_filter")
     
-    sort_col = st.selectbox("Sort by", df_user_details.columns, index=df_user_details.columns.get_loc("Last Active On") if "Last Active On" in df_user_details.columns else 0, key="user_sort")
+    sort_columns = df_user_details.columns.drop(AggregationManager.SEARCH_COLUMN)
+    sort_col = st.selectbox("Sort by", sort_columns, index=df_user_details.columns.get_loc("Last Active On") if "Last Active On" in df_user_details.columns else 0, key="user_sort")
     sort_order = st.radio("Sort order", ["Descending", "Ascending"], horizontal=True, key="user_order")
     
     # Apply filters
-    filtered_df = df_user_details.copy()
-    if search:
-        search_lower = search.lower()
-        filtered_df = filtered_df[
-            filtered_df.apply(lambda row: any(str(val).lower().find(search_lower) >= 0 for val in row), axis=1)
-        ]
-    
-    if role_filter:
-        filtered_df = filtered_df[filtered_df["Role"].isin(role_filter)]
-    
-    if channel_filter:
-        filtered_df = filtered_df[filtered_df["Channel"].isin(channel_filter)]
+    filtered_df = filter_users(df_user_details, search, role_filter, channel_filter)
     
     # Apply sorting
     if sort_order == "Descending":
@@ -281,42 +221,24 @@ if df_user_details is not None:
         "Last Active On (Formatted)", "Total Time Spent"
     ]
     
-    # Create display DataFrame - limit to 100 rows for faster rendering
-    display_df = filtered_df[display_columns].head(100)
-    
-    # Show total count and note about limiting display
-    total_count = len(filtered_df)
-    displayed_count = len(display_df)
-    
-    st.info(f"Showing {displayed_count} of {total_count} users. {'' if displayed_count == total_count else 'Results limited to 100 rows for performance.'}")
+    # Create display DataFrame - the windowed table only renders the visible rows
+    display_df = filtered_df[display_columns]
     
-    # Display data with formatting
-    st.write(
-        """
-        <div class="dataframe-container">
-        """,
-        unsafe_allow_html=True
-    )
-    
-    # Convert DataFrame to HTML with custom formatting
-    html_table = display_df.to_html(
-        index=False,
-        escape=False,
-        classes='dataframe'
-    )
+    # Show total count
+    st.info(f"Showing {len(display_df)} users.")
     
-    st.write(html_table, unsafe_allow_html=True)
-    st.write("</div>", unsafe_allow_html=True)
+    # Display data in a windowed table - only the visible rows are rendered
+    VirtualTable.render(display_df)
     
-    # Add download button
-    st.download_button(
-        label="📥 Download User Details",
-        data=filtered_df.to_csv(index=False).encode('utf-8'),
-        file_name=f"user_details_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-        mime="text/csv",
-        key="download_user_details",
-        help="Download the user details as a CSV file"
+    # Export every matching user (not just the loaded ones), streamed from a server-side cursor on request
+    ExportService.download(
+        "download_user_details", "📥 Download User Details", f"user_details_{start_date_str}_{end_date_str}",
+        lambda: stream_user_data(start_date_str, end_date_str, search, role_filter, channel_filter),
+        signature=(start_date_str, end_date_str, search, tuple(role_filter), tuple(channel_filter)),
+        help="Download every user matching the filters"
     )
-    
+
+if df_user_details is not None:
+    user_table_panel(df_user_details, start_date_str, end_date_str)
 else:
     st.warning("No user data found. Please check the database connection.")
@@ -0,0 +1,246 @@
+from datetime import date, datetime, timedelta
+from query_registry import ANALYTICS_SCHEMA, PARTITIONED_TABLES
+
+class PartitionManager:
+    """
+    Maintains monthly range-partitioned analytics copies of the large
+    allocation tables in the ingestion database (analytics.allocation_files,
+    analytics.allocation_payments), partitioned on created_at.
+
+    Date-filtered dashboard queries read the copies when partitioned reads are
+    enabled (ANALYTICS_PARTITIONS=true), so a month or year view only touches
+    the partitions inside its range. Incremental syncs rewrite a trailing
+    window of recent rows plus the REFRESH_MONTHS older months refreshed
+    longest ago, so updates and deletes of older rows reach the copies within
+    (months of history / REFRESH_MONTHS) syncs instead of never.
+    """
+
+    PARTITION_KEY = 'created_at'
+    MONTHS_AHEAD = 2  # Empty future partitions created on every sync
+    SYNC_WINDOW_DAYS = 7  # Trailing window re-copied on an incremental sync
+    REFRESH_MONTHS = 1  # Older months re-copied per incremental sync, least recently refreshed first
+    REFRESH_LOG = f"{ANALYTICS_SCHEMA}.partition_refreshes"  # Partition name -> when its rows were last copied
+
+    # Indexes created on each partitioned parent (and so on every partition)
+    INDEXES = {
+        'allocation_files': {
+            'created_at': "(created_at)",
+            'allocation_id': "(allocation_id)",
+            'agency_created': "(agency_id, created_at)",
+        },
+        'allocation_payments': {
+            'created_at': "(created_at)",
+            'allocation_created': "(allocation_id, created_at)",
+        },
+    }
+
+    def __init__(self, cur, dry_run=False):
+        self.cur = cur
+        self.dry_run = dry_run
+
+    def _run(self, statement, params=None):
+        print(f"{'[dry-run] ' if self.dry_run else ''}{statement.strip()}")
+        if not self.dry_run:
+            self.cur.execute(statement, params)
+
+    @staticmethod
+    def month_start(value):
+        """First day of the month containing a date or datetime"""
+        return date(value.year, value.month, 1)
+
+    @staticmethod
+    def next_month(month):
+        return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+    @classmethod
+    def months_between(cls, start, end):
+        """Month starts from start's month through end's month inclusive"""
+        month, last = cls.month_start(start), cls.month_start(end)
+        while month <= last:
+            yield month
+            month = cls.next_month(month)
+
+    @staticmethod
+    def qualified(table):
+        return f"{ANALYTICS_SCHEMA}.{table}"
+
+    @staticmethod
+    def partition_name(table, month):
+        return f"{table}_y{month.year}m{month.month:02d}"
+
+    def existing_partitions(self, table):
+        """Names of the partitions currently attached to an analytics table"""
+        self.cur.execute("""
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s)
+        """, (self.qualified(table),))
+        return {row['relname'] if isinstance(row, dict) else row[0] for row in self.cur.fetchall()}
+
+    def copy_columns(self, table):
+        """Columns of the live table that can be inserted (generated columns are recomputed)"""
+        self.cur.execute("""
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_schema = 'public'
+                AND table_name = %s
+                AND is_generated = 'NEVER'
+            ORDER BY ordinal_position
+        """, (table,))
+        return [row['column_name'] if isinstance(row, dict) else row[0] for row in self.cur.fetchall()]
+
+    def create_parent(self, table):
+        """Create the partitioned copy of a live table with a DEFAULT partition and its indexes"""
+        self._run(f"CREATE SCHEMA IF NOT EXISTS {ANALYTICS_SCHEMA}")
+        # Constraints are not copied: a primary key would have to include created_at
+        self._run(f"""
+            CREATE TABLE IF NOT EXISTS {self.qualified(table)}
+                (LIKE public.{table} INCLUDING DEFAULTS INCLUDING GENERATED)
+                PARTITION BY RANGE ({self.PARTITION_KEY})
+        """)
+        # Catches NULL created_at and anything outside the monthly partitions
+        self._run(f"CREATE TABLE IF NOT EXISTS {self.qualified(table)}_default "
+                  f"PARTITION OF {self.qualified(table)} DEFAULT")
+        for suffix, columns in self.INDEXES[table].items():
+            self._run(f"CREATE INDEX IF NOT EXISTS idx_{table}_{suffix} ON {self.qualified(table)} {columns}")
+
+    def create_refresh_log(self):
+        self._run(f"""
+            CREATE TABLE IF NOT EXISTS {self.REFRESH_LOG} (
+                partition_name text PRIMARY KEY,
+                refreshed_at timestamptz NOT NULL
+            )
+        """)
+
+    def log_refresh(self, names):
+        """Record that the given partitions were just re-copied from the live table"""
+        if names:
+            self._run(f"""
+                INSERT INTO {self.REFRESH_LOG} (partition_name, refreshed_at)
+                SELECT name, now() FROM unnest(%(names)s::text[]) AS name
+                ON CONFLICT (partition_name) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at
+            """, {'names': names})
+
+    def stale_months(self, table, months, count):
+        """The `count` months refreshed longest ago (never refreshed first, then oldest month first)"""
+        if count <= 0 or not months:
+            return []
+        refreshed = {}
+        self.cur.execute("SELECT to_regclass(%s) IS NOT NULL AS found", (self.REFRESH_LOG,))
+        row = self.cur.fetchone()
+        if row['found'] if isinstance(row, dict) else row[0]:
+            self.cur.execute(
+                f"SELECT partition_name, refreshed_at FROM {self.REFRESH_LOG} WHERE partition_name = ANY(%s)",
+                ([self.partition_name(table, month) for month in months],)
+            )
+            for row in self.cur.fetchall():
+                name, refreshed_at = (row['partition_name'], row['refreshed_at']) if isinstance(row, dict) else row
+                refreshed[name] = refreshed_at
+        def staleness(month):
+            refreshed_at = refreshed.get(self.partition_name(table, month))
+            return (refreshed_at is not None, refreshed_at, month)
+        return sorted(months, key=staleness)[:count]
+
+    def ensure_partitions(self, table, start, end):
+        """
+        Create the monthly partitions covering start..end
+
+        Returns:
+        - List of partition names that were created
+        """
+        existing = self.existing_partitions(table)
+        created = []
+        for month in self.months_between(start, end):
+            name = self.partition_name(table, month)
+            if name in existing:
+                continue
+            self._run(
+                f"CREATE TABLE {ANALYTICS_SCHEMA}.{name} PARTITION OF {self.qualified(table)} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{self.next_month(month).isoformat()}')"
+            )
+            created.append(name)
+        return created
+
+    def sync_table(self, table, full=False, window_days=None, refresh_months=None):
+        """
+        Copy rows from the live table into its partitioned copy
+
+        Parameters:
+        - table: One of PARTITIONED_TABLES
+        - full: Reload the whole history instead of the trailing window
+        - window_days: Days re-copied on an incremental sync (default SYNC_WINDOW_DAYS)
+        - refresh_months: Older months also re-copied on an incremental sync (default REFRESH_MONTHS)
+
+        Returns:
+        - Names of the partitions whose rows changed (to be analyzed)
+        """
+        if table not in PARTITIONED_TABLES:
+            raise ValueError(f"Unknown partitioned table '{table}'")
+
+        self.create_parent(table)
+        self.create_refresh_log()
+        key = self.PARTITION_KEY
+
+        self.cur.execute(f"SELECT MIN({key}) AS first, MAX({key}) AS last FROM public.{table}")
+        row = self.cur.fetchone()
+        first, last = (row['first'], row['last']) if isinstance(row, dict) else row
+        today = datetime.now().date()
+        last = max(last.date() if isinstance(last, datetime) else (last or today), today)
+        horizon = self.month_start(last)
+        for _ in range(self.MONTHS_AHEAD):
+            horizon = self.next_month(horizon)
+
+        if full or not first:
+            since = None
+            self.ensure_partitions(table, first or today, horizon)
+        else:
+            since = datetime.now() - timedelta(days=window_days or self.SYNC_WINDOW_DAYS)
+            self.ensure_partitions(table, since, horizon)
+
+        columns = ', '.join(self.copy_columns(table))
+        if since is None:
+            self._run(f"TRUNCATE {self.qualified(table)}")
+            self._run(f"INSERT INTO {self.qualified(table)} ({columns}) SELECT {columns} FROM public.{table}")
+            touched = list(self.months_between(first or today, last))
+            self.log_refresh([self.partition_name(table, month) for month in touched])
+        else:
+            # Rows in the window may have been updated since the last sync, so
+            # replace the whole window; the predicate prunes to its partitions
+            self._run(f"DELETE FROM {self.qualified(table)} WHERE {key} >= %(since)s", {'since': since})
+            self._run(f"INSERT INTO {self.qualified(table)} ({columns}) "
+                      f"SELECT {columns} FROM public.{table} WHERE {key} >= %(since)s", {'since': since})
+            touched = list(self.months_between(since, last))
+
+            # Older rows can be updated or deleted too (e.g. status changes); re-copy
+            # the months refreshed longest ago so every month is caught up in turn
+            existing = self.existing_partitions(table)
+            older = [month for month in self.months_between(first, since)
+                     if self.partition_name(table, month) in existing]
+            count = self.REFRESH_MONTHS if refresh_months is None else refresh_months
+            refreshed = []
+            for month in sorted(self.stale_months(table, older, count)):
+                bounds = {'start': month, 'end': min(datetime.combine(self.next_month(month), datetime.min.time()), since)}
+                self._run(f"DELETE FROM {self.qualified(table)} WHERE {key} >= %(start)s AND {key} < %(end)s", bounds)
+                self._run(f"INSERT INTO {self.qualified(table)} ({columns}) "
+                          f"SELECT {columns} FROM public.{table} WHERE {key} >= %(start)s AND {key} < %(end)s", bounds)
+                refreshed.append(self.partition_name(table, month))
+                if month not in touched:
+                    touched.insert(0, month)
+            self.log_refresh(refreshed)
+
+        return [self.partition_name(table, month) for month in touched] + [f"{table}_default"]
+
+    def sync(self, full=False, window_days=None, refresh_months=None):
+        """Sync every partitioned table and refresh statistics of the partitions that changed"""
+        touched = []
+        for table in PARTITIONED_TABLES:
+            touched.extend(self.sync_table(table, full, window_days, refresh_months))
+            if not self.dry_run:
+                self.cur.connection.commit()
+        # Only the partitions that changed; ANALYZE on the parent would rescan every month
+        for name in touched:
+            self._run(f"ANALYZE {ANALYTICS_SCHEMA}.{name}")
+        if not self.dry_run:
+            self.cur.connection.commit()
+        return touched
@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+import requests
+from query_guard import QueryGuard, QueryBusy
+
+class QueryClient:
+    """
+    Client mode: dashboard queries answered by the Control Tower API
+    (backend/main.py) instead of direct database connections.
+
+    When CONTROL_TOWER_API_URL is set, QueryRegistry.fetch_all/fetch_one,
+    SearchService.search and OverviewMetrics.fetch request their rows from
+    the API's /api/queries, /api/search and /api/overview endpoints. Every
+    Streamlit worker then shares the API's result cache, connection pools
+    and QueryGuard limits, and opens no database connection of its own.
+    Values JSON cannot carry (dates, timestamps, Decimals) are restored from
+    the column types the API reports, so pages get the same rows either way.
+    """
+
+    API_URL = os.getenv('CONTROL_TOWER_API_URL', '').rstrip('/') or None
+
+    TIMEOUT = 90  # Seconds to wait for the API (above the heavy class's timeout plus wait budget)
+
+    # Column type reported by the API -> parser of its JSON value
+    PARSERS = {
+        'date': date.fromisoformat,
+        'datetime': datetime.fromisoformat,
+        'decimal': Decimal,
+    }
+
+    _local = threading.local()
+
+    @classmethod
+    def enabled(cls):
+        """Whether queries go through the API"""
+        return cls.API_URL is not None
+
+    @classmethod
+    def _session(cls):
+        # One keep-alive session per thread (Streamlit runs each script run on its own thread)
+        if not hasattr(cls._local, 'session'):
+            cls._local.session = requests.Session()
+        return cls._local.session
+
+    @staticmethod
+    def _encode(value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        return str(value)
+
+    @classmethod
+    def _request(cls, method, path, params=None, body=None):
+        """
+        JSON response of an API request
+
+        Returns:
+        - Decoded response, or None if the API is unreachable
+
+        Raises QueryBusy when the API turned the query away (503).
+        """
+        try:
+            response = cls._session().request(
+                method, cls.API_URL + path, params=params,
+                data=json.dumps(body, default=cls._encode) if body is not None else None,
+                headers={'Content-Type': 'application/json'} if body is not None else None,
+                timeout=cls.TIMEOUT
+            )
+        except requests.RequestException as e:
+            print(f"Control Tower API unreachable: {str(e)}")
+            return None
+        if response.status_code == 503:
+            raise QueryBusy(response.json().get('detail', "The Control Tower API is busy"))
+        response.raise_for_status()
+        return response.json()
+
+    @classmethod
+    def decode_rows(cls, result):
+        """Rows as dictionaries, with date, timestamp and Decimal values restored"""
+        parsers = {column: cls.PARSERS[kind] for column, kind in result['types'].items()}
+        rows = []
+        for values in result['rows']:
+            row = dict(zip(result['columns'], values))
+            for column, parse in parsers.items():
+                if row[column] is not None:
+                    row[column] = parse(row[column])
+            rows.append(row)
+        return rows
+
+    @classmethod
+    def _result(cls, result):
+        if result is None or result['rows'] is None:
+            return None
+        for message in result['degraded']:
+            QueryGuard.record_degraded(message)
+        return cls.decode_rows(result)
+
+    @classmethod
+    def fetch(cls, name, params=None, mode='all'):
+        """
+        Run a registered query through the API
+
+        Parameters:
+        - name: Registered query name
+        - params: Dictionary of named parameters
+        - mode: 'all' for every row, 'one' for the first row, 'estimate' for the planner row estimate
+
+        Returns:
+        - List of rows, the first row (None without rows) or the estimate; None if unreachable
+        """
+        result = cls._request('POST', f"/api/queries/{name}", body={'params': params, 'mode': mode})
+        if mode == 'estimate':
+            return result['estimate'] if result else None
+        rows = cls._result(result)
+        if mode == 'one' and rows is not None:
+            return rows[0] if rows else None
+        return rows
+
+    @classmethod
+    def search(cls, kind, term, limit=None):
+        """Rows of a SearchService name search run by the API (None if unreachable)"""
+        params = {'kind': kind, 'term': term}
+        if limit:
+            params['limit'] = limit
+        return cls._result(cls._request('GET', "/api/search", params=params))
+
+    @classmethod
+    def overview(cls, groups, start_date, end_date):
+        """Results of OverviewMetrics groups from /api/overview (None if unreachable)"""
+        params = {'groups': ','.join(groups), 'start_date': start_date, 'end_date': end_date}
+        result = cls._request('GET', "/api/overview", params={k: v for k, v in params.items() if v})
+        return result['groups'] if result else None
@@ -0,0 +1,205 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from psycopg2.errors import QueryCanceled
+
+class QueryBusy(Exception):
+    """No query slot on the database became free within the wait budget"""
+
+class QueryTimeout(Exception):
+    """The query was cancelled by its statement_timeout"""
+
+class DegradedResult(Exception):
+    """
+    A cached loader's result must not be cached: it was built from a fallback
+    result or the query failed. Carries the result and the messages about it
+    out of the cache (see QueryGuard.cacheable).
+    """
+
+    def __init__(self, result, messages):
+        super().__init__("; ".join(messages) or "The query returned no result")
+        self.result = result
+        self.messages = messages
+
+class QueryGuard:
+    """
+    Statement timeouts and admission control for dashboard and API queries.
+
+    Every query belongs to a class (QUERY_CLASSES) that sets its
+    statement_timeout and how long it may wait for a slot. Each database
+    admits at most MAX_CONCURRENT guarded queries per process at a time;
+    further queries queue for up to their wait budget and then fail with
+    QueryBusy instead of piling onto the database. A query stopped by its
+    timeout raises QueryTimeout after the transaction is rolled back, so the
+    connection stays usable.
+
+    `fetch()` degrades gracefully: the last good result of each key is
+    kept, and returned (with its age) when a later run is busy or times out.
+    Loaders cached with st.cache_data end with `cacheable()` and are called
+    through `call_cached()`, so only fresh results are cached and a fallback
+    is retried (and its warning shown) on every run.
+    """
+
+    # Query class -> (statement_timeout, wait budget for a slot), in seconds
+    QUERY_CLASSES = {
+        'light': (5, 2),  # Lookups, watermarks and small aggregates
+        'standard': (15, 5),
+        'heavy': (60, 10),  # Date-range joins of allocation_files with allocation_payments
+        'export': (600, 30),  # Full-result exports, fetched batch by batch
+    }
+    DEFAULT_CLASS = 'standard'
+
+    MAX_CONCURRENT = int(os.getenv('DB_MAX_CONCURRENT_QUERIES', '4'))  # Guarded queries per database
+    FALLBACK_ENTRIES = 256  # Last good results kept for degradation
+
+    _slots = {}  # database -> BoundedSemaphore
+    _fallbacks = OrderedDict()  # key -> (result, completed at)
+    _lock = threading.Lock()
+    _local = threading.local()
+
+    @classmethod
+    def limits(cls, query_class=None):
+        """(statement_timeout, wait budget) of a query class"""
+        query_class = query_class or cls.DEFAULT_CLASS
+        if query_class not in cls.QUERY_CLASSES:
+            raise ValueError(f"Unknown query class '{query_class}'")
+        return cls.QUERY_CLASSES[query_class]
+
+    @classmethod
+    def _semaphore(cls, database):
+        with cls._lock:
+            if database not in cls._slots:
+                cls._slots[database] = threading.BoundedSemaphore(cls.MAX_CONCURRENT)
+            return cls._slots[database]
+
+    @classmethod
+    def set_timeout(cls, cur, query_class=None):
+        """Apply the class's statement_timeout to the cursor's current transaction"""
+        timeout, _ = cls.limits(query_class)
+        # SET LOCAL ends with the transaction; autocommit connections have none, so set the session
+        scope = "" if cur.connection.autocommit else "LOCAL "
+        cur.execute(f"SET {scope}statement_timeout = {int(timeout * 1000)}")
+
+    @classmethod
+    def execute(cls, cur, sql, params=None, database='default', query_class=None):
+        """
+        Execute a query under its class's timeout, once the database has a free slot
+
+        Parameters:
+        - cur: Cursor to run the query on
+        - sql: SQL to run
+        - params: Query parameters
+        - database: Name of the database whose concurrency limit applies
+        - query_class: Key of QUERY_CLASSES (default DEFAULT_CLASS)
+
+        Raises:
+        - QueryBusy when no slot frees up within the wait budget
+        - QueryTimeout when the statement_timeout cancels the query
+        """
+        _, wait = cls.limits(query_class)
+        slots = cls._semaphore(database)
+        if not slots.acquire(timeout=wait):
+            raise QueryBusy(f"The {database} database is busy (waited {wait}s for a query slot)")
+        try:
+            cls.set_timeout(cur, query_class)
+            cur.execute(sql, params)
+        except QueryCanceled as e:
+            cur.connection.rollback()
+            raise QueryTimeout(f"Query exceeded its {cls.limits(query_class)[0]}s time limit") from e
+        finally:
+            slots.release()
+        return cur
+
+    @staticmethod
+    def key(*parts):
+        """Hashable key of a query name and its parameters"""
+        return json.dumps(parts, sort_keys=True, default=str)
+
+    @classmethod
+    def fetch(cls, key, load):
+        """
+        Run load() and remember its result; fall back to the last good result when guarded
+
+        Parameters:
+        - key: Key of the result (see key())
+        - load: Callable running the guarded query and returning its result
+
+        Returns:
+        - (result, stale_seconds): stale_seconds is None for a fresh result, else
+          the age of the fallback that was returned
+
+        Raises QueryBusy / QueryTimeout when there is no earlier result to fall back to.
+        """
+        try:
+            result = load()
+        except (QueryBusy, QueryTimeout) as e:
+            with cls._lock:
+                fallback = cls._fallbacks.get(key)
+            if fallback is None:
+                raise
+            stale_seconds = round(time.time() - fallback[1], 1)
+            print(f"{e}; serving a result from {stale_seconds:.0f}s ago")
+            cls.record_degraded(f"{e}. Showing data from {stale_seconds / 60:.0f} min ago.")
+            return fallback[0], stale_seconds
+
+        if result is not None:
+            with cls._lock:
+                cls._fallbacks[key] = (result, time.time())
+                cls._fallbacks.move_to_end(key)
+                while len(cls._fallbacks) > cls.FALLBACK_ENTRIES:
+                    cls._fallbacks.popitem(last=False)
+        return result, None
+
+    @classmethod
+    def _degraded(cls):
+        if not hasattr(cls._local, 'degraded'):
+            cls._local.degraded = []
+        return cls._local.degraded
+
+    @classmethod
+    def record_degraded(cls, message):
+        """Note that an older result was served on this thread (reported by pop_degraded)"""
+        cls._degraded().append(message)
+
+    @classmethod
+    def pop_degraded(cls):
+        """Messages about fallback results served on this thread since the last call"""
+        messages = cls._degraded()
+        cls._local.degraded = []
+        return messages
+
+    @classmethod
+    def cacheable(cls, result, failed=None):
+        """
+        Return a cached loader's result, or raise DegradedResult when it must not be cached
+
+        Parameters:
+        - result: The loader's result
+        - failed: Whether the load failed (default: result is None)
+
+        A result built from a fallback (degradation messages were recorded on
+        this thread) or a failed load raises, so st.cache_data does not keep
+        it and the next run queries again.
+        """
+        messages = cls.pop_degraded()
+        if failed is None:
+            failed = result is None
+        if messages or failed:
+            raise DegradedResult(result, messages)
+        return result
+
+    @classmethod
+    def call_cached(cls, loader, *args):
+        """
+        Call a cached loader that ends with cacheable()
+
+        Returns:
+        - (result, messages): messages about fallbacks served on this run, to show as warnings
+        """
+        earlier = cls.pop_degraded()  # Recorded before the loader; they must not stop its result being cached
+        try:
+            return loader(*args), earlier
+        except DegradedResult as e:
+            return e.result, earlier + e.messages
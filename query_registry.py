@@ -0,0 +1,804 @@
+import os
+import re
+from datetime import datetime, timedelta
+from query_guard import QueryGuard
+from query_client import QueryClient
+
+def _label_expression(column):
+    """
+    Display label of a JSONB column: a JSON string or one-element array as its
+    unescaped text, a longer array with only the outer [" "] and the separating
+    quotes removed, anything else as its JSON text. Quotes and backslashes
+    inside the names are kept.
+    """
+    value = "{alias}" + column
+    return (
+        f"btrim(CASE jsonb_typeof({value}) "
+        f"WHEN 'string' THEN {value} #>> ARRAY[]::text[] "
+        f"WHEN 'array' THEN CASE WHEN jsonb_array_length({value}) = 1 THEN {value} ->> 0 "
+        f"""ELSE replace(regexp_replace({value}::text, '^\\["|"\\]$', '', 'g'), '", "', ', ') END """
+        f"ELSE {value}::text END)"
+    )
+
+# JSONB dimensions of allocation_files. Queries reference them as {dim:af.product_name}
+# (or {dim:product_name} without an alias); the registry renders the marker as the
+# generated column when schema_bootstrap.py has added it, else as the JSONB expression.
+DIMENSION_EXPRESSIONS = {
+    'product_name': "{alias}product->>'name'",
+    'bucket_name': "{alias}bucket->>'name'",
+    # Display labels (see _label_expression)
+    'product_label': _label_expression('product'),
+    'bucket_label': _label_expression('bucket'),
+    'channel_digital': "COALESCE({alias}channel->>'digital' = 'true', false)",
+    'channel_call': "COALESCE({alias}channel->>'call' = 'true', false)",
+    'channel_field': "COALESCE({alias}channel->>'field' = 'true', false)",
+}
+
+DIMENSION_TYPES = {
+    'product_name': 'text',
+    'bucket_name': 'text',
+    'product_label': 'text',
+    'bucket_label': 'text',
+    'channel_digital': 'boolean',
+    'channel_call': 'boolean',
+    'channel_field': 'boolean',
+}
+
+_DIMENSION_MARKER = re.compile(r'\{dim:(?:(\w+)\.)?(\w+)\}')
+
+# Tables with monthly range-partitioned copies in the analytics schema (see
+# partition_manager.py). Queries reference them as {table:allocation_files}; the
+# registry renders the marker as the analytics copy when ANALYTICS_PARTITIONS=true
+# and the copy exists, else as the live table.
+ANALYTICS_SCHEMA = 'analytics'
+PARTITIONED_TABLES = ('allocation_files', 'allocation_payments')
+
+_TABLE_MARKER = re.compile(r'\{table:(\w+)\}')
+
+# Date filters on the partition key are written as {date_range:af.created_at}.
+# They render as plain comparisons of the bare column with the query's constant
+# bounds, which lets the planner skip every partition outside the range.
+# Wrapping the column (DATE(created_at), created_at::date) would defeat pruning.
+_DATE_RANGE_MARKER = re.compile(r'\{date_range:((?:\w+\.)?\w+)\}')
+
+class RegisteredQuery:
+    """
+    A named dashboard query together with the database it runs on and the
+    dashboard panel it feeds. Queries use named psycopg2 parameters
+    (e.g. %(start_date)s) so they can be replayed with sample values.
+    The query class picks its statement_timeout and wait budget in QueryGuard.
+    Only remote queries, the ones the dashboards run in client mode, can be
+    run through the API's /api/queries endpoint.
+    """
+
+    def __init__(self, name, panel, database, sql, sample_params=None, query_class=None, remote=False):
+        self.name = name
+        self.panel = panel
+        self.database = database  # 'ingestion', 'entity' or 'ucf'
+        self.sql = sql
+        self.sample_params = sample_params
+        self.query_class = query_class or QueryGuard.DEFAULT_CLASS
+        self.remote = remote
+        QueryGuard.limits(self.query_class)  # Reject unknown classes at registration
+
+    def __repr__(self):
+        return f"RegisteredQuery({self.name!r}, database={self.database!r})"
+
+class QueryRegistry:
+    """
+    Central registry of the SQL behind every dashboard panel.
+    Pages execute their queries through the registry so tooling (e.g. the
+    index advisor in show_schema.py) can replay the exact same workload.
+    """
+
+    _queries = {}
+    _dimension_columns = {}  # (database, schema) -> whether the generated dimension columns exist
+    _partitioned_reads = {}  # database -> whether queries read the partitioned analytics copies
+
+    @staticmethod
+    def sample_date_params(days=90):
+        """Default date range used when replaying date-filtered queries"""
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=days)
+        return {
+            'start_date': start_date.strftime('%Y-%m-%d'),
+            'end_date': end_date.strftime('%Y-%m-%d')
+        }
+
+    @staticmethod
+    def contains_pattern(text):
+        """LIKE/ILIKE pattern matching the text anywhere, with wildcards escaped (None for empty text)"""
+        if not text:
+            return None
+        escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return f"%{escaped}%"
+
+    @classmethod
+    def register(cls, name, panel, database, sql, sample_params=None, query_class=None, remote=False):
+        """Register a query under a unique name ('light', 'standard' or 'heavy' query class; remote if the API may run it)"""
+        if name in cls._queries:
+            raise ValueError(f"Query '{name}' is already registered")
+        query = RegisteredQuery(name, panel, database, sql, sample_params, query_class, remote)
+        cls._queries[name] = query
+        return query
+
+    @classmethod
+    def get(cls, name):
+        """Get a registered query by name"""
+        if name not in cls._queries:
+            raise KeyError(f"Unknown query '{name}'")
+        return cls._queries[name]
+
+    @classmethod
+    def get_remote(cls, name):
+        """Get a registered query the API may run; unknown or local-only names fail here in client mode"""
+        query = cls.get(name)
+        if not query.remote:
+            raise ValueError(f"Query '{name}' is not registered as remote, so the API does not run it")
+        return query
+
+    @classmethod
+    def all(cls, database=None):
+        """List registered queries, optionally only those for one database"""
+        return [q for q in cls._queries.values() if database is None or q.database == database]
+
+    @staticmethod
+    def partitions_enabled():
+        """Whether partitioned reads are switched on (ANALYTICS_PARTITIONS=true)"""
+        return os.getenv('ANALYTICS_PARTITIONS', 'false').lower() in ('1', 'true', 'yes')
+
+    @classmethod
+    def use_partitions(cls, cur, database):
+        """Check (once per database) whether queries should read the partitioned analytics copies"""
+        if database not in cls._partitioned_reads:
+            found = False
+            if database == 'ingestion' and cls.partitions_enabled():
+                cur.execute(
+                    "SELECT COUNT(to_regclass(name)) as found FROM unnest(%s::text[]) as name",
+                    ([f"{ANALYTICS_SCHEMA}.{table}" for table in PARTITIONED_TABLES],)
+                )
+                row = cur.fetchone()
+                found = (row['found'] if isinstance(row, dict) else row[0]) == len(PARTITIONED_TABLES)
+            cls._partitioned_reads[database] = found
+        return cls._partitioned_reads[database]
+
+    @classmethod
+    def table_schema(cls, cur, database):
+        """Schema the partitioned tables are read from"""
+        return ANALYTICS_SCHEMA if cls.use_partitions(cur, database) else 'public'
+
+    @classmethod
+    def has_dimension_columns(cls, cur, database):
+        """Check (once per database) whether allocation_files has the generated dimension columns"""
+        schema = cls.table_schema(cur, database)
+        if (database, schema) not in cls._dimension_columns:
+            cur.execute("""
+                SELECT COUNT(*) as found
+                FROM information_schema.columns
+                WHERE table_schema = %s
+                    AND table_name = 'allocation_files'
+                    AND column_name = ANY(%s)
+            """, (schema, list(DIMENSION_EXPRESSIONS)))
+            row = cur.fetchone()
+            found = row['found'] if isinstance(row, dict) else row[0]
+            cls._dimension_columns[(database, schema)] = found == len(DIMENSION_EXPRESSIONS)
+        return cls._dimension_columns[(database, schema)]
+
+    @classmethod
+    def reset_dimension_detection(cls):
+        """Forget detected dimension columns, e.g. after running schema_bootstrap.py"""
+        cls._dimension_columns = {}
+
+    @classmethod
+    def reset_partition_detection(cls):
+        """Forget whether the partitioned copies exist, e.g. after running schema_bootstrap.py"""
+        cls._partitioned_reads = {}
+        cls._dimension_columns = {}
+
+    @staticmethod
+    def render_dimensions(sql, use_columns):
+        """Replace {dim:...} markers with generated columns or JSONB expressions"""
+        def replace(match):
+            alias = f"{match.group(1)}." if match.group(1) else ''
+            dimension = match.group(2)
+            if dimension not in DIMENSION_EXPRESSIONS:
+                raise KeyError(f"Unknown dimension '{dimension}'")
+            if use_columns:
+                return f"{alias}{dimension}"
+            return f"({DIMENSION_EXPRESSIONS[dimension].format(alias=alias)})"
+        return _DIMENSION_MARKER.sub(replace, sql)
+
+    @staticmethod
+    def render_tables(sql, schema):
+        """Replace {table:...} markers with the table in the given schema"""
+        def replace(match):
+            table = match.group(1)
+            if table not in PARTITIONED_TABLES:
+                raise KeyError(f"Unknown partitioned table '{table}'")
+            return table if schema == 'public' else f"{schema}.{table}"
+        return _TABLE_MARKER.sub(replace, sql)
+
+    @staticmethod
+    def render_date_ranges(sql):
+        """Replace {date_range:...} markers with bounds on the bare column"""
+        return _DATE_RANGE_MARKER.sub(
+            lambda match: f"{match.group(1)} >= %(start_date)s AND {match.group(1)} <= %(end_date)s", sql)
+
+    @classmethod
+    def render(cls, cur, name):
+        """SQL of a registered query ready to run on the given cursor"""
+        query = cls.get(name)
+        sql = cls.render_date_ranges(query.sql)
+        if _TABLE_MARKER.search(sql):
+            sql = cls.render_tables(sql, cls.table_schema(cur, query.database))
+        if _DIMENSION_MARKER.search(sql):
+            sql = cls.render_dimensions(sql, cls.has_dimension_columns(cur, query.database))
+        return sql
+
+    @classmethod
+    def execute(cls, cur, name, params=None):
+        """
+        Execute a registered query on the given cursor, under QueryGuard's
+        timeout and concurrency limit for its class
+
+        Parameters:
+        - cur: Cursor connected to the query's database
+        - name: Registered query name
+        - params: Dictionary of named parameters (None for queries without parameters)
+
+        Raises QueryBusy or QueryTimeout (query_guard.py) when the query is turned away or cancelled.
+        """
+        query = cls.get(name)
+        return QueryGuard.execute(cur, cls.render(cur, name), params if params else None,
+                                  query.database, query.query_class)
+
+    @classmethod
+    def estimate_rows(cls, cur, name, params=None):
+        """Planner row estimate of a registered query, without running it"""
+        cur.execute("EXPLAIN (FORMAT JSON) " + cls.render(cur, name), params if params else None)
+        row = cur.fetchone()
+        plan = row['QUERY PLAN'] if isinstance(row, dict) else row[0]
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    @classmethod
+    def fetch_estimate(cls, db, name, params=None):
+        """Planner row estimate of a registered query through a DatabaseManager (0 if unreachable)"""
+        if QueryClient.enabled():
+            cls.get_remote(name)
+            return QueryClient.fetch(name, params, mode='estimate') or 0
+        cur = db.get_cursor(cls.get(name).database)
+        if not cur:
+            return 0
+        return cls.estimate_rows(cur, name, params)
+
+    @classmethod
+    def fetch_all(cls, db, name, params=None):
+        """
+        Run a registered query through a DatabaseManager and return all rows
+
+        When the database is too busy or the query times out, the last rows
+        returned for the same parameters are served instead (see QueryGuard.fetch).
+        In client mode the rows come from the API and `db` is not used.
+
+        Returns:
+        - List of rows, or None if the database is unreachable
+        """
+        if QueryClient.enabled():
+            cls.get_remote(name)  # Fail here rather than with the API's 404
+            return QueryClient.fetch(name, params)
+        def load():
+            cur = db.get_cursor(cls.get(name).database)
+            if not cur:
+                return None
+            return cls.execute(cur, name, params).fetchall()
+        return QueryGuard.fetch(QueryGuard.key(name, params), load)[0]
+
+    @classmethod
+    def fetch_one(cls, db, name, params=None):
+        """Run a registered query through a DatabaseManager and return the first row (degrades like fetch_all)"""
+        if QueryClient.enabled():
+            cls.get_remote(name)
+            return QueryClient.fetch(name, params, mode='one')
+        def load():
+            cur = db.get_cursor(cls.get(name).database)
+            if not cur:
+                return None
+            return cls.execute(cur, name, params).fetchone()
+        return QueryGuard.fetch(QueryGuard.key(name, params, 'one'), load)[0]
+
+_DATE_PARAMS = QueryRegistry.sample_date_params()
+
+# Shared
+
+QueryRegistry.register(
+    "common.earliest_date", "All pages / Date filter", "ingestion",
+    """
+        SELECT MIN(created_at)::date
+        FROM allocation_files
+        WHERE created_at IS NOT NULL
+    """,
+    query_class='light',
+    remote=True
+)
+
+# Control Tower overview
+
+QueryRegistry.register(
+    "control_tower.summary", "Control Tower / Summary", "ingestion",
+    """
+        WITH summary AS (
+            SELECT
+                COUNT(DISTINCT agency_id) as total_agencies,
+                COUNT(DISTINCT allocator_id) as total_allocators,
+                COUNT(DISTINCT allocation_id) as total_allocations,
+                COUNT(DISTINCT CONCAT(allocator_id, '-', {dim:product_name}, '-', {dim:bucket_name})) as unique_lobs,
+                SUM(total_records) as total_records,
+                SUM(total_outstanding) as total_outstanding,
+                (
+                    SELECT COALESCE(SUM(collection_amount), 0)
+                    FROM {table:allocation_payments}
+                    WHERE {date_range:created_at}
+                ) as total_collections
+            FROM {table:allocation_files}
+            WHERE {date_range:created_at}
+        )
+        SELECT
+            total_agencies,
+            total_allocators,
+            total_allocations,
+            unique_lobs,
+            total_records,
+            total_outstanding,
+            total_collections,
+            CASE
+                WHEN total_outstanding > 0
+                THEN ROUND((total_collections::float / NULLIF(total_outstanding, 0) * 100)::numeric, 2)
+                ELSE 0
+            END as collection_percentage
+        FROM summary
+    """,
+    _DATE_PARAMS,
+    query_class='heavy'
+)
+
+QueryRegistry.register(
+    "control_tower.channel_records", "Control Tower / Channel Distribution", "ucf",
+    """
+        SELECT
+            COUNT(DISTINCT CASE WHEN UPPER(channel) = 'FIELD' THEN id END) as records_field,
+            COUNT(DISTINCT CASE WHEN UPPER(channel) = 'CALL' THEN id END) as records_call,
+            COUNT(DISTINCT CASE WHEN UPPER(channel) = 'DIGITAL' THEN id END) as records_digital
+        FROM borrower_details
+    """
+)
+
+QueryRegistry.register(
+    "control_tower.total_calls", "Control Tower / Channel Distribution", "ucf",
+    """
+        SELECT COUNT(*) as total_calls
+        FROM order_dispositions
+    """
+)
+
+QueryRegistry.register(
+    "control_tower.field_visits", "Control Tower / Channel Distribution", "ucf",
+    """
+        SELECT COUNT(*) as total_visits
+        FROM order_dispositions
+        WHERE UPPER(source) = 'FIELD'
+    """
+)
+
+QueryRegistry.register(
+    "control_tower.user_metrics", "Control Tower / User Distribution", "entity",
+    """
+        WITH user_metrics AS (
+            SELECT
+                COUNT(DISTINCT id) as total_users,
+                COUNT(DISTINCT CASE WHEN role = 'SUPERVISOR' THEN id END) as total_supervisors,
+                COUNT(DISTINCT CASE WHEN role = 'AGENT' THEN id END) as total_call_agents,
+                COUNT(DISTINCT CASE WHEN role = 'FIELD EXECUTIVE' THEN id END) as total_field_agents,
+                COUNT(DISTINCT CASE WHEN status = 'ACTIVE' OR online_status = 'ONLINE' THEN id END) as active_users,
+                SUM(CASE
+                    WHEN online_status = 'ONLINE'
+                    AND shift_start_time IS NOT NULL
+                    AND shift_end_time IS NOT NULL
+                    THEN
+                        EXTRACT(EPOCH FROM (
+                            CAST(shift_end_time AS TIME) - CAST(shift_start_time AS TIME)
+                        ))/3600
+                    ELSE 8 -- Assuming 8 hours per day for users without shift times
+                END) as total_hours
+            FROM yucollect_agent
+        )
+        SELECT * FROM user_metrics
+    """
+)
+
+QueryRegistry.register(
+    "control_tower.agency_onboarding", "Control Tower / Agency Onboarding", "entity",
+    """
+        WITH agency_status AS (
+            SELECT
+                COUNT(*) as total_agencies,
+                COUNT(CASE WHEN status = 'accepted' THEN 1 END) as fully_onboarded,
+                COUNT(CASE WHEN status = 'pending' THEN 1 END) as document_pending,
+                COUNT(CASE WHEN status = 'agency_pending' THEN 1 END) as agreement_pending
+            FROM agency_allocators_association
+        )
+        SELECT * FROM agency_status
+    """
+)
+
+# Agency Details
+
+QueryRegistry.register(
+    "agency_details.locations", "Agency Details / Agency List", "entity",
+    """
+        SELECT
+            agency_id,
+            agency_name,
+            COALESCE(city, 'Unknown') as city,
+            COALESCE(state, 'Unknown') as state
+        FROM agencies
+        WHERE agency_id IS NOT NULL
+    """,
+    remote=True
+)
+
+QueryRegistry.register(
+    "agency_details.agency_list", "Agency Details / Agency List", "ingestion",
+    """
+        WITH agency_metrics AS (
+            SELECT
+                af.agency_id,
+                MAX(af.agency_name) as agency_name,
+                'Unknown' as agency_city,
+                'Unknown' as agency_state,
+                COUNT(DISTINCT af.allocation_id) as allocation_count,
+                COUNT(DISTINCT CONCAT(af.allocator_id, '-', {dim:af.product_name}, '-', {dim:af.bucket_name})) as lob_count,
+                SUM(af.total_records) as total_records,
+                SUM(af.total_outstanding) as total_outstanding,
+                SUM(COALESCE(ap.collection_amount, 0)) as total_collections,
+                BOOL_OR({dim:af.channel_digital}) as digital_channel,
+                BOOL_OR({dim:af.channel_call}) as call_channel,
+                BOOL_OR({dim:af.channel_field}) as field_channel
+            FROM {table:allocation_files} af
+            LEFT JOIN {table:allocation_payments} ap ON af.allocation_id = ap.allocation_id
+            WHERE af.agency_id IS NOT NULL
+            AND af.agency_name IS NOT NULL
+            AND {date_range:af.created_at}
+            GROUP BY af.agency_id
+        )
+        SELECT
+            agency_id as "Agency ID",
+            agency_name as "Agency Name",
+            agency_city as "City",
+            agency_state as "State",
+            allocation_count as "Allocation Count",
+            lob_count as "Unique LOBs",
+            total_records as "Total Records",
+            ROUND(total_outstanding::numeric/10000000, 2) as "Total Outstanding (Cr)",
+            digital_channel as "Digital Channel",
+            call_channel as "Call Channel",
+            field_channel as "Field Channel",
+            ROUND(total_collections::numeric/10000000, 2) as "Collection (Cr)",
+            CASE
+                WHEN total_outstanding > 0
+                THEN ROUND((total_collections::float / total_outstanding * 100)::numeric, 2)
+                ELSE 0
+            END as "Collection Rate (%%)"
+        FROM agency_metrics
+        ORDER BY total_outstanding DESC
+    """,
+    _DATE_PARAMS,
+    query_class='heavy',
+    remote=True
+)
+
+# Allocator Details
+
+QueryRegistry.register(
+    "allocator_details.allocator_list", "Allocator Details / Allocator List", "ingestion",
+    """
+        WITH allocator_metrics AS (
+            SELECT
+                af.allocator_id,
+                MAX(af.allocator_name) as allocator_name,
+                COUNT(DISTINCT af.allocation_id) as allocation_count,
+                COUNT(DISTINCT CONCAT({dim:af.product_name}, '-', {dim:af.bucket_name})) as lob_count,
+                SUM(af.total_records) as total_records,
+                SUM(af.total_outstanding) as total_outstanding,
+                SUM(COALESCE(ap.collection_amount, 0)) as total_collections
+            FROM {table:allocation_files} af
+            LEFT JOIN {table:allocation_payments} ap ON af.allocation_id = ap.allocation_id
+            WHERE af.allocator_id IS NOT NULL
+            AND {date_range:af.created_at}
+            GROUP BY af.allocator_id
+        )
+        SELECT
+            allocator_id as "Allocator ID",
+            allocator_name as "Allocator Name",
+            allocation_count as "Allocation Count",
+            lob_count as "Unique LOBs",
+            total_records as "Total Records",
+            total_outstanding as "Total Outstanding",
+            total_collections as "Collection",
+            CASE
+                WHEN total_outstanding > 0
+                THEN ROUND((total_collections::float / total_outstanding * 100)::numeric, 2)
+                ELSE 0
+            END as "Collection %%"
+        FROM allocator_metrics
+        ORDER BY total_outstanding DESC
+    """,
+    _DATE_PARAMS,
+    query_class='heavy',
+    remote=True
+)
+
+# Allocation Details
+
+QueryRegistry.register(
+    "allocation_details.allocators", "Allocation Details / Allocator Filter", "ingestion",
+    """
+        SELECT DISTINCT af.allocator_name as allocator
+        FROM {table:allocation_files} af
+        WHERE {date_range:af.created_at}
+            AND af.allocator_name IS NOT NULL
+        ORDER BY 1
+    """,
+    _DATE_PARAMS,
+    query_class='light',
+    remote=True
+)
+
+# The paged allocation list queries are registered by allocation_pager.py
+
+QueryRegistry.register(
+    "allocation_details.channel_lookup", "Allocation Details / Allocation List", "ucf",
+    """
+        SELECT
+            allocation_record_id,
+            MAX(channel) as channel
+        FROM borrower_details
+        WHERE allocation_record_id = ANY(%(allocation_ids)s)
+        GROUP BY allocation_record_id
+    """,
+    {'allocation_ids': ['00000000-0000-0000-0000-000000000000']},
+    query_class='light',
+    remote=True
+)
+
+QueryRegistry.register(
+    "allocation_details.channel_clock", "Allocation Details / Allocation List", "ucf",
+    """
+        SELECT now() AS now
+    """,
+    query_class='light',
+    remote=True
+)
+
+QueryRegistry.register(
+    "allocation_details.channel_changes", "Allocation Details / Allocation List", "ucf",
+    """
+        SELECT DISTINCT allocation_record_id
+        FROM borrower_details
+        WHERE allocation_record_id = ANY(%(allocation_ids)s)
+        AND updated_at > %(since)s
+    """,
+    {'allocation_ids': ['00000000-0000-0000-0000-000000000000'], 'since': _DATE_PARAMS['end_date']},
+    query_class='light',
+    remote=True
+)
+
+# LOB Details
+
+QueryRegistry.register(
+    "lob_details.lob_list", "LOB Details / LOB List", "ingestion",
+    """
+        SELECT
+            CONCAT(af.allocator_name, ' - ',
+                   COALESCE({dim:af.product_label}, 'Unknown'), ' - ',
+                   COALESCE({dim:af.bucket_label}, 'Unknown')) as "LOB Name",
+            SUM(af.total_records) as "Accounts",
+            SUM(af.total_outstanding) as "Total Outstanding",
+            COALESCE(SUM(ap.collection_amount), 0) as "Collection",
+            CASE
+                WHEN SUM(af.total_outstanding) > 0
+                THEN ROUND((COALESCE(SUM(ap.collection_amount), 0)::float / SUM(af.total_outstanding) * 100)::numeric, 2)
+                ELSE 0
+            END as "Collection Rate (%%)"
+        FROM {table:allocation_files} af
+        LEFT JOIN {table:allocation_payments} ap ON af.allocation_id = ap.allocation_id
+        WHERE {date_range:af.created_at}
+        GROUP BY
+            af.allocator_name,
+            {dim:af.product_label},
+            {dim:af.bucket_label}
+        ORDER BY SUM(af.total_outstanding) DESC
+        LIMIT %(limit)s  -- The page caps this at 1000; exports pass None for every row
+    """,
+    {**_DATE_PARAMS, 'limit': 1000},
+    query_class='heavy',
+    remote=True
+)
+
+# User Details
+
+QueryRegistry.register(
+    "user_details.user_list", "User Details / User List", "entity",
+    """
+        SELECT
+            ya.id as "User ID",
+            ya.name as "User Name",
+            ya.role as "Role",
+            CASE
+                WHEN ya.role = 'FIELD EXECUTIVE' THEN 'Field'
+                WHEN ya.role = 'AGENT' THEN 'Call'
+                ELSE 'N/A'
+            END as "Channel",
+            COALESCE(a.name, 'Not Assigned') as "Agency",
+            ya.created_at as "Added On",
+            ya.updated_at as "Last Active On",
+            CASE
+                WHEN ya.shift_start_time IS NOT NULL AND ya.shift_end_time IS NOT NULL
+                THEN
+                    EXTRACT(HOUR FROM (
+                        CAST(ya.shift_end_time AS TIME) - CAST(ya.shift_start_time AS TIME)
+                    ))
+                ELSE NULL
+            END as "Total Time Spent (Hours)"
+        FROM yucollect_agent ya
+        LEFT JOIN agency a ON ya.agency_id = a.agency_id
+        WHERE ya.updated_at BETWEEN %(start_date)s AND %(end_date)s
+        ORDER BY ya.updated_at DESC NULLS LAST
+        LIMIT %(limit)s  -- The page caps this at 1000; exports pass None for every row
+    """,
+    {**_DATE_PARAMS, 'limit': 1000},
+    remote=True
+)
+
+# Agency Onboarding
+
+QueryRegistry.register(
+    "agency_onboarding.agency_list", "Agency Onboarding / Agency Onboarding List", "entity",
+    """
+        SELECT
+            yucollect_agency_id as "Agency ID",
+            'Agency ' || SUBSTRING(yucollect_agency_id::text, 1, 8) as "Agency Name",
+            INITCAP(status) as "Status",
+            CURRENT_DATE - INTERVAL '30 days' as "Onboarding Started Date",
+            CASE
+                WHEN status = 'accepted' THEN CURRENT_DATE
+                ELSE NULL
+            END as "Onboarding Completed Date",
+            CASE
+                WHEN status = 'accepted' THEN
+                    30
+                ELSE
+                    30
+            END as "Days in Process"
+        FROM agency_allocators_association
+        WHERE yucollect_agency_id IS NOT NULL
+        ORDER BY status DESC
+    """,
+    remote=True
+)
+
+# Allocation analytics dashboard (dashboard.py)
+
+QueryRegistry.register(
+    "dashboard.status_counts", "Analytics / Allocation Status Distribution", "ingestion",
+    """
+        SELECT
+            COALESCE(status, 'unknown') as status,
+            COUNT(*) as count
+        FROM allocation_files
+        GROUP BY status
+        ORDER BY count DESC
+    """,
+    remote=True
+)
+
+QueryRegistry.register(
+    "dashboard.top_allocators", "Analytics / Top Allocators Performance", "ingestion",
+    """
+        SELECT
+            allocator_id,
+            COUNT(*) as total_allocations,
+            COUNT(CASE WHEN status = 'fully-allocated' THEN 1 END) as fully_allocated,
+            ROUND(COUNT(CASE WHEN status = 'fully-allocated' THEN 1 END)::numeric /
+                  COUNT(*)::numeric * 100, 2) as success_rate
+        FROM allocation_files
+        GROUP BY allocator_id
+        ORDER BY total_allocations DESC
+        LIMIT 5
+    """,
+    remote=True
+)
+
+QueryRegistry.register(
+    "dashboard.recent_allocations", "Analytics / Recent Allocations", "ingestion",
+    """
+        SELECT
+            allocation_id,
+            allocation_name,
+            status,
+            created_at,
+            allocator_id
+        FROM allocation_files
+        ORDER BY created_at DESC
+        LIMIT 10
+    """,
+    remote=True
+)
+
+QueryRegistry.register(
+    "dashboard.collection_overview", "Analytics / Collections Analytics", "ingestion",
+    """
+        WITH collection_stats AS (
+            SELECT
+                af.allocation_id,
+                af.agency_id,
+                af.agency_name,
+                {dim:af.product_name} as product_name,
+                af.total_outstanding,
+                COALESCE(SUM(ap.collection_amount), 0) as total_collected,
+                af.created_at
+            FROM allocation_files af
+            LEFT JOIN allocation_payments ap ON af.allocation_id = ap.allocation_id
+            GROUP BY af.allocation_id, af.agency_id, af.agency_name, {dim:af.product_name},
+                     af.total_outstanding, af.created_at
+        )
+        SELECT
+            COUNT(DISTINCT allocation_id) as total_allocations,
+            COUNT(DISTINCT CASE WHEN total_collected > 0 THEN allocation_id END) as allocations_with_collection,
+            CAST(SUM(total_outstanding) as numeric(20,2)) as total_outstanding,
+            CAST(SUM(total_collected) as numeric(20,2)) as total_collected,
+            CAST((SUM(total_collected) * 100.0 / NULLIF(SUM(total_outstanding), 0)) as numeric(10,2)) as collection_percentage
+        FROM collection_stats
+    """,
+    query_class='heavy',
+    remote=True
+)
+
+# Borrower Details dashboard (borrower_dashboard.py)
+
+QueryRegistry.register(
+    "borrower.list", "Borrower Details / Borrower List", "ucf",
+    """
+        SELECT 
+            id, name, phone_number, email, loan_sanctioned_date, 
+            loan_sanctioned_amount, total_dues, total_outstanding_amount,
+            due_date, channel, is_closed, customer_city, customer_state,
+            loan_type, credit_score, employment_status, monthly_income,
+            gender, date_of_birth, status, days_past_due, risk_tagging,
+            bucket_type, last_payment_date, last_payment_amount,
+            created_at, updated_at
+        FROM borrower_details
+        WHERE is_active = true
+        LIMIT %(limit)s
+    """,
+    {'limit': 100},
+    query_class='heavy',
+    remote=True
+)
+
+QueryRegistry.register(
+    "borrower.summary", "Borrower Details / Summary", "ucf",
+    """
+        SELECT 
+            COUNT(*) as total_borrowers,
+            COUNT(CASE WHEN is_closed = true THEN 1 END) as closed_accounts,
+            COUNT(CASE WHEN is_closed = false OR is_closed IS NULL THEN 1 END) as active_accounts,
+            SUM(loan_sanctioned_amount) as total_sanctioned,
+            SUM(total_outstanding_amount) as total_outstanding,
+            AVG(CASE WHEN credit_score IS NOT NULL THEN credit_score ELSE NULL END) as avg_credit_score,
+            COUNT(DISTINCT loan_type) as loan_types,
+            COUNT(DISTINCT customer_state) as states_covered
+        FROM borrower_details
+        WHERE is_active = true
+    """,
+    remote=True
+)
@@ -0,0 +1,143 @@
+import argparse
+from db_manager import DatabaseManager
+from partition_manager import PartitionManager
+from search_service import SearchService
+from query_registry import QueryRegistry, DIMENSION_EXPRESSIONS, DIMENSION_TYPES
+
+# Indexes on the generated dimension columns of allocation_files
+DIMENSION_INDEXES = {
+    'idx_allocation_files_product_name': "(product_name)",
+    'idx_allocation_files_bucket_name': "(bucket_name)",
+    'idx_allocation_files_lob': "(allocator_name, product_label, bucket_label)",
+}
+
+def run_statements(cur, statements, dry_run=False):
+    """Execute (or just print) a list of DDL statements"""
+    for statement in statements:
+        print(f"{'[dry-run] ' if dry_run else ''}{statement}")
+        if not dry_run:
+            cur.execute(statement)
+
+# Generated columns whose expression changed since they were first added
+LABEL_COLUMNS = ('product_label', 'bucket_label')
+
+def dimension_statements(rebuild_labels=False):
+    """
+    DDL that stores the JSONB dimensions of allocation_files as generated columns.
+
+    Adding a STORED generated column rewrites the table under an ACCESS EXCLUSIVE
+    lock, so run this in a maintenance window on large tables. Existing columns
+    keep their expression; rebuild_labels drops and re-adds the label columns
+    (and so their index) with the current one.
+    """
+    statements = []
+    if rebuild_labels:
+        statements.append("ALTER TABLE allocation_files "
+                          + ", ".join(f"DROP COLUMN IF EXISTS {column}" for column in LABEL_COLUMNS) + ";")
+    for column, expression in DIMENSION_EXPRESSIONS.items():
+        statements.append(
+            f"ALTER TABLE allocation_files ADD COLUMN IF NOT EXISTS {column} {DIMENSION_TYPES[column]} "
+            f"GENERATED ALWAYS AS ({expression.format(alias='')}) STORED;"
+        )
+    for index_name, columns in DIMENSION_INDEXES.items():
+        statements.append(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON allocation_files {columns};")
+    statements.append("ANALYZE allocation_files;")
+    return statements
+
+def bootstrap_dimensions(dry_run=False, rebuild_labels=False):
+    """Add the generated dimension columns and their indexes to the ingestion database"""
+    db = DatabaseManager()
+    try:
+        cur = db.get_ingestion_cursor()
+        if not cur:
+            print("Could not connect to the ingestion database")
+            return False
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        cur.connection.autocommit = True
+        run_statements(cur, dimension_statements(rebuild_labels), dry_run)
+        QueryRegistry.reset_dimension_detection()
+        return True
+    except Exception as e:
+        print(f"Error bootstrapping dimension columns: {str(e)}")
+        return False
+    finally:
+        db.close_connections()
+
+def trigram_statements():
+    """DDL for the pg_trgm GIN indexes behind the name search service"""
+    statements = ["CREATE EXTENSION IF NOT EXISTS pg_trgm;"]
+    for column in SearchService.TRIGRAM_COLUMNS:
+        statements.append(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_allocation_files_{column}_trgm "
+            f"ON allocation_files USING gin ({column} gin_trgm_ops);"
+        )
+    statements.append("ANALYZE allocation_files;")
+    return statements
+
+def bootstrap_trigram(dry_run=False):
+    """Install pg_trgm and the trigram indexes in the ingestion database"""
+    db = DatabaseManager()
+    try:
+        cur = db.get_ingestion_cursor()
+        if not cur:
+            print("Could not connect to the ingestion database")
+            return False
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        cur.connection.autocommit = True
+        run_statements(cur, trigram_statements(), dry_run)
+        SearchService.reset_detection()
+        return True
+    except Exception as e:
+        print(f"Error bootstrapping trigram indexes: {str(e)}")
+        return False
+    finally:
+        db.close_connections()
+
+def bootstrap_partitions(dry_run=False, full=False, window_days=None, refresh_months=None):
+    """
+    Create or refresh the monthly partitioned analytics copies of allocation_files
+    and allocation_payments. Run once with --full, then incrementally from cron
+    (e.g. hourly); set ANALYTICS_PARTITIONS=true for the dashboard to read them.
+    Each incremental run also re-copies the older months refreshed longest ago,
+    so changes to older rows reach the copies with a delay, not immediately.
+    """
+    db = DatabaseManager()
+    try:
+        cur = db.get_ingestion_cursor()
+        if not cur:
+            print("Could not connect to the ingestion database")
+            return False
+        touched = PartitionManager(cur, dry_run).sync(full, window_days, refresh_months)
+        print(f"Synced {len(touched)} partitions")
+        QueryRegistry.reset_partition_detection()
+        return True
+    except Exception as e:
+        print(f"Error syncing partitioned tables: {str(e)}")
+        return False
+    finally:
+        db.close_connections()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bootstrap schema objects used by the dashboard")
+    parser.add_argument('--dry-run', action='store_true', help="Print the DDL without executing it")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    dimensions_parser = subparsers.add_parser('dimensions', help="Generated columns for product, bucket and channel dimensions")
+    dimensions_parser.add_argument('--rebuild-labels', action='store_true',
+                                   help="Drop and re-add product_label and bucket_label with the current expression")
+    subparsers.add_parser('trigram', help="pg_trgm indexes for fuzzy name search")
+    partitions_parser = subparsers.add_parser('partitions', help="Monthly partitioned analytics copies of the allocation tables")
+    partitions_parser.add_argument('--full', action='store_true', help="Reload the whole history instead of the recent window")
+    partitions_parser.add_argument('--window-days', type=int, default=None,
+                                   help=f"Days re-copied on an incremental sync (default {PartitionManager.SYNC_WINDOW_DAYS})")
+    partitions_parser.add_argument('--refresh-months', type=int, default=None,
+                                   help="Older months also re-copied on an incremental sync, least recently refreshed first "
+                                        f"(default {PartitionManager.REFRESH_MONTHS}); updates and deletes of rows older "
+                                        "than the window only reach the copies through these refreshes or --full")
+    args = parser.parse_args()
+
+    if args.command == 'dimensions':
+        bootstrap_dimensions(args.dry_run, args.rebuild_labels)
+    elif args.command == 'trigram':
+        bootstrap_trigram(args.dry_run)
+    elif args.command == 'partitions':
+        bootstrap_partitions(args.dry_run, args.full, args.window_days, args.refresh_months)
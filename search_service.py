@@ -0,0 +1,149 @@
+import pandas as pd
+from query_registry import QueryRegistry
+from query_client import QueryClient
+
+class SearchService:
+    """
+    Ranked fuzzy name search over the whole allocation history.
+
+    Backed by pg_trgm GIN indexes on allocation_files (created with
+    `python schema_bootstrap.py trigram`), so substring (ILIKE) and
+    misspelled (word similarity) matches are one indexed query instead of a
+    scan of whatever the page already loaded. Without the extension the
+    service falls back to plain ILIKE matching.
+    """
+
+    DEFAULT_LIMIT = 20
+    MIN_TERM_LENGTH = 2
+
+    # Search kind -> (name column, extra columns, GROUP BY key or None for one row per allocation)
+    KINDS = {
+        'agency': ('agency_name', ['agency_id'], 'agency_id'),
+        'allocator': ('allocator_name', ['allocator_id'], 'allocator_id'),
+        'allocation': ('allocation_name', ['allocation_id', 'allocator_name', 'agency_name'], None),
+    }
+
+    # Result column labels, matching the page tables
+    LABELS = {
+        'agency_id': "Agency ID",
+        'agency_name': "Agency Name",
+        'allocator_id': "Allocator ID",
+        'allocator_name': "Allocator Name",
+        'allocation_id': "Allocation ID",
+        'allocation_name': "Allocation Name",
+    }
+
+    # Columns that get a trigram GIN index
+    TRIGRAM_COLUMNS = ['allocation_name', 'agency_name', 'allocator_name']
+
+    _has_trigram = {}  # database -> whether pg_trgm is installed
+
+    @classmethod
+    def query_name(cls, kind, trigram=True):
+        return f"search.{kind}" if trigram else f"search.{kind}.ilike"
+
+    @classmethod
+    def search_sql(cls, kind, trigram=True):
+        """SQL returning the best matches for %(term)s, ranked by match score"""
+        name_column, extra_columns, group_key = cls.KINDS[kind]
+        if trigram:
+            # <% is the word-similarity operator; both it and ILIKE use the GIN index
+            match = f"(af.{name_column} ILIKE %(pattern)s OR %(term)s <%% af.{name_column})"
+            score = f"word_similarity(%(term)s, af.{name_column})"
+        else:
+            match = f"af.{name_column} ILIKE %(pattern)s"
+            score = f"1.0 / (1 + length(af.{name_column}) - length(%(term)s))"
+
+        columns = [f'af.{column} as "{cls.LABELS[column]}"' for column in [name_column] + extra_columns]
+        if group_key:
+            columns = ',\n                    '.join(columns)
+            return f"""
+                SELECT
+                    {columns},
+                    COUNT(*) as "Allocations",
+                    MAX(af.created_at) as "Last Allocation",
+                    ROUND({score}::numeric, 2) as "Match"
+                FROM allocation_files af
+                WHERE {match}
+                GROUP BY af.{group_key}, af.{name_column}
+                ORDER BY "Match" DESC, "Allocations" DESC
+                LIMIT %(limit)s
+            """
+        columns = ',\n                '.join(columns)
+        return f"""
+            SELECT
+                {columns},
+                af.created_at as "Created At",
+                ROUND({score}::numeric, 2) as "Match"
+            FROM allocation_files af
+            WHERE {match}
+            ORDER BY "Match" DESC, af.created_at DESC
+            LIMIT %(limit)s
+        """
+
+    @classmethod
+    def has_trigram(cls, cur, database='ingestion'):
+        """Check (once per database) whether the pg_trgm extension is installed"""
+        if database not in cls._has_trigram:
+            cur.execute("SELECT COUNT(*) as found FROM pg_extension WHERE extname = 'pg_trgm'")
+            row = cur.fetchone()
+            cls._has_trigram[database] = (row['found'] if isinstance(row, dict) else row[0]) > 0
+        return cls._has_trigram[database]
+
+    @classmethod
+    def reset_detection(cls):
+        """Forget whether pg_trgm is installed, e.g. after running schema_bootstrap.py"""
+        cls._has_trigram = {}
+
+    @classmethod
+    def search(cls, db, kind, term, limit=None):
+        """
+        Search names of one kind across the entire history
+
+        Parameters:
+        - db: DatabaseManager
+        - kind: 'agency', 'allocator' or 'allocation'
+        - term: Text to search for
+        - limit: Maximum number of results (default DEFAULT_LIMIT)
+
+        Returns:
+        - DataFrame of matches, best first, with a `Match` score column (empty if nothing matched)
+        """
+        if QueryClient.enabled():
+            return pd.DataFrame(QueryClient.search(kind, term, limit) or [])
+        return pd.DataFrame(cls.search_rows(db, kind, term, limit) or [])
+
+    @classmethod
+    def search_rows(cls, db, kind, term, limit=None):
+        """Rows of search() on the database (None if it is unreachable)"""
+        if kind not in cls.KINDS:
+            raise ValueError(f"Unknown search kind '{kind}'")
+        term = (term or '').strip()
+        if len(term) < cls.MIN_TERM_LENGTH:
+            return []
+
+        cur = db.get_ingestion_cursor()
+        if not cur:
+            return None
+        try:
+            params = {
+                'term': term,
+                'pattern': QueryRegistry.contains_pattern(term),
+                'limit': limit or cls.DEFAULT_LIMIT
+            }
+            QueryRegistry.execute(cur, cls.query_name(kind, cls.has_trigram(cur)), params)
+            return cur.fetchall()
+        finally:
+            cur.close()
+
+    @classmethod
+    def register(cls):
+        """Register the trigram and ILIKE search queries of every kind"""
+        sample_params = {'term': 'agency', 'pattern': '%agency%', 'limit': cls.DEFAULT_LIMIT}
+        for kind in cls.KINDS:
+            for trigram in (True, False):
+                QueryRegistry.register(
+                    cls.query_name(kind, trigram), "Search / Name Search", "ingestion",
+                    cls.search_sql(kind, trigram), sample_params)
+
+SearchService.register()
@@ -1,6 +1,8 @@
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import os
+import re
+import argparse
 from dotenv import load_dotenv
 from tabulate import tabulate
 
@@ -167,5 +169,346 @@ def print_schema():
     except Exception as e:
         print(f"Error: {str(e)}")
 
+# Indexes the dashboard workload is expected to need. Keys are written the way
+# they appear in CREATE INDEX so they can be matched against pg_get_indexdef.
+INDEX_CANDIDATES = [
+    {
+        'database': 'ingestion',
+        'table': 'allocation_files',
+        'keys': ['created_at'],
+        'reason': 'Date range filter on every page'
+    },
+    {
+        'database': 'ingestion',
+        'table': 'allocation_payments',
+        'keys': ['allocation_id', 'created_at'],
+        'reason': 'Join from allocation_files and collection date filter'
+    },
+    {
+        'database': 'ingestion',
+        'table': 'allocation_files',
+        'keys': ["(product->>'name')"],
+        'reason': 'LOB grouping and product filters'
+    },
+    {
+        'database': 'ingestion',
+        'table': 'allocation_files',
+        'keys': ["(bucket->>'name')"],
+        'reason': 'LOB grouping and bucket filters'
+    },
+    {
+        'database': 'ingestion',
+        'table': 'allocation_files',
+        'keys': ['(COALESCE(total_outstanding, 0))', 'allocation_id'],
+        'reason': 'Keyset pages of Allocation Details sorted by outstanding'
+    },
+    {
+        'database': 'ucf',
+        'table': 'borrower_details',
+        'keys': ['allocation_record_id'],
+        'reason': 'Channel lookup per allocation'
+    },
+]
+
+JOIN_CONDITION_KEYS = ('Hash Cond', 'Merge Cond', 'Join Filter', 'Index Cond')
+
+def normalize_index_key(expression):
+    """Normalize an index key so `(product ->> 'name'::text)` matches `(product->>'name')`"""
+    return re.sub(r"::\w+|[\s()'\"]", "", expression.lower())
+
+def candidate_index_sql(candidate, schema='public', partitioned=False):
+    """CREATE INDEX statement for an index candidate on the table in the given schema"""
+    name_parts = [re.sub(r'\W+', '_', key).strip('_') for key in candidate['keys']]
+    index_name = f"idx_{candidate['table']}_{'_'.join(name_parts)}"
+    # CONCURRENTLY is not supported on a partitioned parent; its index is built on every partition
+    concurrently = '' if partitioned else 'CONCURRENTLY '
+    return (f"CREATE INDEX {concurrently}IF NOT EXISTS {index_name} "
+            f"ON {schema}.{candidate['table']} ({', '.join(candidate['keys'])});")
+
+def get_partition_parents(cur, schema):
+    """Map every partition in a schema to the name of its partitioned parent"""
+    cur.execute("""
+        SELECT c.relname as partition_name, p.relname as parent_name
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relkind = 'p'
+            AND p.relnamespace = (SELECT oid FROM pg_namespace WHERE nspname = %s);
+    """, (schema,))
+    return {row['partition_name']: row['parent_name'] for row in cur.fetchall()}
+
+def get_index_keys(cur, table_name, schema='public'):
+    """Get the normalized key list of every index on a table"""
+    cur.execute("""
+        SELECT
+            i.relname as index_name,
+            pg_get_indexdef(ix.indexrelid) as index_def
+        FROM pg_class t
+        JOIN pg_index ix ON t.oid = ix.indrelid
+        JOIN pg_class i ON ix.indexrelid = i.oid
+        WHERE t.relname = %s
+            AND t.relnamespace = (SELECT oid FROM pg_namespace WHERE nspname = %s);
+    """, (table_name, schema))
+
+    index_keys = {}
+    for row in cur.fetchall():
+        match = re.search(r'USING \w+ \((.*?)\)(?: INCLUDE .*?)?(?: WHERE .*)?$', row['index_def'])
+        if not match:
+            continue
+        # Split on top-level commas only, expression keys may contain commas
+        keys, depth, current = [], 0, ''
+        for char in match.group(1):
+            if char == ',' and depth == 0:
+                keys.append(current)
+                current = ''
+                continue
+            depth += char == '('
+            depth -= char == ')'
+            current += char
+        keys.append(current)
+        index_keys[row['index_name']] = [normalize_index_key(key) for key in keys]
+    return index_keys
+
+def find_covering_index(index_keys, candidate):
+    """Name of an existing index whose leading keys match the candidate, if any"""
+    wanted = [normalize_index_key(key) for key in candidate['keys']]
+    for index_name, keys in index_keys.items():
+        if keys[:len(wanted)] == wanted:
+            return index_name
+    return None
+
+def explain_query(cur, query):
+    """Get the JSON plan of a registered query using its sample parameters"""
+    from query_registry import QueryRegistry
+
+    cur.execute("EXPLAIN (FORMAT JSON) " + QueryRegistry.render(cur, query.name), query.sample_params or None)
+    row = cur.fetchone()
+    plan = row['QUERY PLAN'] if isinstance(row, dict) else row[0]
+    return plan[0]['Plan']
+
+def find_seq_scans(plan, ancestors=()):
+    """Collect every sequential scan in a plan together with the join condition that consumes it"""
+    scans = []
+    if plan.get('Node Type') == 'Seq Scan':
+        join_node = next((node for node in reversed(ancestors)
+                          if any(key in node for key in JOIN_CONDITION_KEYS)), None)
+        join_condition = ''
+        if join_node:
+            join_condition = ' '.join(str(join_node[key]) for key in JOIN_CONDITION_KEYS if key in join_node)
+        scans.append({
+            'table': plan.get('Relation Name'),
+            'cost': plan.get('Total Cost', 0),
+            'rows': plan.get('Plan Rows', 0),
+            'filter': plan.get('Filter', ''),
+            'join_condition': join_condition,
+            'join_rows': join_node.get('Plan Rows', 0) if join_node else 0
+        })
+    for child in plan.get('Plans', []):
+        scans.extend(find_seq_scans(child, ancestors + (plan,)))
+    return scans
+
+def get_table_stats(cur, table_names, schema='public'):
+    """
+    Read scan counters and size estimates from pg_stat_user_tables
+
+    Partitions are summed into their partitioned parent, so a table split into
+    monthly partitions reports one row like the live table does.
+    """
+    cur.execute("""
+        SELECT
+            COALESCE(p.relname, s.relname) as table_name,
+            SUM(s.seq_scan)::bigint as seq_scan,
+            SUM(s.seq_tup_read)::bigint as seq_tup_read,
+            SUM(COALESCE(s.idx_scan, 0))::bigint as idx_scan,
+            SUM(s.n_live_tup)::bigint as n_live_tup,
+            -- A partitioned parent's own estimate repeats its partitions' rows
+            COALESCE(SUM(GREATEST(c.reltuples, 0)) FILTER (WHERE c.relkind <> 'p'), 0) as reltuples,
+            bool_or(c.relkind = 'p' OR p.oid IS NOT NULL) as partitioned
+        FROM pg_stat_user_tables s
+        JOIN pg_class c ON c.oid = s.relid
+        LEFT JOIN pg_inherits i ON i.inhrelid = s.relid
+        LEFT JOIN pg_class p ON p.oid = i.inhparent AND p.relkind = 'p'
+        WHERE s.schemaname = %s
+            AND COALESCE(p.relname, s.relname) = ANY(%s)
+        GROUP BY COALESCE(p.relname, s.relname);
+    """, (schema, list(table_names)))
+    return {row['table_name']: row for row in cur.fetchall()}
+
+def get_statement_stats(cur, table_name, limit=3):
+    """Read the most expensive statements touching a table from pg_stat_statements, if installed"""
+    cur.execute("SELECT to_regclass('pg_stat_statements') IS NOT NULL as available;")
+    if not cur.fetchone()['available']:
+        return []
+
+    # Column names changed in PostgreSQL 13
+    cur.execute("""
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_name = 'pg_stat_statements' AND column_name IN ('mean_exec_time', 'mean_time');
+    """)
+    columns = {row['column_name'] for row in cur.fetchall()}
+    mean_column = 'mean_exec_time' if 'mean_exec_time' in columns else 'mean_time'
+
+    cur.execute(f"""
+        SELECT
+            calls,
+            ROUND({mean_column}::numeric, 2) as mean_ms,
+            ROUND(({mean_column} * calls)::numeric, 2) as total_ms,
+            LEFT(REGEXP_REPLACE(query, '\\s+', ' ', 'g'), 80) as query
+        FROM pg_stat_statements
+        WHERE query ILIKE %s
+        ORDER BY {mean_column} * calls DESC
+        LIMIT %s;
+    """, (f"%{table_name}%", limit))
+    return cur.fetchall()
+
+def estimate_benefit(candidate, scans, table_stats):
+    """
+    Estimate the planner cost an index would save across the replayed workload.
+
+    A sequential scan matches a candidate (on the same schema and table, partitions
+    counting as their parent) when the candidate's leading key appears in the
+    scan's filter or in the join condition consuming it. The saving is the scan cost times
+    the fraction of the table the query does not need.
+    """
+    leading_key = normalize_index_key(candidate['keys'][0])
+    table_rows = float(table_stats['reltuples']) if table_stats and table_stats['reltuples'] else 0
+    benefit = 0.0
+    matched = []
+    for scan in scans:
+        if (scan['schema'], scan['table']) != (candidate['schema'], candidate['table']):
+            continue
+        if leading_key in normalize_index_key(scan['filter']):
+            needed_rows = scan['rows']
+        elif leading_key in normalize_index_key(scan['join_condition']):
+            needed_rows = scan['join_rows']
+        else:
+            continue
+        selectivity = min(1.0, needed_rows / table_rows) if table_rows else 1.0
+        benefit += scan['cost'] * (1 - selectivity)
+        matched.append(scan['panel'])
+    return benefit, sorted(set(matched))
+
+def advise_indexes():
+    """Replay the registered dashboard queries with EXPLAIN and report missing indexes"""
+    from db_manager import DatabaseManager
+    from query_registry import QueryRegistry, ANALYTICS_SCHEMA
+    # Imported only so their queries are registered (and replayed) too
+    import time_series  # noqa: F401 - registers the dashboard time series
+    import top_n  # noqa: F401 - registers the dashboard top-N aggregations
+    import allocation_pager  # noqa: F401 - registers the paged allocation list
+    import search_service  # noqa: F401 - registers the name search queries
+
+    db = DatabaseManager()
+    try:
+        for database in ('ingestion', 'entity', 'ucf'):
+            queries = QueryRegistry.all(database)
+            if not queries:
+                continue
+            cur = db.get_cursor(database)
+            if not cur:
+                print(f"Skipping {database} database: could not connect")
+                continue
+
+            print(f"\n=== Index Advisor: {database} ===\n")
+
+            # Partitioned analytics copies are scanned partition by partition;
+            # their scans are reported (and matched) as scans of the parent
+            parents = get_partition_parents(cur, ANALYTICS_SCHEMA)
+
+            # Replay the workload
+            scans = []
+            for query in queries:
+                try:
+                    for scan in find_seq_scans(explain_query(cur, query)):
+                        if scan['table'] in parents:
+                            scan['schema'], scan['table'] = ANALYTICS_SCHEMA, parents[scan['table']]
+                        else:
+                            scan['schema'] = 'public'
+                        scan['panel'] = query.panel
+                        scan['query'] = query.name
+                        scans.append(scan)
+                except Exception as e:
+                    cur.connection.rollback()
+                    print(f"Could not explain {query.name}: {str(e).strip()}")
+
+            if scans:
+                print("🐢 Sequential scans per panel:")
+                print(tabulate(
+                    [[s['panel'], s['query'], f"{s['schema']}.{s['table']}", f"{s['rows']:,}", f"{s['cost']:,.0f}",
+                      s['filter'] or s['join_condition']] for s in sorted(scans, key=lambda s: (s['panel'], -s['cost']))],
+                    headers=['Panel', 'Query', 'Table', 'Est. Rows', 'Cost', 'Filter / Join'],
+                    tablefmt='grid'
+                ))
+            else:
+                print("No sequential scans in the replayed workload")
+
+            # Compare the candidates with what exists
+            candidates = [c for c in INDEX_CANDIDATES if c['database'] == database]
+            if not candidates:
+                continue
+            tables = {c['table'] for c in candidates}
+            # The live tables and their analytics copies, each with its own indexes
+            table_stats = {schema: get_table_stats(cur, tables, schema) for schema in ('public', ANALYTICS_SCHEMA)}
+
+            report = []
+            missing = []
+            for schema, schema_stats in table_stats.items():
+                for candidate in candidates:
+                    stats = schema_stats.get(candidate['table'])
+                    if not stats:
+                        continue
+                    existing = find_covering_index(get_index_keys(cur, candidate['table'], schema), candidate)
+                    benefit, panels = estimate_benefit(dict(candidate, schema=schema), scans, stats)
+                    report.append([
+                        f"{schema}.{candidate['table']} ({', '.join(candidate['keys'])})",
+                        existing or 'MISSING',
+                        f"{benefit:,.0f}",
+                        f"{stats['seq_scan']:,} / {stats['idx_scan']:,}",
+                        f"{stats['seq_tup_read']:,}",
+                        ', '.join(panels) or candidate['reason']
+                    ])
+                    if not existing:
+                        missing.append(candidate_index_sql(candidate, schema, stats['partitioned']))
+
+            print("\n📇 Index candidates:")
+            print(tabulate(
+                sorted(report, key=lambda r: float(r[2].replace(',', '')), reverse=True),
+                headers=['Index', 'Existing', 'Est. Benefit (cost)', 'Seq / Idx Scans', 'Seq Rows Read', 'Panels'],
+                tablefmt='grid'
+            ))
+
+            if missing:
+                print("\n💡 Suggested DDL:")
+                for statement in missing:
+                    print(f"    {statement}")
+
+            for table_name in sorted(set().union(*table_stats.values())):
+                try:
+                    statements = get_statement_stats(cur, table_name)
+                except Exception as e:
+                    cur.connection.rollback()
+                    print(f"Could not read pg_stat_statements: {str(e).strip()}")
+                    break
+                if statements:
+                    print(f"\n⏱️ Top statements on {table_name}:")
+                    print(tabulate(
+                        [[s['calls'], s['mean_ms'], s['total_ms'], s['query']] for s in statements],
+                        headers=['Calls', 'Mean (ms)', 'Total (ms)', 'Query'],
+                        tablefmt='grid'
+                    ))
+
+            cur.close()
+    finally:
+        db.close_connections()
+
 if __name__ == "__main__":
-    print_schema()
+    parser = argparse.ArgumentParser(description="Inspect the database schema")
+    parser.add_argument('--advise', action='store_true',
+                        help="Replay the registered dashboard queries and report missing indexes")
+    args = parser.parse_args()
+
+    if args.advise:
+        advise_indexes()
+    else:
+        print_schema()
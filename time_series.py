@@ -0,0 +1,161 @@
+from datetime import date, datetime, timedelta
+from query_registry import QueryRegistry
+
+class TimeSeriesQuery:
+    """
+    Builds dense, gap-filled time series over allocation_files entirely in SQL.
+
+    The result is long format - one row per (period, dimension values...) with a
+    `value` column - where every period in the range appears for every group,
+    with 0 where there was no data. Charts can plot it directly, e.g.
+    px.bar(df, x='period', y='value', color='status').
+
+    Metrics and dimensions are picked from whitelists so the SQL stays static for
+    a given shape and can be registered in the QueryRegistry.
+    """
+
+    METRICS = {
+        'allocations': "COUNT(*)",
+        'records': "COALESCE(SUM(af.total_records), 0)",
+        'outstanding': "COALESCE(SUM(af.total_outstanding), 0)",
+    }
+
+    DIMENSIONS = {
+        'status': "COALESCE(af.status, 'unknown')",
+        'agency_id': "af.agency_id",
+        'agency_name': "af.agency_name",
+        'allocator_id': "af.allocator_id",
+        'allocator_name': "af.allocator_name",
+        'product_name': "{dim:af.product_name}",
+        'bucket_name': "{dim:af.bucket_name}",
+    }
+
+    GRANULARITIES = {
+        'day': "1 day",
+        'week': "1 week",
+        'month': "1 month",
+    }
+
+    def __init__(self, metric='allocations', dimensions=None, granularity='day', top_n=None):
+        """
+        Parameters:
+        - metric: Key of METRICS to aggregate
+        - dimensions: List of DIMENSIONS keys to split the series by
+        - granularity: 'day', 'week' or 'month'
+        - top_n: Keep only the N groups with the largest total over the range
+        """
+        if metric not in self.METRICS:
+            raise ValueError(f"Unknown metric '{metric}'")
+        if granularity not in self.GRANULARITIES:
+            raise ValueError(f"Unknown granularity '{granularity}'")
+        dimensions = list(dimensions or [])
+        for dimension in dimensions:
+            if dimension not in self.DIMENSIONS:
+                raise ValueError(f"Unknown dimension '{dimension}'")
+        if top_n is not None and not dimensions:
+            raise ValueError("top_n requires at least one dimension")
+
+        self.metric = metric
+        self.dimensions = dimensions
+        self.granularity = granularity
+        self.top_n = top_n
+
+    @property
+    def sql(self):
+        """SQL taking %(start_date)s and %(end_date)s (inclusive dates)"""
+        unit = self.granularity
+        step = self.GRANULARITIES[unit]
+        dims = self.dimensions
+        dim_select = ''.join(f",\n                    {self.DIMENSIONS[d]} as {d}" for d in dims)
+        dim_group = ''.join(f", {i + 2}" for i in range(len(dims)))
+
+        if not dims:
+            return f"""
+                WITH periods AS (
+                    SELECT generate_series(
+                        date_trunc('{unit}', %(start_date)s::date),
+                        date_trunc('{unit}', %(end_date)s::date),
+                        '{step}'::interval
+                    )::date as period
+                ),
+                series AS (
+                    SELECT
+                        date_trunc('{unit}', af.created_at)::date as period,
+                        {self.METRICS[self.metric]} as value
+                    FROM {{table:allocation_files}} af
+                    WHERE af.created_at >= %(start_date)s::date
+                        AND af.created_at < %(end_date)s::date + 1
+                    GROUP BY 1
+                )
+                SELECT
+                    p.period,
+                    COALESCE(s.value, 0) as value
+                FROM periods p
+                LEFT JOIN series s ON s.period = p.period
+                ORDER BY p.period
+            """
+
+        dim_list = ', '.join(dims)
+        not_null = ''.join(f"\n                    AND {self.DIMENSIONS[d]} IS NOT NULL" for d in dims)
+        groups = f"SELECT DISTINCT {dim_list} FROM series"
+        if self.top_n:
+            groups = (f"SELECT {dim_list} FROM series GROUP BY {dim_list} "
+                      f"ORDER BY SUM(value) DESC LIMIT {int(self.top_n)}")
+        join_on = ''.join(f" AND s.{d} = g.{d}" for d in dims)
+
+        return f"""
+            WITH periods AS (
+                SELECT generate_series(
+                    date_trunc('{unit}', %(start_date)s::date),
+                    date_trunc('{unit}', %(end_date)s::date),
+                    '{step}'::interval
+                )::date as period
+            ),
+            series AS (
+                SELECT
+                    date_trunc('{unit}', af.created_at)::date as period{dim_select},
+                    {self.METRICS[self.metric]} as value
+                FROM {{table:allocation_files}} af
+                WHERE af.created_at >= %(start_date)s::date
+                    AND af.created_at < %(end_date)s::date + 1{not_null}
+                GROUP BY 1{dim_group}
+            ),
+            groups AS (
+                {groups}
+            )
+            SELECT
+                p.period,
+                {', '.join(f'g.{d}' for d in dims)},
+                COALESCE(s.value, 0) as value
+            FROM periods p
+            CROSS JOIN groups g
+            LEFT JOIN series s ON s.period = p.period{join_on}
+            ORDER BY p.period, {', '.join(f'g.{d}' for d in dims)}
+        """
+
+    @staticmethod
+    def date_params(start_date, end_date):
+        """Named parameters for a date range (dates, datetimes or 'YYYY-MM-DD' strings)"""
+        def to_str(value):
+            if isinstance(value, (date, datetime)):
+                return value.strftime('%Y-%m-%d')
+            return str(value)
+        return {'start_date': to_str(start_date), 'end_date': to_str(end_date)}
+
+    @staticmethod
+    def last_days(days):
+        """Named parameters for the last N days including today"""
+        today = datetime.now().date()
+        return TimeSeriesQuery.date_params(today - timedelta(days=days - 1), today)
+
+    def register(self, name, panel, database='ingestion', remote=False):
+        """Register this series in the QueryRegistry"""
+        return QueryRegistry.register(name, panel, database, self.sql, TimeSeriesQuery.last_days(30), remote=remote)
+
+# Series used by the allocation analytics dashboard (dashboard.py)
+TimeSeriesQuery().register(
+    "dashboard.daily_totals", "Analytics / Last 7 Days Allocation Breakdown", remote=True)
+TimeSeriesQuery(dimensions=['status']).register(
+    "dashboard.daily_status", "Analytics / Last 7 Days Allocation Breakdown", remote=True)
+TimeSeriesQuery(dimensions=['agency_id'], top_n=10).register(
+    "dashboard.agency_daily_trend", "Analytics / Agency-wise Daily Trends", remote=True)
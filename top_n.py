@@ -0,0 +1,131 @@
+from query_registry import QueryRegistry
+
+class TopNQuery:
+    """
+    Top-N-with-Others aggregation over a high-cardinality dimension in SQL.
+
+    Wraps a grouped source query: groups are ranked by one measure, the best
+    `%(top_n)s` are returned as they are and every other group is folded into
+    a single `%(others_label)s` row whose measures are the exact sums of the
+    tail. The sum over the returned rows is therefore the exact total, and the
+    result never has more than top_n + 1 groups however many exist.
+
+    Measures must be additive (counts, sums); ratios are recomputed from the
+    bucketed sums through `derived`.
+    """
+
+    DEFAULT_N = 10
+    OTHERS_LABEL = "Others"
+
+    def __init__(self, source_sql, keys, measures, order_by=None, split_by=None, derived=None):
+        """
+        Parameters:
+        - source_sql: SELECT producing one row per group (and split value) with the key and measure columns
+        - keys: Column or list of columns identifying a group (e.g. ['agency_id', 'agency_name'])
+        - measures: Additive measure columns, summed into the Others row
+        - order_by: Measure the groups are ranked by (default the first measure)
+        - split_by: Optional column kept inside each bucket (e.g. 'status' for stacked charts)
+        - derived: Dict of column -> SQL expression over the bucketed measures (e.g. a rate)
+        """
+        self.source_sql = source_sql
+        self.keys = [keys] if isinstance(keys, str) else list(keys)
+        self.measures = list(measures)
+        self.order_by = order_by or self.measures[0]
+        if self.order_by not in self.measures:
+            raise ValueError(f"order_by '{self.order_by}' is not a measure")
+        self.split_by = split_by
+        self.derived = dict(derived or {})
+
+    @property
+    def sql(self):
+        """SQL taking %(top_n)s and %(others_label)s; the Others row (rank top_n + 1) comes last"""
+        keys = ', '.join(self.keys)
+        join_on = ' AND '.join(f"r.{key} = s.{key}" for key in self.keys)
+        bucket_keys = ''.join(
+            f"\n                    CASE WHEN r.rank <= %(top_n)s THEN s.{key}::text ELSE %(others_label)s END as {key},"
+            for key in self.keys
+        )
+        group_by = ', '.join(str(i + 1) for i in range(len(self.keys)))
+        split_select = ''
+        order_split = ''
+        if self.split_by:
+            split_select = f"\n                    s.{self.split_by},"
+            group_by += f", s.{self.split_by}"
+            order_split = f", {self.split_by}"
+        sums = ',\n                    '.join(f"SUM(s.{measure}) as {measure}" for measure in self.measures)
+        derived = ''.join(f",\n                {expression} as {column}" for column, expression in self.derived.items())
+
+        return f"""
+            WITH source AS (
+                {self.source_sql}
+            ),
+            ranked AS (
+                SELECT
+                    {keys},
+                    ROW_NUMBER() OVER (ORDER BY SUM({self.order_by}) DESC, {keys}) as rank
+                FROM source
+                GROUP BY {keys}
+            ),
+            bucketed AS (
+                SELECT{bucket_keys}{split_select}
+                    {sums},
+                    COUNT(DISTINCT r.rank) as group_count,
+                    LEAST(MIN(r.rank), %(top_n)s + 1) as rank
+                FROM source s
+                JOIN ranked r ON {join_on}
+                GROUP BY {group_by}
+            )
+            SELECT *{derived}
+            FROM bucketed
+            ORDER BY rank{order_split}
+        """
+
+    @classmethod
+    def params(cls, top_n=None, others_label=None, **extra):
+        """Named parameters for the top-N size and the Others label (plus any source parameters)"""
+        params = {'top_n': top_n or cls.DEFAULT_N, 'others_label': others_label or cls.OTHERS_LABEL}
+        params.update(extra)
+        return params
+
+    def register(self, name, panel, database='ingestion', sample_params=None, query_class=None, remote=False):
+        """Register this aggregation in the QueryRegistry"""
+        return QueryRegistry.register(
+            name, panel, database, self.sql, self.params(**(sample_params or {})), query_class, remote)
+
+# Agency charts of the allocation analytics dashboard (dashboard.py)
+TopNQuery(
+    """
+                SELECT
+                    agency_id,
+                    COALESCE(status, 'unknown') as status,
+                    COUNT(*) as count
+                FROM allocation_files
+                WHERE created_at >= NOW() - INTERVAL '7 days'
+                    AND agency_id IS NOT NULL
+                GROUP BY agency_id, COALESCE(status, 'unknown')
+    """,
+    keys='agency_id', measures=['count'], split_by='status'
+).register("dashboard.agency_stats", "Analytics / Agency Analytics", remote=True)
+
+TopNQuery(
+    """
+                SELECT
+                    af.agency_id,
+                    af.agency_name,
+                    COUNT(DISTINCT af.allocation_id) as total_allocations,
+                    SUM(af.total_outstanding) as total_outstanding,
+                    COALESCE(SUM(ap.collection_amount), 0) as total_collected
+                FROM allocation_files af
+                LEFT JOIN allocation_payments ap ON af.allocation_id = ap.allocation_id
+                WHERE af.agency_id IS NOT NULL AND af.agency_id != '{agencyId}'
+                    AND af.agency_name IS NOT NULL
+                GROUP BY af.agency_id, af.agency_name
+                HAVING SUM(af.total_outstanding) > 0
+    """,
+    keys=['agency_id', 'agency_name'],
+    measures=['total_collected', 'total_outstanding', 'total_allocations'],
+    derived={
+        'collection_percentage':
+            "CAST((total_collected * 100.0 / NULLIF(total_outstanding, 0)) as numeric(10,2))",
+    }
+).register("dashboard.agency_collections", "Analytics / Collections Analytics", query_class='heavy', remote=True)
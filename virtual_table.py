@@ -0,0 +1,116 @@
+import hashlib
+import json
+import math
+import os
+import pandas as pd
+import streamlit as st
+import streamlit.components.v1 as components
+
+# Static frontend of the table: it asks for the chunks under the visible window
+# and gets them back as component arguments on the next (fragment) run
+_component = components.declare_component(
+    "virtual_table",
+    path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "virtual_table_component")
+)
+
+class VirtualTable:
+    """
+    Windowed table for the detail pages.
+
+    Instead of one `to_html` string with a <tr> per row, the frame is split
+    into compact columnar JSON chunks (repeated strings dictionary-encoded).
+    The browser component only builds DOM rows for the visible window plus a
+    small overscan, and requests the chunks it is missing as the user
+    scrolls, so only those chunks are ever sent. Styling matches the
+    `.dataframe` tables used across the pages.
+    """
+
+    CHUNK_SIZE = 500  # Rows per JSON chunk
+    ROW_HEIGHT = 38  # px: 8px padding top/bottom + 21px line + 1px border
+    HEADER_HEIGHT = 42
+    VISIBLE_ROWS = 15  # Rows visible before the table scrolls
+    OVERSCAN = 10  # Extra rows rendered above and below the window
+    MAX_COLUMN_CHARS = 40  # Widest a column grows (in characters) before text is truncated
+
+    @staticmethod
+    def _cell_text(value):
+        """Cell text the way DataFrame.to_html shows it"""
+        if isinstance(value, float) and math.isnan(value):
+            return "NaN"
+        return str(value)
+
+    @classmethod
+    def encode(cls, df):
+        """
+        Encode a DataFrame as table metadata plus columnar row chunks
+
+        Returns:
+        - (meta, chunks): meta describes the columns, widths and dictionaries;
+          each chunk is a list of per-column value lists for CHUNK_SIZE rows
+        """
+        rows = len(df)
+        columns = [str(column) for column in df.columns]
+        dictionaries = {}
+        widths = []
+        values = []
+
+        for position, column in enumerate(df.columns):
+            texts = df.iloc[:, position].map(cls._cell_text)
+            longest = int(texts.str.len().max()) if rows else 0
+            widths.append(min(max(longest, len(columns[position])), cls.MAX_COLUMN_CHARS) + 3)
+
+            codes, uniques = pd.factorize(texts)
+            if len(uniques) * 2 <= rows:
+                # Repeated values (status, allocator, channel...) are sent once
+                dictionaries[position] = uniques.tolist()
+                values.append(codes.tolist())
+            else:
+                values.append(texts.tolist())
+
+        chunks = [
+            [column_values[start:start + cls.CHUNK_SIZE] for column_values in values]
+            for start in range(0, rows, cls.CHUNK_SIZE)
+        ]
+        meta = {
+            # Identifies the frame, so the browser drops chunks of a previous one
+            'version': hashlib.sha1(json.dumps([columns, values], default=str).encode()).hexdigest(),
+            'columns': columns,
+            'rows': rows,
+            'widths': widths,
+            'dictionaries': dictionaries,
+            'chunkSize': cls.CHUNK_SIZE,
+            'rowHeight': cls.ROW_HEIGHT,
+            'visibleRows': cls.VISIBLE_ROWS,
+            'overscan': cls.OVERSCAN,
+            'containerHeight': cls.container_height(rows),
+        }
+        return meta, chunks
+
+    @classmethod
+    def container_height(cls, rows):
+        """Pixel height of the scrolling area: the header plus up to VISIBLE_ROWS rows"""
+        return cls.HEADER_HEIGHT + max(min(rows, cls.VISIBLE_ROWS), 1) * cls.ROW_HEIGHT + 2
+
+    @classmethod
+    def render(cls, df, key="virtual_table"):
+        """
+        Render a DataFrame as a windowed table
+
+        Parameters:
+        - df: DataFrame with the display columns, already formatted
+        - key: Component key; its value is the list of chunk indices the browser asked for
+        """
+        meta, chunks = _encode(df)
+        requested = st.session_state.get(key) or [0, 1]
+        _component(
+            meta=meta,
+            chunks={str(index): chunks[index] for index in requested if 0 <= index < len(chunks)},
+            key=key,
+            default=None
+        )
+
+
+@st.cache_data(max_entries=16)
+def _encode(df):
+    """VirtualTable.encode, kept across the reruns the component's chunk requests trigger"""
+    return VirtualTable.encode(df)